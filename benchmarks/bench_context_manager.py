@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+import datetime
+import random
+import asyncio
+import argparse
+import tempfile
+import aiosqlite
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Nilai dummy agar config bisa diimpor tanpa file .env.
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:placeholder')
+os.environ.setdefault('GEMINI_API_KEYS', 'placeholder')
+
+from modules.context_manager import ContextManager
+
+
+class LegacyContextManager(ContextManager):
+    # Meniru perilaku lama: satu aiosqlite.connect() per pemanggilan.
+    async def _init_db(self):
+        async with aiosqlite.connect(self.db_file) as conn:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_contexts (
+                    user_id INTEGER PRIMARY KEY,
+                    history_json TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    active_session_name TEXT,
+                    session_files_json TEXT
+                )
+            """)
+            await conn.commit()
+
+    async def close(self):
+        pass
+
+    async def get_context(self, user_id):
+        async with aiosqlite.connect(self.db_file) as conn:
+            cursor = await conn.execute(
+                "SELECT history_json, timestamp, active_session_name, session_files_json FROM user_contexts WHERE user_id = ?",
+                (user_id,)
+            )
+            await cursor.fetchone()
+
+    async def save_context(self, user_id, history, session_name, session_files):
+        async with aiosqlite.connect(self.db_file) as conn:
+            await conn.execute("""
+                INSERT INTO user_contexts (user_id, history_json, timestamp, active_session_name, session_files_json)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                history_json = excluded.history_json,
+                timestamp = excluded.timestamp,
+                active_session_name = excluded.active_session_name,
+                session_files_json = excluded.session_files_json
+            """, (user_id, json.dumps(history), datetime.datetime.now().isoformat(), session_name, json.dumps(session_files)))
+            await conn.commit()
+
+
+async def _run_phase(name, operation, user_ids, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def worker(user_id):
+        nonlocal errors
+        async with semaphore:
+            try:
+                await operation(user_id)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - start
+    succeeded = len(user_ids) - errors
+    print(
+        f"  {name:<6} {len(user_ids):>7} operasi dalam {elapsed:7.2f} s  ->  "
+        f"{succeeded / elapsed:9.0f} ops/s  (gagal: {errors})"
+    )
+
+
+async def _bench(manager_cls, label, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = manager_cls(os.path.join(tmp, "bench.db"))
+        await manager._init_db()
+        history = [
+            {'role': 'user', 'parts': ["sistem"]},
+            {'role': 'model', 'parts': ["Saya siap membantu. Apa yang ingin Anda tanyakan?"]},
+        ] + [
+            {'role': 'user' if i % 2 == 0 else 'model', 'parts': ["x" * args.message_size]}
+            for i in range(args.turns)
+        ]
+        user_ids = list(range(1, args.users + 1))
+
+        print(f"{label}:")
+        await _run_phase("save", lambda uid: manager.save_context(uid, history, None, {}), user_ids, args.concurrency)
+        random.shuffle(user_ids)
+        await _run_phase("get", manager.get_context, user_ids, args.concurrency)
+        await manager.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark throughput get/save ContextManager.")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--message-size", type=int, default=400)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    await _bench(ContextManager, "Pool koneksi (WAL)", args)
+    if not args.skip_legacy:
+        await _bench(LegacyContextManager, "Koneksi per pemanggilan (lama)", args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
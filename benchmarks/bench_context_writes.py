@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Nilai dummy agar config bisa diimpor tanpa file .env.
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:placeholder')
+os.environ.setdefault('GEMINI_API_KEYS', 'placeholder')
+
+from modules import db_pool
+from modules.db_pool import ConnectionPool
+from modules.context_manager import ContextManager
+
+# Checkpoint otomatis dimatikan agar pertumbuhan file WAL sama dengan jumlah byte yang ditulis.
+db_pool.DB_PRAGMAS = db_pool.DB_PRAGMAS + ("PRAGMA wal_autocheckpoint=0",)
+
+LEGACY_UPSERT_SQL = """
+    INSERT INTO user_contexts (user_id, history_json, timestamp, active_session_name, session_files_json)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+    history_json = excluded.history_json,
+    timestamp = excluded.timestamp,
+    active_session_name = excluded.active_session_name,
+    session_files_json = excluded.session_files_json
+"""
+
+
+def _wal_size(db_file):
+    wal_file = db_file + "-wal"
+    return os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+
+
+def _turn(i, message_size):
+    return f"pesan pengguna {i} " + "u" * message_size, f"jawaban model {i} " + "m" * message_size
+
+
+async def _bench_legacy(db_file, args, session_files):
+    pool = ConnectionPool(db_file, size=1)
+    await pool.open()
+    async with pool.transaction() as conn:
+        await conn.execute("""
+            CREATE TABLE user_contexts (
+                user_id INTEGER PRIMARY KEY,
+                history_json TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                active_session_name TEXT,
+                session_files_json TEXT
+            )
+        """)
+
+    history = [{'role': 'user', 'parts': ["sistem"]}, {'role': 'model', 'parts': ["siap"]}]
+    written = []
+    for i in range(args.turns):
+        user_text, model_text = _turn(i, args.message_size)
+        history += [{'role': 'user', 'parts': [user_text]}, {'role': 'model', 'parts': [model_text]}]
+        before = _wal_size(db_file)
+        async with pool.transaction() as conn:
+            await conn.execute(LEGACY_UPSERT_SQL, (
+                1, json.dumps(history), datetime.datetime.now().isoformat(), "Sesi Otomatis", json.dumps(session_files)
+            ))
+        written.append(_wal_size(db_file) - before)
+
+    await pool.close()
+    return written
+
+
+async def _bench_normalized(db_file, args, session_files):
+    manager = ContextManager(db_file, pool_size=1)
+    await manager._init_db()
+    async with manager.unit_of_work(1) as context:
+        for name, content in session_files.items():
+            context.add_file(name, content)
+
+    written = []
+    for i in range(args.turns):
+        user_text, model_text = _turn(i, args.message_size)
+        before = _wal_size(db_file)
+        async with manager.unit_of_work(1) as context:
+            context.append_turn(user_text, model_text)
+        written.append(_wal_size(db_file) - before)
+
+    await manager.close()
+    return written
+
+
+def _report(label, written):
+    total = sum(written)
+    print(
+        f"{label:<28} total {total / 1024:10.1f} KB | rata-rata/giliran {total / len(written) / 1024:8.1f} KB | "
+        f"giliran terakhir {written[-1] / 1024:8.1f} KB"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Bandingkan byte yang ditulis per giliran percakapan.")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--message-size", type=int, default=800)
+    parser.add_argument("--file-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    session_files = {"dokumen.pdf": "d" * args.file_size}
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = await _bench_legacy(os.path.join(tmp, "legacy.db"), args, session_files)
+        normalized = await _bench_normalized(os.path.join(tmp, "normalized.db"), args, session_files)
+
+    print(f"{args.turns} giliran, pesan {args.message_size} karakter, file sesi {args.file_size} karakter:")
+    _report("history_json (lama)", legacy)
+    _report("tabel messages (append-only)", normalized)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.markdown_renderer import StreamingMarkdownRenderer, escape_html
+
+LEGACY_TOKEN_REGEX = re.compile(
+    r'(```(?:[a-zA-Z]+\n)?(?:.|\n)*?```)|'
+    r'(\*\*.*?\*\*|__.*?__)|'
+    r'(\*.*?\*|_.*?_)|'
+    r'(`.*?`)'
+)
+
+
+def _legacy_convert(text):
+    # Salinan convert_markdown_to_html_safely sebelum renderer inkremental.
+    text = text.strip()
+    text = re.sub(r'^\s*[\*\-]\s+', '', text, flags=re.MULTILINE)
+    html_parts = []
+    last_end = 0
+    for match in LEGACY_TOKEN_REGEX.finditer(text):
+        start, end = match.span()
+        html_parts.append(escape_html(text[last_end:start]))
+        last_end = end
+        token = match.group(0)
+        if match.group(1):
+            inner_content = re.sub(r'^```[a-zA-Z]*\n?|```$', '', token)
+            html_parts.append(f'<pre><code>{escape_html(inner_content.strip())}</code></pre>')
+        elif match.group(2):
+            html_parts.append(f'<b>{escape_html(token.strip("*_"))}</b>')
+        elif match.group(3):
+            html_parts.append(f'<i>{escape_html(token.strip("*_"))}</i>')
+        elif match.group(4):
+            html_parts.append(f'<code>{escape_html(token.strip("`"))}</code>')
+    html_parts.append(escape_html(text[last_end:]))
+    return "".join(html_parts)
+
+
+def _sample_markdown(target_chars, pathological):
+    rng = random.Random(42)
+    words = ["data", "model", "respons", "pengguna", "sistem", "nilai", "hasil", "proses", "a < b", "x & y"]
+    blocks = []
+    size = 0
+    while size < target_chars:
+        kind = rng.random()
+        if pathological:
+            # Baris panjang dengan penanda yang tidak pernah ditutup: kasus terburuk regex lazy.
+            block = " ".join(f"{rng.choice(words)} *{rng.choice(words)} _{rng.choice(words)}" for _ in range(200))
+        elif kind < 0.15:
+            body = "\n".join(f"    baris_{i} = hitung({i}) * 2  # <{i}>" for i in range(rng.randint(3, 15)))
+            block = f"```python\n{body}\n```"
+        elif kind < 0.45:
+            block = "\n".join(
+                f"* **{rng.choice(words)}**: {' '.join(rng.choice(words) for _ in range(12))} `{rng.choice(words)}`"
+                for _ in range(rng.randint(2, 6))
+            )
+        else:
+            block = " ".join(
+                f"*{word}*" if rng.random() < 0.05 else word for word in (rng.choice(words) for _ in range(80))
+            )
+        blocks.append(block)
+        size += len(block) + 2
+    return "\n\n".join(blocks)
+
+
+def _chunks(text, chunk_size):
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark renderer Markdown inkremental vs. konversi regex lama.")
+    parser.add_argument("--size-kb", type=int, default=300)
+    parser.add_argument("--chunk-size", type=int, default=200, help="Ukuran potongan stream (karakter)")
+    parser.add_argument("--pathological", action="store_true", help="Baris panjang dengan penanda tak tertutup")
+    args = parser.parse_args()
+
+    text = _sample_markdown(args.size_kb * 1024, args.pathological)
+    chunks = _chunks(text, args.chunk_size)
+    print(f"Input: {len(text) / 1024:.0f} KB, {len(chunks)} potongan x {args.chunk_size} karakter")
+
+    started_at = time.perf_counter()
+    renderer = StreamingMarkdownRenderer()
+    for chunk in chunks:
+        renderer.feed(chunk)
+    streaming_html = "".join(renderer.finish())
+    feed_s = time.perf_counter() - started_at
+    print(f"Inkremental, feed + finish              : {feed_s * 1000:9.1f} ms")
+
+    # Setiap potongan diikuti render() seperti stream_response (tanpa paging).
+    started_at = time.perf_counter()
+    renderer = StreamingMarkdownRenderer()
+    for chunk in chunks:
+        renderer.feed(chunk)
+        renderer.render()
+    renderer.finish()
+    render_s = time.perf_counter() - started_at
+    print(f"Inkremental, render() tiap potongan     : {render_s * 1000:9.1f} ms")
+
+    started_at = time.perf_counter()
+    legacy_html = _legacy_convert(text)
+    legacy_s = time.perf_counter() - started_at
+    print(f"Regex lama, satu kali di akhir          : {legacy_s * 1000:9.1f} ms")
+
+    # Biaya jika regex lama dipakai untuk setiap edit: diukur pada sebagian potongan lalu diekstrapolasi.
+    sample_every = max(1, len(chunks) // 50)
+    prefix = ""
+    sampled = 0
+    started_at = time.perf_counter()
+    for index, chunk in enumerate(chunks):
+        prefix += chunk
+        if index % sample_every == 0:
+            _legacy_convert(prefix)
+            sampled += 1
+    legacy_per_edit_s = (time.perf_counter() - started_at) * len(chunks) / sampled
+    print(f"Regex lama, tiap potongan (ekstrapolasi): {legacy_per_edit_s * 1000:9.1f} ms")
+    print(f"Panjang HTML: inkremental {len(streaming_html)}, regex lama {len(legacy_html)}")
+
+
+if __name__ == "__main__":
+    main()
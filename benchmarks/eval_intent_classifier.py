@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.intent_classifier import IntentClassifier, INTENT_LABELS
+
+# Log label hanya mencatat ada/tidaknya file sesi, jadi nama file diganti placeholder.
+PLACEHOLDER_SESSION_FILES = ("dokumen.pdf",)
+
+
+def _load_records(path):
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get('text') and record.get('label') in INTENT_LABELS:
+                records.append(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluasi classifier intent lokal terhadap label dari LLM.")
+    parser.add_argument("labels", help="File JSONL berisi text, has_session_files, label (mis. INTENT_LABEL_LOG_FILE)")
+    parser.add_argument("--training-file", default=None, help="Data latih tambahan untuk classifier")
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="Latensi LLM jika tidak tercatat di record")
+    args = parser.parse_args()
+
+    classifier = IntentClassifier(args.training_file, threshold=args.threshold)
+    records = _load_records(args.labels)
+    if not records:
+        print("Tidak ada record berlabel yang valid.")
+        return
+
+    decided = 0
+    correct = 0
+    saved_ms = 0.0
+    elapsed = 0.0
+    confusion = defaultdict(Counter)
+    for record in records:
+        session_files = PLACEHOLDER_SESSION_FILES if record.get('has_session_files') else ()
+        started_at = time.perf_counter()
+        predicted = classifier.classify(record['text'], session_files)
+        elapsed += time.perf_counter() - started_at
+        if predicted is None:
+            continue
+        decided += 1
+        confusion[record['label']][predicted] += 1
+        if predicted == record['label']:
+            correct += 1
+        saved_ms += record.get('latency_ms') or args.llm_latency_ms
+
+    total = len(records)
+    print(f"{total} record, diputuskan lokal {decided} ({decided / total:.1%})")
+    if decided:
+        print(f"Akurasi pada yang diputuskan lokal: {correct / decided:.1%}")
+    print(f"Latensi classifier rata-rata: {elapsed / total * 1e6:.1f} µs")
+    print(f"Perkiraan latensi LLM yang dihemat: {saved_ms / 1000:.1f} s total, {saved_ms / total:.0f} ms/pesan")
+
+    print("\nConfusion (label LLM -> prediksi lokal):")
+    for label in INTENT_LABELS:
+        row = confusion.get(label)
+        if row:
+            cells = ", ".join(f"{predicted}={count}" for predicted, count in row.most_common())
+            print(f"  {label:<26} {cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from modules.parsers import HEAVY_MODULES
+
+IMPORTTIME_REGEX = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+# Modul yang seharusnya hanya dimuat di proses worker, bukan saat bot mulai polling.
+WORKER_ONLY_MODULES = tuple(HEAVY_MODULES) + ('whisper', 'torch')
+# Nilai dummy agar config dan bot_setup bisa diimpor tanpa file .env.
+PLACEHOLDER_ENV = {
+    'TELEGRAM_BOT_TOKEN': '123456:placeholder',
+    'GEMINI_API_KEYS': 'placeholder',
+}
+
+
+def _run_importtime(target):
+    env = dict(os.environ)
+    for name, value in PLACEHOLDER_ENV.items():
+        env.setdefault(name, value)
+    started_at = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    wall_ms = (time.perf_counter() - started_at) * 1000
+    if result.returncode != 0:
+        raise SystemExit(f"Gagal mengimpor {target}:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_REGEX.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append({
+                'module': module,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+                'depth': len(indent) // 2,
+            })
+    return imports, wall_ms
+
+
+def _with_ancestors(imports):
+    # -X importtime mencetak anak sebelum induknya; induk adalah baris berikutnya yang lebih dangkal.
+    parents = {}
+    pending = []
+    for position, entry in enumerate(imports):
+        while pending and imports[pending[-1]]['depth'] > entry['depth']:
+            parents[pending.pop()] = position
+        pending.append(position)
+
+    for position, entry in enumerate(imports):
+        ancestors = []
+        parent = parents.get(position)
+        while parent is not None:
+            ancestors.append(imports[parent])
+            parent = parents.get(parent)
+        yield entry, ancestors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Laporan waktu impor startup bot (-X importtime).")
+    parser.add_argument("--target", default="modules.handlers", help="Modul yang diimpor main.py sebelum polling")
+    parser.add_argument("--top", type=int, default=15, help="Jumlah modul teratas yang ditampilkan")
+    parser.add_argument("--json", action="store_true", help="Keluaran JSON untuk CI")
+    parser.add_argument("--max-ms", type=float, default=None, help="Gagal (exit 1) jika total impor melebihi nilai ini")
+    args = parser.parse_args()
+
+    imports, wall_ms = _run_importtime(args.target)
+    total_ms = sum(entry['self_ms'] for entry in imports)
+    top_level = {}
+    for entry, ancestors in _with_ancestors(imports):
+        root = entry['module'].split('.')[0]
+        # Hanya impor terluar tiap paket yang dihitung agar waktu subpaket tidak terhitung dua kali.
+        if root not in {ancestor['module'].split('.')[0] for ancestor in ancestors}:
+            top_level[root] = top_level.get(root, 0.0) + entry['cumulative_ms']
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    loaded = {entry['module'] for entry in imports}
+    worker_only = [module for module in WORKER_ONLY_MODULES if module in loaded]
+
+    if args.json:
+        print(json.dumps({
+            'target': args.target,
+            'total_import_ms': round(total_ms, 1),
+            'wall_ms': round(wall_ms, 1),
+            'modules': len(imports),
+            'slowest': [{'package': name, 'cumulative_ms': round(ms, 1)} for name, ms in slowest],
+            'worker_only_loaded': worker_only,
+        }, indent=2))
+    else:
+        print(f"Target                : import {args.target}")
+        print(f"Total waktu impor     : {total_ms:.1f} ms ({len(imports)} modul)")
+        print(f"Waktu proses (wall)   : {wall_ms:.1f} ms")
+        print("Paket teratas (kumulatif):")
+        for name, ms in slowest:
+            print(f"  {name:<30} {ms:>9.1f} ms  {ms / total_ms:6.1%}")
+        if worker_only:
+            print(f"PERINGATAN: modul khusus worker ikut dimuat di proses utama: {', '.join(worker_only)}")
+
+    if worker_only or (args.max_ms is not None and total_ms > args.max_ms):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
 import os
 import sys
+import time
 import signal
 import asyncio
 import logging
 import subprocess
-import whisper
 from dotenv import load_dotenv
 from telebot.types import BotCommand
 from telebot.asyncio_helper import ApiTelegramException
 
+PROCESS_STARTED_AT = time.perf_counter()
+TABLE_STORE_PRUNE_INTERVAL = 3600
 
 async def set_bot_commands(bot):
     commands = [
@@ -16,7 +18,32 @@ async def set_bot_commands(bot):
     ]
     await bot.set_my_commands(commands)
     logging.info("Menu perintah bot telah diatur.")
+
+async def warm_up_workers(config, parser_pool, transcription_service):
+    # Dijalankan setelah polling dimulai: library parser dan model Whisper dimuat di proses
+    # worker sementara bot sudah bisa menerima update.
+    logging.info("Menyiapkan pool parser dokumen di latar belakang...")
+    try:
+        await parser_pool.start()
+    except Exception as e:
+        logging.error(f"Gagal menyiapkan pool parser, akan dicoba lagi saat file pertama diproses: {e}")
+    logging.info("Memuat model Whisper di worker transkripsi...")
+    await transcription_service.start()
+    logging.info(f"Pemanasan worker selesai {time.perf_counter() - PROCESS_STARTED_AT:.2f} detik sejak proses dimulai.")
     
+async def prune_table_store_periodically(config):
+    # Seperti GC blob store: salinan kolumnar tabel yang lama dihapus secara berkala, bukan
+    # hanya saat startup, agar direktori tidak terus membesar pada bot yang berjalan lama.
+    from modules.parsers import prune_table_store
+    while True:
+        try:
+            removed_tables = await asyncio.to_thread(prune_table_store, config.TABLE_STORE_DIR, config.TABLE_STORE_MAX_AGE)
+            if removed_tables:
+                logging.info(f"{removed_tables} file tabel lama dihapus dari '{config.TABLE_STORE_DIR}'.")
+        except Exception as e:
+            logging.error(f"Gagal membersihkan direktori tabel: {e}", exc_info=True)
+        await asyncio.sleep(TABLE_STORE_PRUNE_INTERVAL)
+
 async def main():
     logging.basicConfig(
         level=logging.INFO, 
@@ -26,22 +53,63 @@ async def main():
     load_dotenv()
 
     import modules.bot_setup
-    logging.info("Memuat model Whisper...")
+    from modules import config
+    from modules.http_client import HttpClient
+    http_client_instance = HttpClient(
+        limit=config.HTTP_POOL_LIMIT,
+        limit_per_host=config.HTTP_POOL_LIMIT_PER_HOST,
+        dns_cache_ttl=config.HTTP_DNS_CACHE_TTL
+    )
+    await http_client_instance.open()
+    modules.bot_setup.http_client = http_client_instance
 
-    try:
-        model_instance = whisper.load_model("tiny")
-        modules.bot_setup.whisper_model = model_instance
-        logging.info("Model Whisper berhasil dimuat dan siap digunakan.")
-    except Exception as e:
-        logging.error(f"Gagal memuat model Whisper. Fitur pesan suara tidak akan berfungsi. Error: {e}")
-        modules.bot_setup.whisper_model = None
+    from modules.parser_pool import ParserPool
+    parser_pool_instance = ParserPool(
+        workers=config.PARSER_POOL_WORKERS,
+        job_timeout=config.PARSER_JOB_TIMEOUT,
+        memory_limit_bytes=config.PARSER_MEMORY_LIMIT_BYTES
+    )
+    modules.bot_setup.parser_pool = parser_pool_instance
+
+    from modules.transcription import TranscriptionService
+    transcription_service_instance = TranscriptionService(
+        config.WHISPER_MODEL,
+        workers=config.TRANSCRIPTION_WORKERS,
+        queue_size=config.TRANSCRIPTION_QUEUE_SIZE,
+        job_timeout=config.TRANSCRIPTION_JOB_TIMEOUT
+    )
+    modules.bot_setup.transcription_service = transcription_service_instance
+
+    from modules.outbound import OutboundScheduler
+    outbound_instance = OutboundScheduler(
+        modules.bot_setup.bot,
+        global_rate=config.OUTBOUND_GLOBAL_RATE,
+        chat_rate=config.OUTBOUND_CHAT_RATE,
+        group_rate=config.OUTBOUND_GROUP_RATE,
+        chat_burst=config.OUTBOUND_CHAT_BURST
+    )
+    outbound_instance.start()
+    modules.bot_setup.outbound = outbound_instance
 
     from modules.context_manager import ContextManager, DB_FILE
-    context_manager_instance = ContextManager(DB_FILE)
+    from modules.context_cache import ContextCache
+    context_cache = ContextCache(config.CONTEXT_CACHE_MAX_BYTES) if config.CONTEXT_CACHE_ENABLED else None
+    context_manager_instance = ContextManager(
+        DB_FILE, 
+        cache=context_cache, 
+        flush_interval=config.CONTEXT_CACHE_FLUSH_INTERVAL
+    )
     modules.bot_setup.context_manager = context_manager_instance
     logging.info("Menginisialisasi database...")
     await context_manager_instance._init_db()
     logging.info("Database siap.")
+
+    if config.SEARCH_CACHE_PERSIST:
+        from modules.search_handler import search_cache
+        await search_cache.attach(context_manager_instance.pool)
+    if config.URL_CACHE_ENABLED:
+        from modules.web_handler import url_cache
+        await url_cache.attach(context_manager_instance.pool)
     
     import modules.handlers 
     from modules.bot_setup import bot
@@ -51,6 +119,11 @@ async def main():
 
     if missing_vars:
         logging.critical(f"Error: Variabel environment berikut tidak ditemukan: {', '.join(missing_vars)}.")
+        await context_manager_instance.close()
+        await http_client_instance.close()
+        await parser_pool_instance.close()
+        await transcription_service_instance.close()
+        await outbound_instance.close()
         return
     
     if not os.getenv("HUGGINGFACE_API_TOKEN"):
@@ -66,14 +139,43 @@ async def main():
     signal.signal(signal.SIGINT, signal_handler)
     logging.info("Bot sedang berjalan...")
     task = loop.create_task(bot.infinity_polling(timeout=60))
+    logging.info(f"Polling dimulai {time.perf_counter() - PROCESS_STARTED_AT:.2f} detik sejak proses dimulai.")
+    warmup_task = loop.create_task(
+        warm_up_workers(config, parser_pool_instance, transcription_service_instance)
+    )
+    table_store_task = loop.create_task(prune_table_store_periodically(config))
     await stop_event.wait()
     logging.info("Menghentikan polling bot...")
     task.cancel()
+    warmup_task.cancel()
+    table_store_task.cancel()
+    # Pemanasan ditunggu sampai benar-benar berhenti sebelum pool parser dan worker
+    # transkripsi ditutup, agar start() yang dibatalkan tidak berjalan bersamaan dengan close().
+    await asyncio.gather(warmup_task, table_store_task, return_exceptions=True)
 
     try:
         await task
     except asyncio.CancelledError:
         logging.info("Task polling berhasil dibatalkan.")
+
+    logging.info(f"Statistik latensi respons: {modules.handlers.response_latency.stats()}")
+    logging.info(f"Statistik antrean generasi: {modules.handlers.admission.stats()}")
+    logging.info(f"Statistik antrean pesan keluar: {outbound_instance.stats()}")
+    await outbound_instance.close()
+    from modules.search_handler import search_cache
+    from modules.web_handler import url_cache
+    logging.info(f"Statistik cache pencarian: {search_cache.stats()}")
+    logging.info(f"Statistik cache URL: {url_cache.stats()}")
+    logging.info("Menyimpan cache konteks dan menutup koneksi database...")
+    await context_manager_instance.close()
+    from modules.gemini_pool import gemini_pool
+    logging.info(f"Statistik kunci API Gemini: {gemini_pool.stats()}")
+    await gemini_pool.close()
+    logging.info(f"Statistik HTTP per host: {http_client_instance.stats()}")
+    await http_client_instance.close()
+    await parser_pool_instance.close()
+    logging.info(f"Statistik transkripsi: {transcription_service_instance.stats()}")
+    await transcription_service_instance.close()
     logging.info("Bot telah berhenti.")
 
 if __name__ == "__main__":
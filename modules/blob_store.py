@@ -0,0 +1,183 @@
+import zlib
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from .db_pool import ConnectionPool
+from .retrieval import ChunkIndex
+
+
+BLOB_COMPRESSION_LEVEL = 6
+BLOB_CACHE_MAX_BYTES = 32 * 1024 * 1024
+BLOB_INDEX_CACHE_SIZE = 256
+BLOB_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL
+    ) WITHOUT ROWID
+"""
+BLOB_INDEX_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS blob_indexes (
+        hash TEXT PRIMARY KEY,
+        data BLOB NOT NULL
+    ) WITHOUT ROWID
+"""
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+class StagedBlob:
+    # Konten file yang belum tertulis ke database. Dimiliki oleh konteks pengguna yang
+    # mereferensikannya, jadi ikut hilang saat konteks itu dibuang.
+    __slots__ = ('hash', 'content', 'index')
+
+    def __init__(self, blob_hash: str, content: str, index: Optional[ChunkIndex]):
+        self.hash = blob_hash
+        self.content = content
+        self.index = index
+
+class BlobStore:
+    def __init__(self, pool: ConnectionPool, cache_max_bytes: int = BLOB_CACHE_MAX_BYTES):
+        self.pool = pool
+        self.cache_max_bytes = cache_max_bytes
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_bytes = 0
+        self._indexes: "OrderedDict[str, ChunkIndex]" = OrderedDict()
+
+    def stage(self, content: str) -> StagedBlob:
+        blob_hash = content_hash(content)
+        # Indeks potongan dibuat saat file masuk, bukan saat setiap pertanyaan.
+        index = None if blob_hash in self._indexes else ChunkIndex.build(content)
+        return StagedBlob(blob_hash, content, index)
+
+    async def write(self, conn, content: str) -> str:
+        blob_hash = content_hash(content)
+        data = zlib.compress(content.encode('utf-8'), BLOB_COMPRESSION_LEVEL)
+        await conn.execute(
+            "INSERT OR IGNORE INTO blobs (hash, data, size) VALUES (?, ?, ?)", (blob_hash, data, len(content))
+        )
+        return blob_hash
+
+    async def write_staged(self, conn, staged: Iterable[StagedBlob]):
+        # Selalu ditulis dari konten milik konteks yang sedang disimpan (INSERT OR IGNORE), jadi
+        # baris session_files tidak pernah bergantung pada blob yang ditulis konteks lain.
+        blobs = {blob.hash: blob for blob in staged}
+        if not blobs:
+            return
+        await conn.executemany(
+            "INSERT OR IGNORE INTO blobs (hash, data, size) VALUES (?, ?, ?)",
+            [
+                (blob.hash, zlib.compress(blob.content.encode('utf-8'), BLOB_COMPRESSION_LEVEL), len(blob.content))
+                for blob in blobs.values()
+            ]
+        )
+        await conn.executemany(
+            "INSERT OR IGNORE INTO blob_indexes (hash, data) VALUES (?, ?)",
+            [(blob.hash, blob.index.to_bytes()) for blob in blobs.values() if blob.index is not None]
+        )
+
+    def mark_written(self, staged: Iterable[StagedBlob]):
+        for blob in staged:
+            self._remember(blob.hash, blob.content)
+            if blob.index is not None:
+                self._remember_index(blob.hash, blob.index)
+
+    async def get_many(self, hashes: Iterable[str], staged: Optional[Dict[str, StagedBlob]] = None) -> Dict[str, str]:
+        # staged: blob milik konteks pemanggil yang mungkin belum ada di database.
+        staged = staged or {}
+        contents = {}
+        missing = []
+        for blob_hash in set(hashes):
+            content = staged[blob_hash].content if blob_hash in staged else None
+            if content is None:
+                content = self._cache.get(blob_hash)
+                if content is not None:
+                    self._cache.move_to_end(blob_hash)
+            if content is None:
+                missing.append(blob_hash)
+            else:
+                contents[blob_hash] = content
+
+        if missing:
+            placeholders = ", ".join("?" for _ in missing)
+            async with self.pool.acquire() as conn:
+                async with conn.execute(
+                    f"SELECT hash, data FROM blobs WHERE hash IN ({placeholders})", missing
+                ) as cursor:
+                    rows = await cursor.fetchall()
+            for blob_hash, data in rows:
+                content = zlib.decompress(data).decode('utf-8')
+                self._remember(blob_hash, content)
+                contents[blob_hash] = content
+        return contents
+
+    async def get_indexes(
+        self, 
+        contents: Dict[str, str], 
+        staged: Optional[Dict[str, StagedBlob]] = None
+    ) -> Dict[str, ChunkIndex]:
+        # contents: hash -> konten (dari get_many). Indeks yang belum ada (blob lama) dibuat
+        # dari kontennya lalu disimpan.
+        staged = staged or {}
+        indexes = {}
+        missing = []
+        for blob_hash in contents:
+            index = staged[blob_hash].index if blob_hash in staged else None
+            if index is None:
+                index = self._indexes.get(blob_hash)
+                if index is not None:
+                    self._indexes.move_to_end(blob_hash)
+            if index is not None:
+                indexes[blob_hash] = index
+            else:
+                missing.append(blob_hash)
+
+        if missing:
+            placeholders = ", ".join("?" for _ in missing)
+            async with self.pool.acquire() as conn:
+                async with conn.execute(
+                    f"SELECT hash, data FROM blob_indexes WHERE hash IN ({placeholders})", missing
+                ) as cursor:
+                    rows = await cursor.fetchall()
+            for blob_hash, data in rows:
+                indexes[blob_hash] = ChunkIndex.from_bytes(data)
+                self._remember_index(blob_hash, indexes[blob_hash])
+
+            built = [blob_hash for blob_hash in missing if blob_hash not in indexes]
+            for blob_hash in built:
+                indexes[blob_hash] = ChunkIndex.build(contents[blob_hash])
+                self._remember_index(blob_hash, indexes[blob_hash])
+            if built:
+                async with self.pool.transaction() as conn:
+                    await conn.executemany(
+                        "INSERT OR IGNORE INTO blob_indexes (hash, data) VALUES (?, ?)",
+                        [(blob_hash, indexes[blob_hash].to_bytes()) for blob_hash in built]
+                    )
+        return indexes
+
+    async def collect_garbage(self) -> int:
+        async with self.pool.transaction() as conn:
+            async with conn.execute(
+                "DELETE FROM blobs WHERE hash NOT IN (SELECT blob_hash FROM session_files)"
+            ) as cursor:
+                deleted = cursor.rowcount
+            await conn.execute("DELETE FROM blob_indexes WHERE hash NOT IN (SELECT hash FROM blobs)")
+        if deleted:
+            logging.info(f"Blob store: {deleted} blob tanpa referensi dihapus.")
+        return deleted
+
+    def _remember_index(self, blob_hash: str, index: ChunkIndex):
+        self._indexes[blob_hash] = index
+        self._indexes.move_to_end(blob_hash)
+        while len(self._indexes) > BLOB_INDEX_CACHE_SIZE:
+            self._indexes.popitem(last=False)
+
+    def _remember(self, blob_hash: str, content: str):
+        if blob_hash in self._cache or len(content) > self.cache_max_bytes:
+            return
+        self._cache[blob_hash] = content
+        self._cache_bytes += len(content)
+        while self._cache_bytes > self.cache_max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
@@ -4,4 +4,7 @@ from .config import TELEGRAM_TOKEN
 
 bot = telebot.AsyncTeleBot(TELEGRAM_TOKEN, parse_mode=None)
 context_manager = None
-whisper_model = None
+transcription_service = None
+http_client = None
+parser_pool = None
+outbound = None
@@ -12,6 +12,65 @@ GEMINI_API_KEYS = [
     for key in os.getenv("GEMINI_API_KEYS", "").split(',') 
     if key.strip()
 ]
+GEMINI_KEY_RPM = int(os.getenv("GEMINI_KEY_RPM", "10"))
+GEMINI_KEY_COOLDOWN = float(os.getenv("GEMINI_KEY_COOLDOWN", "60"))
+GEMINI_KEY_MAX_WAIT = float(os.getenv("GEMINI_KEY_MAX_WAIT", "30"))
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_MAX_BYTES = int(os.getenv("CONTEXT_CACHE_MAX_MB", "64")) * 1024 * 1024
+CONTEXT_CACHE_FLUSH_INTERVAL = float(os.getenv("CONTEXT_CACHE_FLUSH_INTERVAL", "5"))
+
+PROMPT_RECENT_TURNS = 6
+HISTORY_DIGEST_TOKEN_BUDGET = 600
+STRATEGY_TOKEN_BUDGET = 2000
+RESEARCH_TOKEN_BUDGET = 1500
+GENERATION_TOKEN_BUDGET = 16000
+SESSION_CONTEXT_TOKEN_BUDGET = 6000
+RESPONSE_TARGET_CHARS = int(os.getenv("RESPONSE_TARGET_CHARS", "3500"))
+RESPONSE_MAX_OUTPUT_TOKENS = int(os.getenv("RESPONSE_MAX_OUTPUT_TOKENS", "8192"))
+
+RESEARCH_CONCURRENCY = int(os.getenv("RESEARCH_CONCURRENCY", "4"))
+RESEARCH_QUERY_TIMEOUT = float(os.getenv("RESEARCH_QUERY_TIMEOUT", "10"))
+RESEARCH_MAX_QUERIES = 6
+RESEARCH_QUERY_SIMILARITY_THRESHOLD = 0.6
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+SEARCH_CACHE_MAX_ROWS = int(os.getenv("SEARCH_CACHE_MAX_ROWS", "20000"))
+SEARCH_CACHE_PERSIST = os.getenv("SEARCH_CACHE_PERSIST", "true").lower() in ("1", "true", "yes")
+
+URL_CACHE_ENABLED = os.getenv("URL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+URL_CACHE_TTL = float(os.getenv("URL_CACHE_TTL", "3600"))
+URL_CACHE_MAX_BYTES = int(os.getenv("URL_CACHE_MAX_MB", "256")) * 1024 * 1024
+URL_FETCH_MAX_BYTES = int(os.getenv("URL_FETCH_MAX_MB", "5")) * 1024 * 1024
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+
+PARSER_POOL_WORKERS = int(os.getenv("PARSER_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARSER_JOB_TIMEOUT = float(os.getenv("PARSER_JOB_TIMEOUT", "60"))
+PARSER_MEMORY_LIMIT_BYTES = int(os.getenv("PARSER_MEMORY_LIMIT_MB", "2048")) * 1024 * 1024
+DOCUMENT_CHAR_BUDGET = int(os.getenv("DOCUMENT_CHAR_BUDGET", "100000"))
+TABLE_STORE_DIR = os.getenv("TABLE_STORE_DIR", "table_store")
+TABLE_STORE_MAX_AGE = float(os.getenv("TABLE_STORE_MAX_AGE_HOURS", "168")) * 3600
+
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", "20")) / 60
+OUTBOUND_CHAT_BURST = int(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "tiny")
+TRANSCRIPTION_WORKERS = int(os.getenv("TRANSCRIPTION_WORKERS", "1"))
+TRANSCRIPTION_QUEUE_SIZE = int(os.getenv("TRANSCRIPTION_QUEUE_SIZE", "20"))
+TRANSCRIPTION_JOB_TIMEOUT = float(os.getenv("TRANSCRIPTION_JOB_TIMEOUT", "120"))
+
+MAX_ACTIVE_GENERATIONS = int(os.getenv("MAX_ACTIVE_GENERATIONS", "8"))
+MAX_QUEUED_PER_USER = int(os.getenv("MAX_QUEUED_PER_USER", "3"))
+MAX_QUEUED_GENERATIONS = int(os.getenv("MAX_QUEUED_GENERATIONS", "50"))
+
+INTENT_TRAINING_FILE = os.getenv("INTENT_TRAINING_FILE")
+INTENT_LABEL_LOG_FILE = os.getenv("INTENT_LABEL_LOG_FILE")
 
 if not TELEGRAM_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN tidak ditemukan di file .env atau environment variables.")
@@ -19,18 +78,6 @@ if not TELEGRAM_TOKEN:
 if not GEMINI_API_KEYS:
     raise ValueError("GEMINI_API_KEYS tidak ditemukan. Pastikan ada setidaknya satu key.")
 
-current_api_key_index = 0
-
-def get_gemini_api_key():
-    global current_api_key_index
-    return GEMINI_API_KEYS[current_api_key_index]
-
-def rotate_gemini_api_key():
-    global current_api_key_index
-    current_api_key_index = (current_api_key_index + 1) % len(GEMINI_API_KEYS)
-    print(f"API Key diputar. Menggunakan key index: {current_api_key_index}")
-    return current_api_key_index
-
 SAFETY_SETTINGS = {
     'HARM_CATEGORY_HARASSMENT': 'block_none',
     'HARM_CATEGORY_HATE_SPEECH': 'block_none',
@@ -0,0 +1,156 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .context_manager import UserContext
+
+
+ENTRY_OVERHEAD_BYTES = 256
+
+def estimate_context_size(context: "UserContext") -> int:
+    size = ENTRY_OVERHEAD_BYTES
+    for item in context.history:
+        for part in item.get('parts', []):
+            if isinstance(part, str):
+                size += len(part)
+    for name, blob_hash in context.session_files.items():
+        size += len(name) + len(blob_hash)
+    # Konten file yang belum tertulis ikut dihitung agar tetap dibatasi anggaran cache.
+    for blob in context.staged_blobs.values():
+        size += len(blob.content)
+    return size
+
+class ContextCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flush_requested = asyncio.Event()
+        self._entries: "OrderedDict[int, UserContext]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._dirty = set()
+        self._evicted_dirty: Dict[int, "UserContext"] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty) + len(self._evicted_dirty)
+
+    def get(self, user_id: int) -> Optional["UserContext"]:
+        context = self._entries.get(user_id)
+        if context is not None:
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return context.copy(include_pending=False)
+
+        context = self._evicted_dirty.get(user_id)
+        if context is not None:
+            self.hits += 1
+            return context.copy(include_pending=False)
+
+        self.misses += 1
+        return None
+
+    def _pending(self, user_id: int) -> Optional["UserContext"]:
+        if user_id in self._dirty:
+            return self._entries[user_id]
+        return self._evicted_dirty.get(user_id)
+
+    def seed(self, context: "UserContext"):
+        # Versi dari database hanya dipakai jika belum ada entri: entri yang sudah ada bisa
+        # memuat commit yang terjadi selama pembacaan berlangsung.
+        user_id = context.user_id
+        if user_id in self._entries or user_id in self._evicted_dirty:
+            return
+        self._insert(context.copy(), dirty=context.dirty)
+
+    def apply(self, context: "UserContext") -> bool:
+        # Menerapkan delta satu unit kerja ke entri yang ada. False jika belum ada entri.
+        user_id = context.user_id
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = self._evicted_dirty.pop(user_id, None)
+            if entry is None:
+                return False
+        entry.apply_pending(context)
+        self._insert(entry, dirty=True)
+        return True
+
+    def _insert(self, entry: "UserContext", dirty: bool):
+        user_id = entry.user_id
+        self._remove(user_id)
+        size = estimate_context_size(entry)
+        self._entries[user_id] = entry
+        self._sizes[user_id] = size
+        self.total_bytes += size
+        if dirty:
+            self._dirty.add(user_id)
+        self._evict_if_needed()
+
+    def discard(self, user_id: int) -> bool:
+        was_unflushed = user_id in self._dirty or user_id in self._evicted_dirty
+        self._remove(user_id)
+        self._dirty.discard(user_id)
+        self._evicted_dirty.pop(user_id, None)
+        return was_unflushed
+
+    def release_staged(self, user_id: int):
+        # Dipanggil setelah flush berhasil: konten yang sudah ada di database dilepas, kecuali
+        # yang masih dirujuk perubahan baru yang belum di-flush.
+        entry = self._entries.get(user_id)
+        if entry is None or not entry.staged_blobs:
+            return
+        pending = set(entry.changed_files.values()) if user_id in self._dirty else set()
+        entry.staged_blobs = {
+            blob_hash: blob for blob_hash, blob in entry.staged_blobs.items() if blob_hash in pending
+        }
+        size = estimate_context_size(entry)
+        self.total_bytes += size - self._sizes[user_id]
+        self._sizes[user_id] = size
+
+    def take_dirty(self) -> List["UserContext"]:
+        contexts = []
+        for user_id in self._dirty:
+            entry = self._entries[user_id]
+            contexts.append(entry.copy())
+            entry.clear_pending()
+        contexts.extend(self._evicted_dirty.values())
+        self._dirty.clear()
+        self._evicted_dirty.clear()
+        self.flush_requested.clear()
+        return contexts
+
+    def restore_dirty(self, contexts: List["UserContext"]):
+        # Dipanggil saat flush gagal: perubahan yang gagal ditulis digabung kembali
+        # di bawah perubahan yang masuk selama flush berlangsung.
+        for context in contexts:
+            user_id = context.user_id
+            pending = self._pending(user_id)
+            if pending is not None:
+                pending.merge_pending(context)
+            elif user_id in self._entries:
+                entry = self._entries[user_id]
+                entry.merge_pending(context)
+                self._dirty.add(user_id)
+            else:
+                self._evicted_dirty[user_id] = context
+
+    def _remove(self, user_id: int):
+        if user_id in self._entries:
+            del self._entries[user_id]
+            self.total_bytes -= self._sizes.pop(user_id)
+
+    def _evict_if_needed(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            user_id, context = self._entries.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(user_id)
+            self.evictions += 1
+            if user_id in self._dirty:
+                self._dirty.discard(user_id)
+                self._evicted_dirty[user_id] = context
+                self.flush_requested.set()
@@ -1,133 +1,554 @@
-import aiosqlite
 import json
+import time
+import asyncio
+import logging
 import datetime
+from contextlib import asynccontextmanager
 from typing import Union, Optional, Dict, List
+from . import config
 from .prompt import SYSTEM_PROMPT
+from .db_pool import ConnectionPool, DB_POOL_SIZE
+from .context_cache import ContextCache
+from .blob_store import BlobStore, StagedBlob, BLOB_SCHEMA_SQL, BLOB_INDEX_SCHEMA_SQL
+from .retrieval import RETRIEVAL_TOP_K, select_chunks
 from zoneinfo import ZoneInfo
 
 
 DB_FILE = "context.db"
 CONTEXT_EXPIRATION = datetime.timedelta(hours=12)
+CONTEXT_FLUSH_INTERVAL = 5.0
+BLOB_GC_INTERVAL = 3600
+SCHEMA_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS user_contexts (
+        user_id INTEGER PRIMARY KEY,
+        timestamp TEXT NOT NULL,
+        active_session_name TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        parts_json TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_messages_user ON messages (user_id, id)",
+    """
+    CREATE TABLE IF NOT EXISTS session_files (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        blob_hash TEXT NOT NULL,
+        meta_json TEXT,
+        UNIQUE (user_id, name)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_session_files_blob ON session_files (blob_hash)",
+    BLOB_SCHEMA_SQL,
+    BLOB_INDEX_SCHEMA_SQL,
+)
+UPSERT_CONTEXT_SQL = """
+    INSERT INTO user_contexts (user_id, timestamp, active_session_name)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+    timestamp = excluded.timestamp,
+    active_session_name = excluded.active_session_name
+"""
+INSERT_MESSAGE_SQL = "INSERT INTO messages (user_id, role, parts_json) VALUES (?, ?, ?)"
+UPSERT_SESSION_FILE_SQL = """
+    INSERT INTO session_files (user_id, name, blob_hash, meta_json)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, name) DO UPDATE SET 
+    blob_hash = excluded.blob_hash,
+    meta_json = excluded.meta_json
+"""
 
 def get_current_date_str() -> str:
     jakarta_tz = ZoneInfo("Asia/Jakarta")
     current_datetime = datetime.datetime.now(jakarta_tz)
     return current_datetime.strftime("%A, %d %B %Y, %H:%M:%S WIB")
 
+def describe_file_meta(meta: Optional[Dict]) -> str:
+    if not meta:
+        return ""
+    details = []
+    if meta.get('pages'):
+        details.append(f"{meta['pages']} halaman")
+    if meta.get('rows'):
+        details.append(f"{meta['rows']} baris")
+    if meta.get('truncated'):
+        pages_read = meta.get('pages_read')
+        details.append(f"dipotong setelah halaman {pages_read}" if pages_read else "dipotong")
+    return f" ({', '.join(details)})" if details else ""
+
+def _dump_meta(meta: Optional[Dict]) -> Optional[str]:
+    return json.dumps(meta) if meta else None
+
 class ContextManager:
-    def __init__(self, db_file: str):
+    def __init__(
+        self, 
+        db_file: str, 
+        pool_size: int = DB_POOL_SIZE, 
+        cache: Optional[ContextCache] = None, 
+        flush_interval: float = CONTEXT_FLUSH_INTERVAL
+    ):
         self.db_file = db_file
+        self.pool = ConnectionPool(db_file, size=pool_size)
+        self.blob_store = BlobStore(self.pool)
+        self.cache = cache
+        self.flush_interval = flush_interval
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
         
     async def _init_db(self):
-        async with aiosqlite.connect(self.db_file) as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS user_contexts (
-                    user_id INTEGER PRIMARY KEY,
-                    history_json TEXT NOT NULL,
-                    timestamp TEXT NOT NULL,
-                    active_session_name TEXT,
-                    session_files_json TEXT
-                )
-            """)
-            await conn.commit()
+        await self.pool.open()
+        async with self.pool.transaction() as conn:
+            async with conn.execute("PRAGMA table_info(user_contexts)") as cursor:
+                columns = {row[1] for row in await cursor.fetchall()}
+
+            if "history_json" in columns:
+                await self._migrate_legacy_schema(conn)
+            else:
+                async with conn.execute("PRAGMA table_info(session_files)") as cursor:
+                    session_file_columns = {row[1] for row in await cursor.fetchall()}
+                if "content" in session_file_columns:
+                    await self._migrate_inline_session_files(conn)
+                elif session_file_columns and "meta_json" not in session_file_columns:
+                    await conn.execute("ALTER TABLE session_files ADD COLUMN meta_json TEXT")
+                for statement in SCHEMA_SQL:
+                    await conn.execute(statement)
+
+        await self.blob_store.collect_garbage()
         print("Pemeriksaan dan inisialisasi database selesai.")
 
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    async def close(self):
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+            self._maintenance_task = None
+        await self.flush()
+        await self.pool.close()
+
+    async def _migrate_legacy_schema(self, conn):
+        # Skema lama menyimpan seluruh riwayat dan file sesi sebagai JSON dalam satu baris.
+        # Dipecah menjadi tabel messages (append-only) dan session_files di dalam satu transaksi.
+        logging.info("Skema lama user_contexts terdeteksi. Memulai migrasi ke skema ternormalisasi...")
+        await conn.execute("ALTER TABLE user_contexts RENAME TO user_contexts_legacy")
+        for statement in SCHEMA_SQL:
+            await conn.execute(statement)
+
+        migrated = 0
+        async with conn.execute(
+            "SELECT user_id, history_json, timestamp, active_session_name, session_files_json FROM user_contexts_legacy"
+        ) as cursor:
+            async for user_id, history_json, timestamp, session_name, session_files_json in cursor:
+                history = json.loads(history_json or '[]')
+                session_files = json.loads(session_files_json or '{}')
+                await conn.execute(UPSERT_CONTEXT_SQL, (user_id, timestamp, session_name))
+                await conn.executemany(
+                    INSERT_MESSAGE_SQL, 
+                    [(user_id, item['role'], json.dumps(item.get('parts', []))) for item in history[1:]]
+                )
+                for name, content in session_files.items():
+                    blob_hash = await self.blob_store.write(conn, content)
+                    await conn.execute(UPSERT_SESSION_FILE_SQL, (user_id, name, blob_hash, None))
+                migrated += 1
+
+        await conn.execute("DROP TABLE user_contexts_legacy")
+        logging.info(f"Migrasi selesai: {migrated} konteks pengguna dipindahkan.")
+
+    async def _migrate_inline_session_files(self, conn):
+        logging.info("Memindahkan konten file sesi ke blob store...")
+        await conn.execute("ALTER TABLE session_files RENAME TO session_files_inline")
+        for statement in SCHEMA_SQL:
+            await conn.execute(statement)
+
+        async with conn.execute(
+            "SELECT user_id, name, content FROM session_files_inline ORDER BY id"
+        ) as cursor:
+            async for user_id, name, content in cursor:
+                blob_hash = await self.blob_store.write(conn, content)
+                await conn.execute(UPSERT_SESSION_FILE_SQL, (user_id, name, blob_hash, None))
+
+        await conn.execute("DROP TABLE session_files_inline")
+
+    async def _maintenance_loop(self):
+        last_gc = time.monotonic()
+        while True:
+            if self.cache is not None:
+                try:
+                    await asyncio.wait_for(self.cache.flush_requested.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logging.error(f"Gagal menulis cache konteks ke database: {e}", exc_info=True)
+            else:
+                await asyncio.sleep(self.flush_interval)
+
+            if time.monotonic() - last_gc > BLOB_GC_INTERVAL:
+                last_gc = time.monotonic()
+                try:
+                    await self.blob_store.collect_garbage()
+                except Exception as e:
+                    logging.error(f"Gagal membersihkan blob store: {e}", exc_info=True)
+
+    async def flush(self) -> int:
+        if self.cache is None:
+            return 0
+        
+        async with self._flush_lock:
+            contexts = self.cache.take_dirty()
+            if not contexts:
+                return 0
+            try:
+                await self._write_contexts(contexts)
+            except BaseException:
+                self.cache.restore_dirty(contexts)
+                raise
+            
+        logging.info(
+            f"Cache konteks: {len(contexts)} entri ditulis. "
+            f"Entri={len(self.cache)}, memori~{self.cache.total_bytes // 1024} KB, "
+            f"hit={self.cache.hits}, miss={self.cache.misses}, eviksi={self.cache.evictions}"
+        )
+        return len(contexts)
+
     def _get_formatted_system_prompt_part(self) -> Dict:
         formatted_system_prompt = SYSTEM_PROMPT.format(current_date_str=get_current_date_str())
         return {'role': 'user', 'parts': [formatted_system_prompt]}
-    
-    async def _create_new_context(self, user_id: int) -> Dict:
-        history = [
+
+    def _get_fresh_history(self) -> List:
+        return [
             self._get_formatted_system_prompt_part(),
             {'role': 'model', 'parts': ["Saya siap membantu. Apa yang ingin Anda tanyakan?"]}
         ]
-        await self.save_context(user_id, history, None, {})
-        return {
-            'history': history,
-            'active_session_name': None,
-            'session_files': {}
-        }
     
-    async def get_context(self, user_id: int) -> Dict:
-        async with aiosqlite.connect(self.db_file) as conn:
-            cursor = await conn.execute(
-                "SELECT history_json, timestamp, active_session_name, session_files_json FROM user_contexts WHERE user_id = ?",
+    def _create_new_context(self, user_id: int) -> "UserContext":
+        context = UserContext(user_id, self._get_fresh_history(), None, {}, self.blob_store)
+        context.history_replaced = True
+        return context
+
+    def _expire_if_stale(self, context: "UserContext"):
+        if datetime.datetime.now() - context.updated_at > CONTEXT_EXPIRATION:
+            context.replace_history(self._get_fresh_history())
+
+    async def load(self, user_id: int) -> "UserContext":
+        if self.cache is not None:
+            context = self.cache.get(user_id)
+            if context is not None:
+                context.history[0] = self._get_formatted_system_prompt_part()
+                self._expire_if_stale(context)
+                return context
+
+        context = await self._load_from_db(user_id)
+        if self.cache is not None and not context.history_replaced:
+            self.cache.seed(context)
+        return context
+
+    async def _load_from_db(self, user_id: int) -> "UserContext":
+        async with self.pool.acquire() as conn:
+            async with conn.execute(
+                "SELECT timestamp, active_session_name FROM user_contexts WHERE user_id = ?",
                 (user_id,)
-            )
-            row = await cursor.fetchone()
-
-        current_time = datetime.datetime.now()
-
-        if row:
-            last_timestamp = datetime.datetime.fromisoformat(row[1])
-            if current_time - last_timestamp > CONTEXT_EXPIRATION:
-                session_name_to_keep = row[2] or None
-                session_files_to_keep = json.loads(row[3] or '{}')
-                history = [
-                    self._get_formatted_system_prompt_part(),
-                    {'role': 'model', 'parts': ["Saya siap membantu. Apa yang ingin Anda tanyakan?"]}
-                ]
-                await self.save_context(user_id, history, session_name_to_keep, session_files_to_keep)
-                return {
-                    'history': history,
-                    'active_session_name': session_name_to_keep,
-                    'session_files': session_files_to_keep
-                }
-            
-            history = json.loads(row[0])
-            history[0] = self._get_formatted_system_prompt_part()
-            session_name = row[2]
-            session_files = json.loads(row[3] or '{}')
-            return {
-                'history': history,
-                'active_session_name': session_name,
-                'session_files': session_files
-            }
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            if not row:
+                return self._create_new_context(user_id)
+
+            async with conn.execute(
+                "SELECT role, parts_json FROM messages WHERE user_id = ? ORDER BY id",
+                (user_id,)
+            ) as cursor:
+                messages = await cursor.fetchall()
+            async with conn.execute(
+                "SELECT name, blob_hash, meta_json FROM session_files WHERE user_id = ? ORDER BY id",
+                (user_id,)
+            ) as cursor:
+                file_rows = await cursor.fetchall()
+
+        history = [self._get_formatted_system_prompt_part()]
+        history.extend({'role': role, 'parts': json.loads(parts_json)} for role, parts_json in messages)
+        session_files = {name: blob_hash for name, blob_hash, _ in file_rows}
+        context = UserContext(user_id, history, row[1], session_files, self.blob_store)
+        context.file_meta = {name: json.loads(meta_json) for name, _, meta_json in file_rows if meta_json}
+        context.updated_at = datetime.datetime.fromisoformat(row[0])
+        self._expire_if_stale(context)
+        return context
+
+    async def commit(self, context: "UserContext"):
+        if not context.dirty:
+            return
+        context.updated_at = datetime.datetime.now()
+
+        if self.cache is not None:
+            if not self.cache.apply(context):
+                # Entri cache sudah tidak ada (dievict, direset, atau pengguna baru): basisnya
+                # dibaca ulang dari database agar delta tidak diterapkan ke salinan yang usang.
+                async with self._flush_lock:
+                    base = await self._load_from_db(context.user_id)
+                self.cache.seed(base)
+                self.cache.apply(context)
         else:
-            return await self._create_new_context(user_id)
+            await self._write_contexts([context])
+        context.clear_pending()
+
+    @asynccontextmanager
+    async def unit_of_work(self, user_id: int):
+        context = await self.load(user_id)
+        try:
+            yield context
+        finally:
+            await self.commit(context)
+    
+    async def get_context(self, user_id: int) -> Dict:
+        async with self.unit_of_work(user_id) as context:
+            return context.as_dict()
         
     async def save_context(self, user_id: int, history: List, session_name: Optional[str], session_files: Dict):
-        async with aiosqlite.connect(self.db_file) as conn:
-            history_json = json.dumps(history)
-            session_files_json = json.dumps(session_files)
-            timestamp_iso = datetime.datetime.now().isoformat()
-            await conn.execute("""
-                INSERT INTO user_contexts (user_id, history_json, timestamp, active_session_name, session_files_json)
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET
-                history_json = excluded.history_json,
-                timestamp = excluded.timestamp,
-                active_session_name = excluded.active_session_name,
-                session_files_json = excluded.session_files_json
-            """, (user_id, history_json, timestamp_iso, session_name, session_files_json))
-            await conn.commit()
+        context = UserContext(user_id, [], session_name, {}, self.blob_store)
+        context.replace_history(history)
+        context.clear_session_files()
+        for file_name, file_content in session_files.items():
+            context.add_file(file_name, file_content)
+        context.active_session_name = session_name
+        await self.commit(context)
+
+    async def _write_contexts(self, contexts: List["UserContext"]):
+        written_blobs: List[StagedBlob] = []
+        async with self.pool.transaction() as conn:
+            for context in contexts:
+                user_id = context.user_id
+                await conn.execute(
+                    UPSERT_CONTEXT_SQL, 
+                    (user_id, context.updated_at.isoformat(), context.active_session_name)
+                )
+
+                if context.history_replaced:
+                    await conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+                    new_messages = context.history[1:]
+                else:
+                    new_messages = context.new_messages
+                if new_messages:
+                    await conn.executemany(
+                        INSERT_MESSAGE_SQL, 
+                        [(user_id, item['role'], json.dumps(item['parts'])) for item in new_messages]
+                    )
+
+                if context.session_files_cleared:
+                    await conn.execute("DELETE FROM session_files WHERE user_id = ?", (user_id,))
+                if context.changed_files:
+                    staged = context.staged_for(context.changed_files.values())
+                    await self.blob_store.write_staged(conn, staged)
+                    written_blobs += staged
+                    await conn.executemany(
+                        UPSERT_SESSION_FILE_SQL, 
+                        [
+                            (user_id, name, blob_hash, _dump_meta(context.file_meta.get(name)))
+                            for name, blob_hash in context.changed_files.items()
+                        ]
+                    )
+        self.blob_store.mark_written(written_blobs)
+        if self.cache is not None:
+            # Konten sudah ada di database; salinan di konteks cache tidak perlu dipertahankan.
+            for context in contexts:
+                self.cache.release_staged(context.user_id)
 
     async def reset_context(self, user_id: int) -> bool:
-        async with aiosqlite.connect(self.db_file) as conn:
-            cursor = await conn.execute("DELETE FROM user_contexts WHERE user_id = ?", (user_id,))
-            deleted_rows = cursor.rowcount
-            await conn.commit()
-        return deleted_rows > 0
+        async with self._flush_lock:
+            had_unflushed = self.cache.discard(user_id) if self.cache is not None else False
+            async with self.pool.transaction() as conn:
+                async with conn.execute("DELETE FROM user_contexts WHERE user_id = ?", (user_id,)) as cursor:
+                    deleted_rows = cursor.rowcount
+                await conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+                await conn.execute("DELETE FROM session_files WHERE user_id = ?", (user_id,))
+        return deleted_rows > 0 or had_unflushed
     
     async def end_session(self, user_id: int) -> Optional[str]:
-        context = await self.get_context(user_id)
-        session_name = context.get('active_session_name')
+        async with self.unit_of_work(user_id) as context:
+            return context.end_session()
+    
+    async def add_file_to_session(self, user_id: int, file_name: str, file_content: str, meta: Optional[Dict] = None):
+        async with self.unit_of_work(user_id) as context:
+            context.add_file(file_name, file_content, meta)
+
+    async def add_web_search_to_session(self, user_id: int, query: str, search_results: List[Dict]):
+        async with self.unit_of_work(user_id) as context:
+            context.add_web_search(query, search_results)
+
+    async def get_session_files_context(
+        self, 
+        user_id: int, 
+        query: Optional[str] = None, 
+        token_budget: int = config.SESSION_CONTEXT_TOKEN_BUDGET
+    ) -> Optional[str]:
+        async with self.unit_of_work(user_id) as context:
+            return await context.get_session_files_context(query, token_budget)
+
+class UserContext:
+    def __init__(
+        self, 
+        user_id: int, 
+        history: List, 
+        active_session_name: Optional[str], 
+        session_files: Dict, 
+        blob_store: Optional[BlobStore] = None
+    ):
+        self.user_id = user_id
+        self.history = history
+        self.active_session_name = active_session_name
+        # Nama file -> hash SHA-256 kontennya di blob store.
+        self.session_files = session_files
+        # Nama file -> metadata ekstraksi (jumlah halaman, terpotong atau tidak).
+        self.file_meta: Dict[str, Dict] = {}
+        self.blob_store = blob_store
+        # Hash -> konten file yang ditambahkan tetapi mungkin belum tertulis ke database.
+        self.staged_blobs: Dict[str, StagedBlob] = {}
+        self.updated_at = datetime.datetime.now()
+        self.dirty = False
+        self.clear_pending()
+
+    def clear_pending(self):
+        # Perubahan yang belum tersimpan: pesan baru, file yang berubah, dan penanda
+        # bahwa riwayat atau file sesi harus ditulis ulang dari awal.
+        self.dirty = False
+        self.history_replaced = False
+        self.new_messages: List[Dict] = []
+        self.session_files_cleared = False
+        self.changed_files: Dict[str, str] = {}
+
+    def merge_pending(self, previous: "UserContext"):
+        # Menggabungkan perubahan yang belum tersimpan dari versi sebelumnya (lebih lama)
+        # ke dalam versi ini, sehingga satu flush cukup untuk menulis keduanya.
+        if not self.history_replaced:
+            self.history_replaced = previous.history_replaced
+            self.new_messages = previous.new_messages + self.new_messages
+        if not self.session_files_cleared:
+            self.session_files_cleared = previous.session_files_cleared
+            self.changed_files = {**previous.changed_files, **self.changed_files}
+        self.staged_blobs = {**previous.staged_blobs, **self.staged_blobs}
+        self.prune_staged()
+        self.dirty = self.dirty or previous.dirty
+
+    def apply_pending(self, change: "UserContext"):
+        # Menerapkan perubahan satu unit kerja ke versi ini (entri cache). Hanya deltanya yang
+        # diterapkan, sehingga perubahan unit kerja lain yang di-commit setelah `change` dimuat
+        # tidak tertimpa oleh salinan riwayat/file sesi yang sudah usang.
+        if change.history_replaced:
+            self.replace_history(list(change.history))
+        elif change.new_messages:
+            self.history.extend(change.new_messages)
+            self.new_messages.extend(change.new_messages)
+
+        if change.session_files_cleared:
+            self.clear_session_files()
+            self.active_session_name = change.active_session_name
+        elif change.changed_files:
+            self.active_session_name = self.active_session_name or change.active_session_name
+        for name, blob_hash in change.changed_files.items():
+            self.session_files[name] = blob_hash
+            self.changed_files[name] = blob_hash
+            if name in change.file_meta:
+                self.file_meta[name] = change.file_meta[name]
+            else:
+                self.file_meta.pop(name, None)
+            if blob_hash in change.staged_blobs:
+                self.staged_blobs[blob_hash] = change.staged_blobs[blob_hash]
+
+        self.updated_at = change.updated_at
+        self.dirty = True
+        self.prune_staged()
+
+    def staged_for(self, hashes) -> List[StagedBlob]:
+        return [self.staged_blobs[blob_hash] for blob_hash in set(hashes) if blob_hash in self.staged_blobs]
+
+    def prune_staged(self):
+        # Konten file yang sudah diganti atau dihapus dari sesi tidak perlu ditahan lagi.
+        referenced = set(self.session_files.values()) | set(self.changed_files.values())
+        self.staged_blobs = {
+            blob_hash: blob for blob_hash, blob in self.staged_blobs.items() if blob_hash in referenced
+        }
+
+    def copy(self, include_pending: bool = True) -> "UserContext":
+        context = UserContext(
+            self.user_id, 
+            list(self.history), 
+            self.active_session_name, 
+            dict(self.session_files), 
+            self.blob_store
+        )
+        context.file_meta = dict(self.file_meta)
+        context.staged_blobs = dict(self.staged_blobs)
+        context.updated_at = self.updated_at
+        if include_pending:
+            context.dirty = self.dirty
+            context.history_replaced = self.history_replaced
+            context.new_messages = list(self.new_messages)
+            context.session_files_cleared = self.session_files_cleared
+            context.changed_files = dict(self.changed_files)
+        return context
+
+    def as_dict(self) -> Dict:
+        return {
+            'history': self.history,
+            'active_session_name': self.active_session_name,
+            'session_files': self.session_files
+        }
+
+    def replace_history(self, history: List):
+        self.history = history
+        self.history_replaced = True
+        self.new_messages = []
+        self.dirty = True
+
+    def append_turn(self, user_text: str, model_text: str):
+        turn = [
+            {'role': 'user', 'parts': [user_text]},
+            {'role': 'model', 'parts': [model_text]}
+        ]
+        self.history.extend(turn)
+        self.new_messages.extend(turn)
+        self.dirty = True
+
+    def clear_session_files(self):
+        self.session_files = {}
+        self.file_meta = {}
+        self.staged_blobs = {}
+        self.session_files_cleared = True
+        self.changed_files = {}
+        self.dirty = True
+
+    def end_session(self) -> Optional[str]:
+        session_name = self.active_session_name
         if session_name:
-            context['active_session_name'] = None
-            context['session_files'] = {}
-            await self.save_context(user_id, context['history'], None, {})
+            self.active_session_name = None
+            self.clear_session_files()
         return session_name
     
-    async def add_file_to_session(self, user_id: int, file_name: str, file_content: str):
-        context = await self.get_context(user_id)
-        session_files = context.get('session_files', {})
-        session_files[file_name] = file_content
-        session_name = context.get('active_session_name') or f"Sesi Otomatis"
-        await self.save_context(user_id, context['history'], session_name, session_files)
+    def add_file(self, file_name: str, file_content: str, meta: Optional[Dict] = None):
+        blob = self.blob_store.stage(file_content)
+        blob_hash = blob.hash
+        self.staged_blobs[blob_hash] = blob
+        self.session_files[file_name] = blob_hash
+        if meta:
+            self.file_meta[file_name] = meta
+        else:
+            self.file_meta.pop(file_name, None)
+        self.changed_files[file_name] = blob_hash
+        self.active_session_name = self.active_session_name or "Sesi Otomatis"
+        self.dirty = True
 
-    async def add_web_search_to_session(self, user_id: int, query: str, search_results: List[Dict]):
-        context = await self.get_context(user_id)
-        session_files = context.get('session_files', {})
+    def add_web_search(self, query: str, search_results: List[Dict]):
         formatted_results = f"Hasil pencarian untuk kueri '{query}':\n\n"
         
         for i, result in enumerate(search_results):
@@ -137,16 +558,27 @@ class ContextManager:
             )
         
         file_name = f"Konteks Web: '{query[:50]}...'"
-        session_files[file_name] = formatted_results
-        session_name = context.get('active_session_name') or "Sesi Otomatis"
-        await self.save_context(user_id, context['history'], session_name, session_files)
+        self.add_file(file_name, formatted_results)
 
-    async def get_session_files_context(self, user_id: int) -> Optional[str]:
-        context = await self.get_context(user_id)
-        session_files = context.get('session_files', {})
-        
-        if not session_files:
+    async def get_session_files_context(
+        self, 
+        query: Optional[str] = None, 
+        token_budget: int = config.SESSION_CONTEXT_TOKEN_BUDGET,
+        top_k: int = RETRIEVAL_TOP_K
+    ) -> Optional[str]:
+        if not self.session_files:
             return None
+
+        contents = await self.blob_store.get_many(self.session_files.values(), self.staged_blobs)
+        for name, blob_hash in self.session_files.items():
+            if blob_hash not in contents:
+                logging.warning(f"Konten file sesi '{name}' tidak ditemukan di blob store.")
+        indexes = await self.blob_store.get_indexes(contents, self.staged_blobs)
+
+        # Hanya potongan yang paling relevan dengan pertanyaan (BM25) yang dikirim ke model.
+        sources = [(name, blob_hash) for name, blob_hash in self.session_files.items() if blob_hash in contents]
+        documents = [(contents[blob_hash], indexes[blob_hash]) for _, blob_hash in sources]
+        selected = select_chunks(query, documents, token_budget, top_k)
         
         full_context = (
             "KONTEKS TAMBAHAN: Selain pengetahuan umum Anda, gunakan informasi dari "
@@ -154,8 +586,13 @@ class ContextManager:
             "memperkaya jawaban Anda jika relevan dengan pertanyaan pengguna.\n\n"
         )
         
-        for i, (name, content) in enumerate(session_files.items()):
-            full_context += f"--- KONTEN SUMBER {i+1}: `{name}` ---\n"
-            full_context += f"{content[:4000]}...\n"
+        for file_pos, (name, blob_hash) in enumerate(sources):
+            chunks = [(chunk_pos, chunk) for pos, chunk_pos, chunk in selected if pos == file_pos]
+            if not chunks:
+                continue
+            total_chunks = len(indexes[blob_hash].spans)
+            full_context += f"--- KONTEN SUMBER {file_pos+1}: `{name}`{describe_file_meta(self.file_meta.get(name))} ---\n"
+            for chunk_pos, chunk in chunks:
+                full_context += f"[Bagian {chunk_pos+1}/{total_chunks}]\n{chunk}\n\n"
             full_context += f"--- AKHIR KONTEN: `{name}` ---\n\n"
         return full_context
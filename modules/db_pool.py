@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import aiosqlite
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+
+DB_POOL_SIZE = 4
+DB_STATEMENT_CACHE_SIZE = 128
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA busy_timeout=5000",
+)
+
+class ConnectionPool:
+    def __init__(self, db_file: str, size: int = DB_POOL_SIZE, statement_cache_size: int = DB_STATEMENT_CACHE_SIZE):
+        self.db_file = db_file
+        self.size = max(1, size)
+        self.statement_cache_size = statement_cache_size
+        self._connections: List[aiosqlite.Connection] = []
+        self._available: Optional[asyncio.Queue] = None
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._available is not None
+
+    async def open(self):
+        if self.is_open:
+            return
+        available = asyncio.Queue()
+
+        for _ in range(self.size):
+            # sqlite3 menyimpan prepared statement per koneksi (cached_statements),
+            # sehingga SQL yang sama dipakai ulang tanpa kompilasi ulang.
+            conn = await aiosqlite.connect(self.db_file, cached_statements=self.statement_cache_size)
+            for pragma in DB_PRAGMAS:
+                await conn.execute(pragma)
+            self._connections.append(conn)
+            available.put_nowait(conn)
+
+        self._available = available
+        logging.info(f"Pool koneksi SQLite dibuka: {self.size} koneksi ke '{self.db_file}' (WAL).")
+
+    @asynccontextmanager
+    async def acquire(self):
+        if not self.is_open:
+            raise RuntimeError("Pool koneksi belum dibuka. Panggil open() terlebih dahulu.")
+        conn = await self._available.get()
+        try:
+            yield conn
+        finally:
+            self._available.put_nowait(conn)
+
+    @asynccontextmanager
+    async def transaction(self):
+        # SQLite hanya mengizinkan satu penulis; antrean di sisi asyncio lebih murah
+        # daripada membiarkan koneksi saling menunggu lewat busy_timeout.
+        async with self._write_lock:
+            async with self.acquire() as conn:
+                try:
+                    yield conn
+                    await conn.commit()
+                except BaseException:
+                    await conn.rollback()
+                    raise
+
+    async def close(self):
+        if not self.is_open:
+            return
+        self._available = None
+
+        for conn in self._connections:
+            try:
+                await conn.close()
+            except Exception as e:
+                logging.warning(f"Gagal menutup koneksi SQLite: {e}")
+        self._connections.clear()
+        logging.info(f"Pool koneksi SQLite ke '{self.db_file}' ditutup.")
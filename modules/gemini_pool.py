@@ -0,0 +1,298 @@
+import re
+import time
+import dataclasses
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as api_exceptions
+from . import config
+from .prompt_builder import estimate_tokens
+
+
+GEMINI_KEY_RPM = 10
+GEMINI_KEY_COOLDOWN = 60.0
+GEMINI_KEY_MAX_WAIT = 30.0
+# Kunci yang ditolak (tidak valid/tidak berizin) diistirahatkan jauh lebih lama.
+GEMINI_KEY_INVALID_COOLDOWN = 3600.0
+GEMINI_TRANSIENT_COOLDOWN = 5.0
+RATE_WINDOW = 60.0
+RETRY_DELAY_REGEX = re.compile(r'retry in ([\d.]+)s|seconds:\s*(\d+)', re.IGNORECASE)
+CONTINUE_PROMPT = (
+    "Koneksi terputus di tengah jawaban. Lanjutkan jawaban Anda tepat dari kata terakhir di atas, "
+    "tanpa mengulang bagian yang sudah ditulis dan tanpa kalimat pembuka."
+)
+# Batas bawah token output untuk lanjutan stream, agar estimasi yang terlalu besar tidak
+# membuat permintaan lanjutan tanpa ruang sama sekali.
+CONTINUE_MIN_OUTPUT_TOKENS = 256
+
+class GeminiBusyError(Exception):
+    pass
+
+class _ApiKey:
+    __slots__ = (
+        'key', 'label', 'model', 'sent_at', 'cooldown_until', 'in_flight',
+        'requests', 'throttled', 'errors', 'failovers', 'stream_restarts', 'total_ms'
+    )
+
+    def __init__(self, key: str, index: int):
+        self.key = key
+        self.label = f"key#{index + 1}(...{key[-4:]})"
+        self.model: Optional[genai.GenerativeModel] = None
+        self.sent_at: Deque[float] = deque()
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.failovers = 0
+        self.stream_restarts = 0
+        self.total_ms = 0.0
+
+    def remaining(self, now: float, rpm: int) -> int:
+        while self.sent_at and now - self.sent_at[0] >= RATE_WINDOW:
+            self.sent_at.popleft()
+        return rpm - len(self.sent_at)
+
+    def available_at(self, now: float, rpm: int) -> float:
+        ready_at = self.cooldown_until
+        if self.remaining(now, rpm) <= 0:
+            ready_at = max(ready_at, self.sent_at[0] + RATE_WINDOW)
+        return ready_at
+
+def _retry_delay(error: Exception, default: float) -> float:
+    match = RETRY_DELAY_REGEX.search(str(error))
+    if not match:
+        return default
+    return float(match.group(1) or match.group(2))
+
+def _is_quota_error(error: Exception) -> bool:
+    message = str(error)
+    return isinstance(error, (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)) \
+        or "quota" in message.lower() or "Resource has been exhausted" in message
+
+def _cooldown_for(error: Exception, quota_cooldown: float) -> Optional[float]:
+    # None berarti error bukan masalah kunci/kuota; panggilan tidak diulang di kunci lain.
+    message = str(error)
+    if _is_quota_error(error):
+        return _retry_delay(error, quota_cooldown)
+    if isinstance(error, (api_exceptions.PermissionDenied, api_exceptions.Unauthenticated)) or "API key" in message:
+        return GEMINI_KEY_INVALID_COOLDOWN
+    if isinstance(error, (
+        api_exceptions.ServiceUnavailable, api_exceptions.InternalServerError, api_exceptions.DeadlineExceeded
+    )):
+        return GEMINI_TRANSIENT_COOLDOWN
+    return None
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text
+    except (ValueError, AttributeError, IndexError):
+        return ""
+
+def _as_contents(contents) -> List[Any]:
+    if isinstance(contents, list):
+        return list(contents)
+    return [{'role': 'user', 'parts': [contents]}]
+
+def _reduce_output_budget(kwargs: Dict[str, Any], sent_text: str) -> Dict[str, Any]:
+    # Lanjutan stream hanya boleh memakai sisa anggaran max_output_tokens, bukan anggaran
+    # penuh lagi; token yang sudah terkirim diperkirakan dari teksnya.
+    generation_config = kwargs.get('generation_config')
+    if isinstance(generation_config, dict):
+        max_tokens = generation_config.get('max_output_tokens')
+    else:
+        max_tokens = getattr(generation_config, 'max_output_tokens', None)
+    if not max_tokens:
+        return kwargs
+
+    remaining = max(max_tokens - estimate_tokens(sent_text), CONTINUE_MIN_OUTPUT_TOKENS)
+    if isinstance(generation_config, dict):
+        generation_config = {**generation_config, 'max_output_tokens': remaining}
+    else:
+        generation_config = dataclasses.replace(generation_config, max_output_tokens=remaining)
+    return {**kwargs, 'generation_config': generation_config}
+
+class _PooledModel:
+    # Pengganti genai.GenerativeModel untuk pemanggil: setiap generate_content_async memilih
+    # kunci sendiri, sehingga tidak ada state global yang diubah di antara pengguna.
+    def __init__(self, pool: "GeminiKeyPool"):
+        self.pool = pool
+        self.model_name = pool.model_name
+
+    async def generate_content_async(self, contents, *, stream: bool = False, **kwargs):
+        if stream:
+            return self.pool.stream(contents, **kwargs)
+        return await self.pool.generate(contents, **kwargs)
+
+class GeminiKeyPool:
+    def __init__(
+        self,
+        keys: List[str],
+        model_name: str,
+        rpm: int = GEMINI_KEY_RPM,
+        cooldown: float = GEMINI_KEY_COOLDOWN,
+        max_wait: float = GEMINI_KEY_MAX_WAIT
+    ):
+        self.model_name = model_name
+        self.rpm = rpm
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.keys = [_ApiKey(key, index) for index, key in enumerate(keys)]
+        self.model = _PooledModel(self)
+        self.waits = 0
+        self.rejected = 0
+
+    def _model_for(self, api_key: _ApiKey) -> genai.GenerativeModel:
+        # Klien dibuat sekali per kunci (di dalam event loop, karena transport gRPC asyncio
+        # terikat ke loop), lalu dipasang langsung ke model alih-alih lewat genai.configure.
+        # _async_client adalah atribut privat GenerativeModel; diuji dengan google-generativeai
+        # 0.8.6 (versi dikunci di requirements.txt) dan perlu dicek ulang saat versi dinaikkan.
+        if api_key.model is None:
+            model = genai.GenerativeModel(self.model_name)
+            model._async_client = glm.GenerativeServiceAsyncClient(client_options={'api_key': api_key.key})
+            api_key.model = model
+        return api_key.model
+
+    def _pick(self, now: float, exclude: set) -> Optional[_ApiKey]:
+        candidates = [
+            api_key for api_key in self.keys
+            if api_key not in exclude and api_key.cooldown_until <= now and api_key.remaining(now, self.rpm) > 0
+        ]
+        if not candidates:
+            return None
+        # Sisa kuota menit ini terbanyak lebih dulu; seri diputus dengan jumlah panggilan berjalan.
+        return max(candidates, key=lambda api_key: (api_key.remaining(now, self.rpm), -api_key.in_flight))
+
+    async def _acquire(self, exclude: set) -> _ApiKey:
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while True:
+            now = time.monotonic()
+            api_key = self._pick(now, exclude) or self._pick(now, set())
+            if api_key is not None:
+                api_key.sent_at.append(now)
+                api_key.in_flight += 1
+                api_key.requests += 1
+                return api_key
+
+            ready_at = min(api_key.available_at(now, self.rpm) for api_key in self.keys)
+            if ready_at > deadline:
+                self.rejected += 1
+                raise GeminiBusyError("Semua kunci API Gemini sedang dibatasi.")
+            if not waited:
+                self.waits += 1
+                waited = True
+            await asyncio.sleep(max(ready_at - now, 0.05))
+
+    def _release(self, api_key: _ApiKey, started_at: float, error: Optional[Exception] = None) -> bool:
+        # Mengembalikan True jika panggilan boleh diulang di kunci lain.
+        api_key.in_flight -= 1
+        api_key.total_ms += (time.monotonic() - started_at) * 1000
+        if error is None:
+            return False
+        api_key.errors += 1
+        cooldown = _cooldown_for(error, self.cooldown)
+        if cooldown is None:
+            return False
+        if _is_quota_error(error):
+            api_key.throttled += 1
+        api_key.cooldown_until = max(api_key.cooldown_until, time.monotonic() + cooldown)
+        logging.warning(f"Kunci Gemini {api_key.label} diistirahatkan {cooldown:.0f} detik: {error}")
+        return True
+
+    @property
+    def max_attempts(self) -> int:
+        return max(2, len(self.keys))
+
+    async def generate(self, contents, **kwargs):
+        tried = set()
+        for attempt in range(self.max_attempts):
+            api_key = await self._acquire(tried)
+            tried.add(api_key)
+            started_at = time.monotonic()
+            try:
+                response = await self._model_for(api_key).generate_content_async(contents, **kwargs)
+            except Exception as e:
+                if not self._release(api_key, started_at, e) or attempt + 1 == self.max_attempts:
+                    raise
+                api_key.failovers += 1
+                continue
+            except BaseException:
+                self._release(api_key, started_at)
+                raise
+            self._release(api_key, started_at)
+            return response
+
+    async def stream(self, contents, **kwargs) -> AsyncIterator[Any]:
+        # Kegagalan sebelum potongan pertama cukup diulang di kunci lain. Jika stream putus di
+        # tengah jalan, teks yang sudah terkirim diberikan sebagai giliran model dan kunci
+        # berikutnya diminta melanjutkan, jadi pemanggil tetap menerima satu stream utuh.
+        request = _as_contents(contents)
+        request_kwargs = kwargs
+        partial_text = ""
+        tried = set()
+        for attempt in range(self.max_attempts):
+            api_key = await self._acquire(tried)
+            tried.add(api_key)
+            started_at = time.monotonic()
+            try:
+                response = await self._model_for(api_key).generate_content_async(request, stream=True, **request_kwargs)
+                async for chunk in response:
+                    partial_text += _chunk_text(chunk)
+                    yield chunk
+            except Exception as e:
+                if not self._release(api_key, started_at, e) or attempt + 1 == self.max_attempts:
+                    raise
+                api_key.failovers += 1
+                if partial_text:
+                    api_key.stream_restarts += 1
+                    logging.warning(f"Stream Gemini putus setelah {len(partial_text)} karakter, dilanjutkan di kunci lain.")
+                    request = _as_contents(contents) + [
+                        {'role': 'model', 'parts': [partial_text]},
+                        {'role': 'user', 'parts': [CONTINUE_PROMPT]},
+                    ]
+                    request_kwargs = _reduce_output_budget(kwargs, partial_text)
+                continue
+            except BaseException:
+                # Pemanggil berhenti membaca (mis. tombol Hentikan) atau task dibatalkan.
+                self._release(api_key, started_at)
+                raise
+            self._release(api_key, started_at)
+            return
+
+    async def close(self):
+        for api_key in self.keys:
+            if api_key.model is not None:
+                await api_key.model._async_client.transport.close()
+                api_key.model = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            'waits': self.waits,
+            'rejected': self.rejected,
+            'keys': {
+                api_key.label: {
+                    'requests': api_key.requests,
+                    'rpm_used': self.rpm - api_key.remaining(now, self.rpm),
+                    'throttled': api_key.throttled,
+                    'errors': api_key.errors,
+                    'failovers': api_key.failovers,
+                    'stream_restarts': api_key.stream_restarts,
+                    'cooldown_s': round(max(0.0, api_key.cooldown_until - now), 1),
+                    'avg_ms': round(api_key.total_ms / api_key.requests, 1) if api_key.requests else 0.0,
+                }
+                for api_key in self.keys
+            },
+        }
+
+gemini_pool = GeminiKeyPool(
+    config.GEMINI_API_KEYS,
+    config.GEMINI_MODEL,
+    config.GEMINI_KEY_RPM,
+    config.GEMINI_KEY_COOLDOWN,
+    config.GEMINI_KEY_MAX_WAIT
+)
@@ -1,128 +1,224 @@
-import asyncio
 import re
-import io
+import time
+import asyncio
 import logging
-import fitz
-import docx
-import pandas as pd
-import pptx
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Optional
 from telebot import types
-from telebot.asyncio_helper import ApiTelegramException
-from .bot_setup import bot, context_manager 
-from .llm_text import generate_response_stream, _summarize_text_async
+from . import config
+from .bot_setup import bot, context_manager, parser_pool
+from .context_manager import describe_file_meta
+from .llm_text import generate_response_stream
 from .llm_vision import generate_response_from_image_stream
 from .voice_handler import process_voice_message
+from .transcription import TranscriptionBusyError
 from .web_handler import extract_content_from_url
-from .utils import send_or_edit_message
+from .parsers import parse_document
+from .parser_pool import ParserError
+from .utils import outbound_call, send_or_edit_message
+from .markdown_renderer import StreamingMarkdownRenderer, escape_html
 
 
 TELEGRAM_MAX_MESSAGE_LENGTH = 4096
-SUMMARY_THRESHOLD = 3800
 URL_REGEX = r'(https?://\S+)'
+BUSY_TEXT = "🕒 Terlalu banyak permintaan yang sedang diproses. Coba lagi sebentar lagi."
 stop_requests = {}
 
-def escape_html(text: str) -> str:
-    if not isinstance(text, str):
-        return ""
-    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+def _summarize_ms(values) -> dict:
+    ordered = sorted(values)
+    return {
+        'avg_ms': round(sum(ordered) / len(ordered), 1),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+    }
 
-def convert_markdown_to_html_safely(text: str) -> str:
-    text = text.strip()
-    text = re.sub(r'^\s*[\*\-]\s+', '', text, flags=re.MULTILINE)
-    
-    token_regex = re.compile(
-        r'(```(?:[a-zA-Z]+\n)?(?:.|\n)*?```)|'  # Code blocks
-        r'(\*\*.*?\*\*|__.*?__)|'               # Bold
-        r'(\*.*?\*|_.*?_)|'                     # Italic
-        r'(`.*?`)'                              # Inline code
-    )
-    
-    html_parts = []
-    last_end = 0
-    
-    for match in token_regex.finditer(text):
-        start, end = match.span()
-        html_parts.append(escape_html(text[last_end:start]))
-        last_end = end
-        token = match.group(0)
-        
-        if match.group(1):  # Code block
-            inner_content = re.sub(r'^```[a-zA-Z]*\n?|```$', '', token)
-            html_parts.append(f'<pre><code>{escape_html(inner_content.strip())}</code></pre>')
-        elif match.group(2):  # Bold
-            html_parts.append(f'<b>{escape_html(token.strip("*_"))}</b>')
-        elif match.group(3):  # Italic
-            html_parts.append(f'<i>{escape_html(token.strip("*_"))}</i>')
-        elif match.group(4):  # Inline code
-            html_parts.append(f'<code>{escape_html(token.strip("`"))}</code>')
-    
-    html_parts.append(escape_html(text[last_end:]))
-    return "".join(html_parts)
+class ResponseLatencyStats:
+    # Latensi end-to-end per jawaban, dipisah antara jawaban panjang (di atas target panjang)
+    # dan jawaban biasa. finalize_ms adalah jeda dari token terakhir sampai pesan akhir terkirim.
+    def __init__(self, long_threshold: int, max_samples: int = 500):
+        self.long_threshold = long_threshold
+        self.samples = {'long': deque(maxlen=max_samples), 'short': deque(maxlen=max_samples)}
 
-def split_message(html_text: str, limit: int = TELEGRAM_MAX_MESSAGE_LENGTH) -> list[str]:
-    if len(html_text) <= limit:
-        return [html_text]
-    
-    final_chunks = []
-    parts = re.split(r'(<pre><code>.*?</code></pre>)', html_text, flags=re.DOTALL)
+    def record(self, chars: int, first_token_ms: float, total_ms: float, finalize_ms: float):
+        bucket = 'long' if chars > self.long_threshold else 'short'
+        self.samples[bucket].append((first_token_ms, total_ms, finalize_ms))
 
-    for part in parts:
-        if not part:
-            continue
-            
-        if part.startswith('<pre'):
-            if len(part) > limit:
-                final_chunks.extend([part[i:i + limit] for i in range(0, len(part), limit)])
+    def stats(self) -> dict:
+        report = {}
+        for bucket, samples in self.samples.items():
+            if not samples:
+                report[bucket] = {'responses': 0}
+                continue
+            first_token, total, finalize = zip(*samples)
+            report[bucket] = {
+                'responses': len(samples),
+                'first_token': _summarize_ms(first_token),
+                'total': _summarize_ms(total),
+                'finalize': _summarize_ms(finalize),
+            }
+        return report
+
+response_latency = ResponseLatencyStats(config.RESPONSE_TARGET_CHARS)
+
+class AdmissionRejected(Exception):
+    pass
+
+class _Ticket:
+    __slots__ = ('user_id', 'future', 'enqueued_at')
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+class AdmissionController:
+    # Satu pipeline aktif per pengguna (pesan berikutnya menunggu FIFO, jadi giliran tidak
+    # saling menimpa saat konteks disimpan) dan anggaran global untuk generasi yang berjalan.
+    # Slot yang kosong dibagi bergiliran antar pengguna, bukan menurut urutan kedatangan,
+    # sehingga satu pengguna yang mengirim banyak pesan tidak menahan pengguna lain.
+    def __init__(self, max_active: int, max_queued_per_user: int, max_queued: int, max_samples: int = 500):
+        self.max_active = max_active
+        self.max_queued_per_user = max_queued_per_user
+        self.max_queued = max_queued
+        self.active_users = set()
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.max_waiting = 0
+        self.wait_samples: Deque[float] = deque(maxlen=max_samples)
+        # Urutan OrderedDict dipakai untuk round-robin antar pengguna.
+        self._queues: "OrderedDict[int, Deque[_Ticket]]" = OrderedDict()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, on_queued: Optional[Callable[[int], Awaitable]] = None):
+        ticket = self._enqueue(user_id)
+        try:
+            if not ticket.future.done():
+                self.queued += 1
+                if on_queued:
+                    await on_queued(self._position(ticket))
+                await ticket.future
+        except BaseException:
+            if ticket.future.done() and not ticket.future.cancelled():
+                self._release(user_id)
             else:
-                final_chunks.append(part)
-            continue
+                ticket.future.cancel()
+                self._discard(ticket)
+            raise
 
-        chunks = []
-        current_chunk = ""
-        open_tags = []
-        sub_parts = re.split(r'(<[^>]+>)', part)
-        
-        for sub_part in sub_parts:
-            if not sub_part:
+        self.wait_samples.append((time.monotonic() - ticket.enqueued_at) * 1000)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def _enqueue(self, user_id: int) -> _Ticket:
+        queue = self._queues.get(user_id)
+        if queue is not None and len(queue) >= self.max_queued_per_user:
+            self.shed += 1
+            raise AdmissionRejected("Terlalu banyak pesan dari pengguna ini yang masih menunggu.")
+        if self.waiting >= self.max_queued:
+            self.shed += 1
+            raise AdmissionRejected("Antrean generasi penuh.")
+
+        ticket = _Ticket(user_id)
+        self._queues.setdefault(user_id, deque()).append(ticket)
+        self.waiting += 1
+        self._dispatch()
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        return ticket
+
+    def _position(self, ticket: _Ticket) -> int:
+        # Urutan tiket menurut round-robin: tiket pengguna yang sama yang lebih dulu, ditambah
+        # tiket pengguna lain yang dilayani pada putaran yang sama atau sebelumnya.
+        index = self._queues[ticket.user_id].index(ticket)
+        position = index + 1
+        ahead_in_round = True
+        for user_id, queue in self._queues.items():
+            if user_id == ticket.user_id:
+                ahead_in_round = False
                 continue
-                
-            if len(current_chunk) + len(sub_part) > limit:
-                for open_tag in reversed(open_tags):
-                    tag_name = open_tag.strip('<>').split()[0]
-                    current_chunk += f"</{tag_name}>"
-                chunks.append(current_chunk)
-                current_chunk = "".join(open_tags)
-            
-            current_chunk += sub_part
-
-            if sub_part.startswith('<') and not sub_part.startswith('</'):
-                if not sub_part.endswith('/>'):
-                    open_tags.append(sub_part)
-            elif sub_part.startswith('</'):
-                tag_name_to_close = sub_part.strip('</> ')
-                for i in range(len(open_tags) - 1, -1, -1):
-                    open_tag = open_tags[i]
-                    open_tag_name = open_tag.strip('<>').split()[0]
-                    if open_tag_name == tag_name_to_close:
-                        open_tags.pop(i)
-                        break
+            position += min(len(queue), index + 1 if ahead_in_round else index)
+        return position
+
+    def _dispatch(self):
+        while len(self.active_users) < self.max_active:
+            user_id = next((user_id for user_id in self._queues if user_id not in self.active_users), None)
+            if user_id is None:
+                return
+            queue = self._queues[user_id]
+            ticket = queue.popleft()
+            self.waiting -= 1
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if ticket.future.done():
+                continue
+            self.active_users.add(user_id)
+            self.admitted += 1
+            ticket.future.set_result(None)
+
+    def _discard(self, ticket: _Ticket):
+        queue = self._queues.get(ticket.user_id)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        self.waiting -= 1
+        if not queue:
+            del self._queues[ticket.user_id]
+
+    def _release(self, user_id: int):
+        self.active_users.discard(user_id)
+        self._dispatch()
+
+    def stats(self) -> Dict:
+        report = {
+            'active': len(self.active_users),
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'shed': self.shed,
+        }
+        if self.wait_samples:
+            report['wait'] = _summarize_ms(self.wait_samples)
+            report['wait']['max_ms'] = round(max(self.wait_samples), 1)
+        return report
 
-        if current_chunk:
-            chunks.append(current_chunk)
-        final_chunks.extend(chunks)
+admission = AdmissionController(
+    config.MAX_ACTIVE_GENERATIONS, 
+    config.MAX_QUEUED_PER_USER, 
+    config.MAX_QUEUED_GENERATIONS
+)
 
-    return final_chunks if final_chunks else [html_text]
+async def _roll_over_page(chat_id: int, live_msg: types.Message, page_html: str, markup) -> types.Message:
+    # Pesan yang penuh difinalkan (tanpa tombol), lalu streaming berlanjut di pesan baru,
+    # sehingga hanya pesan terakhir yang terus diedit.
+    await send_or_edit_message(chat_id, page_html, live_msg, parse_mode='HTML')
+    next_msg = await send_or_edit_message(chat_id, "▌", None, reply_markup=markup)
+    if next_msg is None:
+        raise RuntimeError("Gagal membuat pesan lanjutan untuk streaming.")
+    return next_msg
 
 async def stream_response(chat_id: int, placeholder_msg: types.Message, response_generator):
     full_response = ""
-    last_edit_time = 0
+    renderer = StreamingMarkdownRenderer(page_limit=TELEGRAM_MAX_MESSAGE_LENGTH)
     typing_cursor = "▌"
+    started_at = time.monotonic()
+    first_token_at = last_token_at = None
+    stop_markup = types.InlineKeyboardMarkup().add(
+        types.InlineKeyboardButton("⏹️ Hentikan", callback_data=f"stop_{chat_id}")
+    )
     stop_requests[chat_id] = False
     
     try:
         async for chunk in response_generator:
             if stop_requests.get(chat_id):
-                full_response += "\n\n_Proses dihentikan oleh pengguna._"
+                stop_note = "\n\n_Proses dihentikan oleh pengguna._"
+                full_response += stop_note
+                renderer.feed(stop_note)
                 break
                 
             if isinstance(chunk, dict):
@@ -136,23 +232,26 @@ async def stream_response(chat_id: int, placeholder_msg: types.Message, response
                     }
                     status_text = status_map.get(chunk['event'])
                     if status_text:
-                        placeholder_msg = await send_or_edit_message(
-                            chat_id, status_text, placeholder_msg, parse_mode='HTML'
+                        await send_or_edit_message(
+                            chat_id, status_text, placeholder_msg, wait=False, parse_mode='HTML'
                         )
                     
                     if chunk['event'] == 'RESEARCH_QUERY':
                         query_text = escape_html(chunk.get('data', '...'))
-                        placeholder_msg = await send_or_edit_message(
+                        await send_or_edit_message(
                             chat_id, 
                             f"🤖🔎 Mencari: <i>\"{query_text}\"</i>", 
                             placeholder_msg, 
+                            wait=False,
                             parse_mode='HTML'
                         )
                     continue
                     
                 elif chunk['type'] == 'image':
-                    await bot.delete_message(chat_id, placeholder_msg.message_id)
-                    await bot.send_photo(
+                    await outbound_call(chat_id, bot.delete_message, chat_id, placeholder_msg.message_id)
+                    await outbound_call(
+                        chat_id, 
+                        bot.send_photo, 
                         chat_id, 
                         chunk['data'], 
                         caption=f"🖼️ <code>{escape_html(chunk['caption'])}</code>", 
@@ -161,40 +260,45 @@ async def stream_response(chat_id: int, placeholder_msg: types.Message, response
                     return
                     
                 elif chunk['type'] == 'stream_end':
-                    full_response = chunk['full_text']
+                    if chunk['full_text'] != full_response:
+                        full_response = chunk['full_text']
+                        renderer = StreamingMarkdownRenderer(page_limit=TELEGRAM_MAX_MESSAGE_LENGTH)
+                        renderer.feed(full_response)
                     break
                     
                 elif chunk['type'] == 'text':
                     data = chunk.get('data', '')
+                    last_token_at = time.monotonic()
+                    first_token_at = first_token_at or last_token_at
                     if isinstance(data, str):
                         full_response += data
+                        renderer.feed(data)
                     else:
                         full_response = str(data)
+                        renderer = StreamingMarkdownRenderer(page_limit=TELEGRAM_MAX_MESSAGE_LENGTH)
+                        renderer.feed(full_response)
                         break
             
-            current_time = asyncio.get_event_loop().time()
-            if current_time - last_edit_time > 1.2 and full_response:
-                markup = types.InlineKeyboardMarkup().add(
-                    types.InlineKeyboardButton("⏹️ Hentikan", callback_data=f"stop_{chat_id}")
-                )
-                placeholder_msg = await send_or_edit_message(
+            # Edit tidak ditunggu: scheduler keluar mengatur laju per chat dan hanya mengirim
+            # teks terbaru jika beberapa edit menumpuk. Renderer selalu menghasilkan HTML yang
+            # valid untuk prefiks saat ini, jadi edit tidak ditolak karena Markdown terpotong.
+            live_html = renderer.render()
+            for page_html in renderer.take_pages():
+                placeholder_msg = await _roll_over_page(chat_id, placeholder_msg, page_html, stop_markup)
+            if live_html:
+                await send_or_edit_message(
                     chat_id, 
-                    full_response + typing_cursor, 
+                    live_html + typing_cursor, 
                     placeholder_msg, 
-                    parse_mode='Markdown', 
-                    reply_markup=markup
+                    wait=False,
+                    parse_mode='HTML', 
+                    reply_markup=stop_markup
                 )
-                last_edit_time = current_time
-
-        final_text_to_send = full_response
-        if len(full_response) > SUMMARY_THRESHOLD:
-            placeholder_msg = await send_or_edit_message(
-                chat_id, "🤖🔍 Menganalisis...", placeholder_msg
-            )
-            final_text_to_send = await _summarize_text_async(full_response)
 
-        final_html = convert_markdown_to_html_safely(final_text_to_send.strip())
-        message_chunks = split_message(final_html)
+        # Panjang jawaban sudah dibatasi saat generasi (target panjang di prompt dan batas token
+        # output), jadi tidak ada panggilan ringkasan kedua setelah stream selesai. Halaman yang
+        # sudah dikirim saat streaming tidak diedit lagi; hanya sisa halaman.
+        message_chunks = renderer.take_pages() + renderer.finish()
         
         current_placeholder = placeholder_msg
         for i, text_chunk in enumerate(message_chunks):
@@ -203,7 +307,20 @@ async def stream_response(chat_id: int, placeholder_msg: types.Message, response
                     chat_id, text_chunk, current_placeholder, parse_mode='HTML'
                 )
             else:
-                await bot.send_message(chat_id, text_chunk, parse_mode='HTML')
+                await outbound_call(chat_id, bot.send_message, chat_id, text_chunk, parse_mode='HTML')
+
+        if first_token_at is not None:
+            done_at = time.monotonic()
+            response_latency.record(
+                len(full_response),
+                (first_token_at - started_at) * 1000,
+                (done_at - started_at) * 1000,
+                (done_at - last_token_at) * 1000
+            )
+            logging.info(
+                f"Respons {len(full_response)} karakter: token pertama {(first_token_at - started_at):.2f} detik, "
+                f"selesai {(done_at - started_at):.2f} detik, finalisasi {(done_at - last_token_at):.2f} detik."
+            )
                 
     except Exception as e:
         logging.error(f"Error tak terduga saat menangani respons stream: {e}", exc_info=True)
@@ -247,27 +364,68 @@ def _get_back_to_session_menu_markup():
 
 @bot.message_handler(commands=['start'])
 async def handle_start_command(message):
-    await context_manager.reset_context(message.from_user.id)
-    await bot.send_message(message.chat.id, "<b>🤖👋 Halo! Saya GHOST.</b>", parse_mode="HTML")
+    user_id = message.from_user.id
+    try:
+        await _mutate_context(user_id, lambda: context_manager.reset_context(user_id))
+    except AdmissionRejected as e:
+        logging.warning(f"Reset dari pengguna {user_id} ditolak: {e}")
+    await outbound_call(message.chat.id, bot.send_message, message.chat.id, "<b>🤖👋 Halo! Saya GHOST.</b>", parse_mode="HTML")
 
 @bot.message_handler(commands=['menu'])
 async def handle_menu_command(message):
     markup = _get_main_menu_markup()
-    await bot.send_message(
+    await outbound_call(
+        message.chat.id, 
+        bot.send_message, 
         message.chat.id, 
         "<b>⚙️ Menu GHOST</b>\n\nPilih fitur di bawah:", 
         reply_markup=markup, 
         parse_mode="HTML"
     )
 
+async def _mutate_context(user_id: int, action: Callable[[], Awaitable]):
+    # Unggahan, akhiri sesi, dan reset memakai slot per pengguna yang sama dengan pipeline
+    # generasi, sehingga tidak berjalan bersamaan dengan giliran yang sedang disimpan.
+    async with admission.slot(user_id):
+        return await action()
+
+async def _stream_admitted(message, placeholder_msg: types.Message, start_text: str, make_generator):
+    # Generator baru dibuat setelah mendapat slot, jadi konteks pengguna dibaca setelah
+    # giliran sebelumnya selesai disimpan.
+    queued = False
+
+    async def show_queue_position(position):
+        nonlocal queued
+        queued = True
+        await send_or_edit_message(
+            message.chat.id, 
+            f"⏳ Permintaan Anda dalam antrean (ke-{position})...", 
+            placeholder_msg, 
+            parse_mode='HTML'
+        )
+
+    try:
+        async with admission.slot(message.from_user.id, show_queue_position):
+            if queued:
+                await send_or_edit_message(message.chat.id, start_text, placeholder_msg, wait=False, parse_mode='HTML')
+            await stream_response(message.chat.id, placeholder_msg, make_generator())
+    except AdmissionRejected as e:
+        logging.warning(f"Permintaan dari pengguna {message.from_user.id} ditolak: {e}")
+        await send_or_edit_message(message.chat.id, BUSY_TEXT, placeholder_msg)
+
 async def process_user_query(message, query_text):
     if not query_text or len(query_text.strip()) < 2:
-        await bot.reply_to(message, "🤖 Pertanyaan kurang jelas.")
+        await outbound_call(message.chat.id, bot.reply_to, message, "🤖 Pertanyaan kurang jelas.")
         return
         
-    placeholder_msg = await bot.reply_to(message, "🤖💭 Berpikir...", parse_mode='HTML')
-    response_generator = generate_response_stream(message.from_user.id, query_text)
-    await stream_response(message.chat.id, placeholder_msg, response_generator)
+    start_text = "🤖💭 Berpikir..."
+    placeholder_msg = await outbound_call(message.chat.id, bot.reply_to, message, start_text, parse_mode='HTML')
+    await _stream_admitted(
+        message, 
+        placeholder_msg, 
+        start_text, 
+        lambda: generate_response_stream(message.from_user.id, query_text)
+    )
 
 @bot.message_handler(content_types=['text'])
 async def handle_text(message):
@@ -283,8 +441,23 @@ async def handle_text(message):
 @bot.message_handler(content_types=['voice', 'photo', 'document'])
 async def handle_media(message):
     if message.content_type == 'voice':
-        placeholder = await bot.reply_to(message, "🤖🎙️ Memproses pesan suara...", parse_mode='HTML')
-        transcribed_text = await process_voice_message(message)
+        placeholder = await outbound_call(message.chat.id, bot.reply_to, message, "🤖🎙️ Memproses pesan suara...", parse_mode='HTML')
+
+        async def show_queue_position(position):
+            await send_or_edit_message(
+                message.chat.id, 
+                f"🤖🎙️ Menunggu giliran transkripsi (antrean ke-{position})...", 
+                placeholder, 
+                parse_mode='HTML'
+            )
+
+        try:
+            transcribed_text = await process_voice_message(message, show_queue_position)
+        except TranscriptionBusyError:
+            await send_or_edit_message(
+                message.chat.id, "🕒 Terlalu banyak pesan suara yang sedang diproses. Coba lagi sebentar lagi.", placeholder
+            )
+            return
         
         if transcribed_text:
             await send_or_edit_message(
@@ -301,24 +474,29 @@ async def handle_media(message):
             
     elif message.content_type == 'photo':
         prompt = message.caption or "Jelaskan gambar ini secara detail."
-        placeholder_msg = await bot.reply_to(message, "🤖🖼️ Menganalisis gambar...", parse_mode='HTML')
+        start_text = "🤖🖼️ Menganalisis gambar..."
+        placeholder_msg = await outbound_call(message.chat.id, bot.reply_to, message, start_text, parse_mode='HTML')
         
         file_info = await bot.get_file(message.photo[-1].file_id)
         image_bytes = await bot.download_file(file_info.file_path)
-        response_generator = generate_response_from_image_stream(
-            message.from_user.id, prompt, image_bytes
+        await _stream_admitted(
+            message, 
+            placeholder_msg, 
+            start_text, 
+            lambda: generate_response_from_image_stream(message.from_user.id, prompt, image_bytes)
         )
-        await stream_response(message.chat.id, placeholder_msg, response_generator)
         
     elif message.content_type == 'document':
         await handle_document(message)
 
 async def handle_document(message):
     if message.document.file_size > 5 * 1024 * 1024:
-        await bot.reply_to(message, "📁 File terlalu besar (maks 5 MB).")
+        await outbound_call(message.chat.id, bot.reply_to, message, "📁 File terlalu besar (maks 5 MB).")
         return
         
-    placeholder = await bot.reply_to(
+    placeholder = await outbound_call(
+        message.chat.id, 
+        bot.reply_to, 
         message, 
         f"📄 <i>Memproses <code>{escape_html(message.document.file_name)}</code>...</i>", 
         parse_mode='HTML'
@@ -327,36 +505,13 @@ async def handle_document(message):
     try:
         file_info = await bot.get_file(message.document.file_id)
         downloaded_file = await bot.download_file(file_info.file_path)
-        file_name_lower = message.document.file_name.lower()
-        
-        def process_file_sync():
-            if file_name_lower.endswith('.pdf'):
-                with fitz.open(stream=io.BytesIO(downloaded_file), filetype="pdf") as doc:
-                    return "".join(page.get_text() for page in doc)
-                    
-            elif file_name_lower.endswith('.docx'):
-                doc = docx.Document(io.BytesIO(downloaded_file))
-                return "\n".join(para.text for para in doc.paragraphs)
-                
-            elif file_name_lower.endswith('.pptx'):
-                prs = pptx.Presentation(io.BytesIO(downloaded_file))
-                return "\n".join(
-                    shape.text for slide in prs.slides 
-                    for shape in slide.shapes 
-                    if hasattr(shape, "text")
-                )
-                
-            elif file_name_lower.endswith(('.csv', '.xlsx', '.xls')):
-                if file_name_lower.endswith('.csv'):
-                    df = pd.read_csv(io.BytesIO(downloaded_file))
-                else:
-                    df = pd.read_excel(io.BytesIO(downloaded_file))
-                return df.to_string()
-                
-            else:
-                return downloaded_file.decode('utf-8', errors='ignore')
-        
-        file_content = await asyncio.to_thread(process_file_sync)
+        file_content, file_meta = await parser_pool.run(
+            parse_document, 
+            message.document.file_name, 
+            downloaded_file, 
+            config.DOCUMENT_CHAR_BUDGET,
+            config.TABLE_STORE_DIR
+        )
         
         if not file_content.strip():
             await send_or_edit_message(
@@ -367,22 +522,34 @@ async def handle_document(message):
             )
             return
             
-        await context_manager.add_file_to_session(
-            message.from_user.id, message.document.file_name, file_content
+        await _mutate_context(
+            message.from_user.id,
+            lambda: context_manager.add_file_to_session(
+                message.from_user.id, message.document.file_name, file_content, file_meta
+            )
         )
         await send_or_edit_message(
             message.chat.id, 
-            f"✅ Konten dari <code>{escape_html(message.document.file_name)}</code> telah ditambahkan ke sesi.", 
+            f"✅ Konten dari <code>{escape_html(message.document.file_name)}</code>"
+            f"{escape_html(describe_file_meta(file_meta))} telah ditambahkan ke sesi.", 
             placeholder, 
             parse_mode="HTML"
         )
         
+    except ParserError as e:
+        logging.error(f"Gagal memproses file {message.document.file_name}: {e}")
+        await send_or_edit_message(message.chat.id, f"❌ Gagal memproses file: {e}", placeholder)
+
+    except AdmissionRejected as e:
+        logging.warning(f"File dari pengguna {message.from_user.id} ditolak: {e}")
+        await send_or_edit_message(message.chat.id, BUSY_TEXT, placeholder)
+
     except Exception as e:
         logging.error(f"Gagal memproses file {message.document.file_name}: {e}", exc_info=True)
         await send_or_edit_message(message.chat.id, "❌ Gagal memproses file.", placeholder)
 
 async def handle_url_message(message, url):
-    placeholder = await bot.reply_to(message, f"🤖🔗 <i>Menganalisis tautan...</i>", parse_mode='HTML')
+    placeholder = await outbound_call(message.chat.id, bot.reply_to, message, f"🤖🔗 <i>Menganalisis tautan...</i>", parse_mode='HTML')
     content, title = await extract_content_from_url(url)
     
     if not content:
@@ -391,9 +558,15 @@ async def handle_url_message(message, url):
         )
         return
         
-    await context_manager.add_file_to_session(
-        message.from_user.id, f"URL: {title or url}", content
-    )
+    try:
+        await _mutate_context(
+            message.from_user.id,
+            lambda: context_manager.add_file_to_session(message.from_user.id, f"URL: {title or url}", content)
+        )
+    except AdmissionRejected as e:
+        logging.warning(f"Tautan dari pengguna {message.from_user.id} ditolak: {e}")
+        await send_or_edit_message(message.chat.id, BUSY_TEXT, placeholder)
+        return
     await send_or_edit_message(
         message.chat.id, 
         f"✅ Konten dari <b>{escape_html(title)}</b> telah ditambahkan ke sesi.", 
@@ -493,7 +666,13 @@ async def _handle_session_menu_action(call, action):
         )
         
     elif action == "akhir":
-        ended_session = await context_manager.end_session(call.from_user.id)
+        try:
+            ended_session = await _mutate_context(
+                call.from_user.id, lambda: context_manager.end_session(call.from_user.id)
+            )
+        except AdmissionRejected:
+            await send_or_edit_message(chat_id, BUSY_TEXT, placeholder, reply_markup=None)
+            return
         if ended_session:
             msg = f"⏹️ Sesi '<b>{escape_html(ended_session)}</b>' telah diakhiri."
         else:
@@ -505,7 +684,14 @@ async def _handle_session_menu_action(call, action):
 
 async def _handle_reset_action(call, action):
     if action == "confirm":
-        if await context_manager.reset_context(call.from_user.id):
+        try:
+            deleted = await _mutate_context(
+                call.from_user.id, lambda: context_manager.reset_context(call.from_user.id)
+            )
+        except AdmissionRejected:
+            await send_or_edit_message(call.message.chat.id, BUSY_TEXT, call.message)
+            return
+        if deleted:
             await send_or_edit_message(
                 call.message.chat.id, "✅ Semua riwayat telah dihapus.", call.message
             )
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import aiohttp
+from collections import defaultdict
+from typing import Dict, Optional
+
+
+HTTP_USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
+)
+HTTP_POOL_LIMIT = 100
+HTTP_POOL_LIMIT_PER_HOST = 10
+HTTP_DNS_CACHE_TTL = 300
+HTTP_DEFAULT_TIMEOUT = 30
+
+class HostStats:
+    __slots__ = ('requests', 'errors', 'total_ms', 'max_ms', 'new_connections', 'reused_connections')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.new_connections = 0
+        self.reused_connections = 0
+
+    def as_dict(self) -> Dict:
+        completed = self.requests - self.errors
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / completed, 1) if completed else 0.0,
+            'max_ms': round(self.max_ms, 1),
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+        }
+
+class HttpClient:
+    def __init__(
+        self,
+        limit: int = HTTP_POOL_LIMIT,
+        limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+        dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+        timeout: float = HTTP_DEFAULT_TIMEOUT,
+        user_agent: str = HTTP_USER_AGENT
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats: Dict[str, HostStats] = defaultdict(HostStats)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HttpClient belum dibuka.")
+        return self._session
+
+    async def open(self):
+        if self._session is not None and not self._session.closed:
+            return
+        # Satu connector untuk seluruh aplikasi: koneksi TCP/TLS keep-alive dan hasil DNS
+        # dipakai ulang antar permintaan, dengan batas koneksi per host.
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'User-Agent': self.user_agent},
+            trace_configs=[self._build_trace_config()]
+        )
+        logging.info(
+            f"HTTP client dibuka: maks {self.limit} koneksi, {self.limit_per_host} per host, "
+            f"cache DNS {self.dns_cache_ttl} detik."
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def request(self, method: str, url: str, **kwargs):
+        timeout = kwargs.get('timeout')
+        if isinstance(timeout, (int, float)):
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {host: stats.as_dict() for host, stats in self._stats.items()}
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host
+            ctx.started_at = asyncio.get_running_loop().time()
+            self._stats[ctx.host].requests += 1
+
+        async def on_request_end(session, ctx, params):
+            elapsed_ms = (asyncio.get_running_loop().time() - ctx.started_at) * 1000
+            stats = self._stats[ctx.host]
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+        async def on_request_exception(session, ctx, params):
+            self._stats[ctx.host].errors += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self._stats[ctx.host].new_connections += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self._stats[ctx.host].reused_connections += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
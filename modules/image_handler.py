@@ -1,6 +1,7 @@
-import aiohttp
+import asyncio
 import os
 from dotenv import load_dotenv
+from .bot_setup import http_client
 
 
 load_dotenv()
@@ -17,27 +18,26 @@ async def generate_image_from_hf(prompt: str):
     payload = {"inputs": prompt}
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                API_URL, 
-                headers=headers, 
-                json=payload, 
-                timeout=120
-            ) as response:
-                if response.status == 200 and response.headers.get('content-type') == 'image/jpeg':
-                    return await response.read()
-                else:
-                    error_message = await response.json()
-                    print(f"Hugging Face API Error: {error_message}")
-                    
-                    if 'error' in error_message:
-                        if 'is currently loading' in error_message['error']:
-                            return "⏳ Model sedang dimuat. Coba lagi."
-                        return "🖼️❎ Gagal membuat gambar karena gangguan teknis."
-                    
-                    return "🖼️❎ Gagal membuat gambar karena respons tidak valid."
+        async with http_client.post(
+            API_URL, 
+            headers=headers, 
+            json=payload, 
+            timeout=120
+        ) as response:
+            if response.status == 200 and response.headers.get('content-type') == 'image/jpeg':
+                return await response.read()
+            else:
+                error_message = await response.json()
+                print(f"Hugging Face API Error: {error_message}")
                 
-    except aiohttp.ClientTimeout:
+                if 'error' in error_message:
+                    if 'is currently loading' in error_message['error']:
+                        return "⏳ Model sedang dimuat. Coba lagi."
+                    return "🖼️❎ Gagal membuat gambar karena gangguan teknis."
+                
+                return "🖼️❎ Gagal membuat gambar karena respons tidak valid."
+            
+    except asyncio.TimeoutError:
         return "Waktu tunggu habis saat mencoba membuat gambar. Silakan coba lagi."
     except Exception as e:
         print(f"An unexpected error occurred with HF API: {e}")
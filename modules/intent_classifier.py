@@ -0,0 +1,265 @@
+import re
+import math
+import json
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+CASUAL_CONVERSATION = "CASUAL_CONVERSATION"
+NEEDS_RESEARCH = "NEEDS_RESEARCH"
+IMAGE_GENERATION = "IMAGE_GENERATION"
+CODE_GENERATION = "CODE_GENERATION"
+CONTEXT_SPECIFIC_QUESTION = "CONTEXT_SPECIFIC_QUESTION"
+ANSWER_IN_HISTORY = "ANSWER_IN_HISTORY"
+INTENT_LABELS = (
+    CONTEXT_SPECIFIC_QUESTION,
+    CODE_GENERATION,
+    NEEDS_RESEARCH,
+    IMAGE_GENERATION,
+    ANSWER_IN_HISTORY,
+    CASUAL_CONVERSATION,
+)
+
+MODEL_CONFIDENCE_THRESHOLD = 0.9
+WORD_REGEX = re.compile(r"\w+", re.UNICODE)
+
+# Kata tanya dan jawaban singkat (apa, bagaimana, ya, oke, siap) sengaja tidak dimasukkan:
+# "apa" atau "ya" biasanya pertanyaan atau balasan atas jawaban sebelumnya, bukan sapaan.
+GREETING_WORDS = {
+    "halo", "hallo", "helo", "hai", "hay", "hi", "hello", "hey", "pagi", "siang", "sore", "malam",
+    "selamat", "kabar", "kabarmu", "terima", "kasih", "makasih", "makasi", "trims", "thanks", "thank",
+    "you", "thx", "mantap", "mantab", "keren", "assalamualaikum", "waalaikumsalam", "salam", "good",
+    "morning", "night", "kak", "bro", "min", "ghost", "dong", "deh", "nih", "wkwk", "wkwkwk", "haha",
+    "hehe", "bye", "dadah", "sampai", "jumpa",
+}
+IMAGE_REQUEST_REGEX = re.compile(
+    r"\b(?:buat(?:kan|in)?|bikin(?:kan|in)?|hasilkan|generate|create|draw|lukis(?:kan)?|gambarkan)\s+"
+    r"(?:(?:sebuah|satu|aku|saya|ku|dong|tolong|an|a|me)\s+)*"
+    r"(?:gambar|foto|ilustrasi|lukisan|image|picture|logo|poster|wallpaper|avatar)\b",
+    re.IGNORECASE
+)
+CODE_REQUEST_REGEX = re.compile(
+    r"\b(?:buat(?:kan|in)?|bikin(?:kan|in)?|tulis(?:kan)?|tuliskan|contoh|write|generate|create)\b"
+    r"[\w\s]{0,30}?\b(?:kode|code|coding|script|skrip|program|fungsi|function|query|regex|snippet|class)\b",
+    re.IGNORECASE
+)
+# Permintaan kode harus menyebut bahasa/teknologi atau istilah pemrograman yang jelas, agar
+# "buatkan program diet" atau "buatkan gambar kode QR" tidak dianggap permintaan kode.
+PROGRAMMING_TERM_REGEX = re.compile(
+    r"(?<![\w+#])(?:python|javascript|typescript|java|kotlin|swift|golang|rust|php|ruby|perl|scala|dart|"
+    r"c\+\+|c#|sql|mysql|postgresql|sqlite|bash|shell|powershell|html|css|json|yaml|react|vue|angular|"
+    r"flask|django|fastapi|laravel|node(?:\.?js)?|express|flutter|pandas|numpy|regex|api|coding|"
+    r"script|skrip|snippet|source code|algoritma|algorithm|array|loop|rekursif|recursive)(?![\w+#])",
+    re.IGNORECASE
+)
+# "tadi"/"tersebut" saja tidak cukup: kata itu juga merujuk jawaban sebelumnya di riwayat.
+FILE_REFERENCE_REGEX = re.compile(
+    r"\b(?:file|berkas|dokumen|document|pdf|docx|pptx|xlsx|csv|slide|tautan|link|artikel|laporan|"
+    r"tabel|halaman|bab|lampiran|isi(?:nya)?)\b",
+    re.IGNORECASE
+)
+QUESTION_REGEX = re.compile(
+    r"\?|\b(?:apa|apakah|berapa|siapa|kapan|dimana|di mana|bagaimana|gimana|mengapa|kenapa|sebutkan|"
+    r"jelaskan|ringkas(?:kan)?|rangkum(?:kan)?|simpulkan|terangkan|bandingkan)\b",
+    re.IGNORECASE
+)
+
+SEED_SAMPLES: List[Tuple[str, bool, str]] = [
+    ("halo", False, CASUAL_CONVERSATION),
+    ("hai apa kabar", False, CASUAL_CONVERSATION),
+    ("selamat pagi ghost", False, CASUAL_CONVERSATION),
+    ("terima kasih banyak ya", False, CASUAL_CONVERSATION),
+    ("kamu siapa sih", False, CASUAL_CONVERSATION),
+    ("lagi apa nih", False, CASUAL_CONVERSATION),
+    ("oke sip mantap", False, CASUAL_CONVERSATION),
+    ("wkwk lucu juga kamu", False, CASUAL_CONVERSATION),
+    ("siapa namamu", False, CASUAL_CONVERSATION),
+    ("senang ngobrol denganmu", False, CASUAL_CONVERSATION),
+    ("kamu bisa bantu apa aja", False, CASUAL_CONVERSATION),
+    ("berita terbaru tentang pemilu", False, NEEDS_RESEARCH),
+    ("harga bitcoin hari ini berapa", False, NEEDS_RESEARCH),
+    ("siapa pemenang piala dunia terakhir", False, NEEDS_RESEARCH),
+    ("jadwal kereta bandung jakarta besok", False, NEEDS_RESEARCH),
+    ("cuaca jakarta besok gimana", False, NEEDS_RESEARCH),
+    ("perkembangan terbaru kecerdasan buatan bulan ini", False, NEEDS_RESEARCH),
+    ("kurs dolar terhadap rupiah hari ini", False, NEEDS_RESEARCH),
+    ("hasil pertandingan persib kemarin", False, NEEDS_RESEARCH),
+    ("spesifikasi hp terbaru samsung", False, NEEDS_RESEARCH),
+    ("kapan rilis film marvel berikutnya", False, NEEDS_RESEARCH),
+    ("siapa menteri keuangan saat ini", False, NEEDS_RESEARCH),
+    ("update harga bbm terbaru", False, NEEDS_RESEARCH),
+    ("rekomendasi laptop terbaru untuk mahasiswa", False, NEEDS_RESEARCH),
+    ("buatkan gambar kucing di luar angkasa", False, IMAGE_GENERATION),
+    ("bikin gambar pemandangan gunung saat senja", False, IMAGE_GENERATION),
+    ("tolong buat gambar astronot di pantai", False, IMAGE_GENERATION),
+    ("generate gambar naga api", False, IMAGE_GENERATION),
+    ("buatkan ilustrasi kota futuristik", False, IMAGE_GENERATION),
+    ("buat logo untuk kedai kopi", False, IMAGE_GENERATION),
+    ("hasilkan gambar robot lucu", False, IMAGE_GENERATION),
+    ("lukiskan matahari terbenam di laut", False, IMAGE_GENERATION),
+    ("buatkan kode python untuk membaca csv", False, CODE_GENERATION),
+    ("tulis fungsi javascript untuk mengurutkan array", False, CODE_GENERATION),
+    ("contoh kode flask untuk login", False, CODE_GENERATION),
+    ("script bash untuk backup folder", False, CODE_GENERATION),
+    ("bikin program kalkulator di java", False, CODE_GENERATION),
+    ("write a python function to reverse a string", False, CODE_GENERATION),
+    ("query sql untuk join dua tabel", False, CODE_GENERATION),
+    ("buat class c++ untuk linked list", False, CODE_GENERATION),
+    ("contoh program golang http server", False, CODE_GENERATION),
+    ("apa isi dokumen ini", True, CONTEXT_SPECIFIC_QUESTION),
+    ("ringkas file tersebut", True, CONTEXT_SPECIFIC_QUESTION),
+    ("jelaskan bab dua dari pdf itu", True, CONTEXT_SPECIFIC_QUESTION),
+    ("apa kesimpulan artikel tadi", True, CONTEXT_SPECIFIC_QUESTION),
+    ("menurut dokumen itu berapa anggarannya", True, CONTEXT_SPECIFIC_QUESTION),
+    ("poin penting dari tautan yang saya kirim", True, CONTEXT_SPECIFIC_QUESTION),
+    ("rangkum isi file", True, CONTEXT_SPECIFIC_QUESTION),
+    ("di halaman berapa dibahas metodologi", True, CONTEXT_SPECIFIC_QUESTION),
+    ("apa kata laporan itu tentang pendapatan", True, CONTEXT_SPECIFIC_QUESTION),
+    ("jelaskan tabel di dokumen", True, CONTEXT_SPECIFIC_QUESTION),
+    ("jelaskan lagi yang tadi", False, ANSWER_IN_HISTORY),
+    ("maksudnya gimana", False, ANSWER_IN_HISTORY),
+    ("bisa diulang poin kedua", False, ANSWER_IN_HISTORY),
+    ("kenapa begitu", False, ANSWER_IN_HISTORY),
+    ("lanjutkan", False, ANSWER_IN_HISTORY),
+    ("apa maksud jawabanmu sebelumnya", False, ANSWER_IN_HISTORY),
+    ("bisa lebih detail lagi", False, ANSWER_IN_HISTORY),
+    ("contohnya apa", False, ANSWER_IN_HISTORY),
+    ("terus gimana", False, ANSWER_IN_HISTORY),
+    ("yang nomor tiga maksudnya apa", False, ANSWER_IN_HISTORY),
+]
+
+def extract_features(text: str) -> List[str]:
+    # Ada/tidaknya file sesi sengaja bukan fitur: di data seed hanya sampel CONTEXT_SPECIFIC
+    # yang memilikinya, sehingga setiap pesan saat ada file (mis. setelah riset web) akan
+    # dianggap pertanyaan tentang file. File sesi hanya dipakai di aturan dan penyaring hasil.
+    words = WORD_REGEX.findall(text.lower())
+    features = list(words)
+    features.extend(f"{a}_{b}" for a, b in zip(words, words[1:]))
+    if "?" in text:
+        features.append("__question__")
+    features.append(f"__len_{min(len(words) // 4, 4)}__")
+    return features
+
+class NaiveBayesIntentModel:
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.labels: List[str] = []
+        self._log_priors: Dict[str, float] = {}
+        self._feature_counts: Dict[str, Counter] = defaultdict(Counter)
+        self._totals: Dict[str, int] = {}
+        self._vocabulary = set()
+
+    def fit(self, samples: Iterable[Tuple[List[str], str]]) -> "NaiveBayesIntentModel":
+        label_counts = Counter()
+        for features, label in samples:
+            label_counts[label] += 1
+            self._feature_counts[label].update(features)
+            self._vocabulary.update(features)
+
+        total_samples = sum(label_counts.values())
+        self.labels = sorted(label_counts)
+        self._log_priors = {label: math.log(count / total_samples) for label, count in label_counts.items()}
+        self._totals = {label: sum(self._feature_counts[label].values()) for label in self.labels}
+        return self
+
+    def predict_proba(self, features: List[str]) -> Dict[str, float]:
+        vocabulary_size = len(self._vocabulary)
+        scores = {}
+        for label in self.labels:
+            counts = self._feature_counts[label]
+            denominator = self._totals[label] + self.alpha * vocabulary_size
+            score = self._log_priors[label]
+            for feature in features:
+                if feature in self._vocabulary:
+                    score += math.log((counts[feature] + self.alpha) / denominator)
+            scores[label] = score
+
+        best = max(scores.values())
+        exp_scores = {label: math.exp(score - best) for label, score in scores.items()}
+        total = sum(exp_scores.values())
+        return {label: value / total for label, value in exp_scores.items()}
+
+def _load_training_samples(path: Optional[str]) -> List[Tuple[str, bool, str]]:
+    samples = list(SEED_SAMPLES)
+    if not path:
+        return samples
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    samples.append((record['text'], bool(record.get('has_session_files')), record['label']))
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Gagal memuat data latih intent dari '{path}': {e}")
+    return samples
+
+def is_code_request(text: str) -> bool:
+    return bool(CODE_REQUEST_REGEX.search(text) and PROGRAMMING_TERM_REGEX.search(text))
+
+class IntentClassifier:
+    def __init__(self, training_file: Optional[str] = None, threshold: float = MODEL_CONFIDENCE_THRESHOLD):
+        self.threshold = threshold
+        self.model = NaiveBayesIntentModel().fit(
+            (extract_features(text), label)
+            for text, _, label in _load_training_samples(training_file)
+        )
+
+    def classify_by_rules(self, text: str, session_file_names: Iterable[str]) -> Optional[str]:
+        session_file_names = list(session_file_names)
+        lowered = text.lower().strip()
+        words = WORD_REGEX.findall(lowered)
+        if not words:
+            return None
+
+        if IMAGE_REQUEST_REGEX.search(lowered) and not is_code_request(lowered):
+            return IMAGE_GENERATION
+
+        if len(words) <= 6 and all(word in GREETING_WORDS for word in words):
+            return CASUAL_CONVERSATION
+
+        if session_file_names and QUESTION_REGEX.search(lowered):
+            if FILE_REFERENCE_REGEX.search(lowered):
+                return CONTEXT_SPECIFIC_QUESTION
+            for name in session_file_names:
+                stem = name.lower().rsplit('.', 1)[0].strip("`'\" ")
+                if len(stem) >= 4 and stem in lowered:
+                    return CONTEXT_SPECIFIC_QUESTION
+
+        if is_code_request(lowered):
+            return CODE_GENERATION
+        return None
+
+    def classify(self, text: str, session_file_names: Iterable[str] = ()) -> Optional[str]:
+        session_file_names = list(session_file_names)
+        label = self.classify_by_rules(text, session_file_names)
+        if label:
+            return label
+
+        probabilities = self.model.predict_proba(extract_features(text))
+        label, probability = max(probabilities.items(), key=lambda item: item[1])
+        if label == CONTEXT_SPECIFIC_QUESTION and not session_file_names:
+            return None
+        if probability >= self.threshold:
+            return label
+        return None
+
+def _append_label(path: str, record: Dict):
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logging.warning(f"Gagal mencatat label intent: {e}")
+
+async def record_llm_label(path: Optional[str], text: str, has_session_files: bool, label: str, latency_ms: float):
+    # Menyimpan keputusan LLM sebagai data evaluasi/latih untuk classifier lokal. Penulisan file
+    # dijalankan di thread agar tidak menahan event loop.
+    if not path:
+        return
+    await asyncio.to_thread(_append_label, path, {
+        'text': text,
+        'has_session_files': has_session_files,
+        'label': label,
+        'latency_ms': round(latency_ms, 1)
+    })
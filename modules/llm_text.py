@@ -2,15 +2,24 @@ import google.generativeai as genai
 import logging
 import asyncio
 import json
+import time
 import re
 from typing import List, Dict
 from . import config
-from .bot_setup import context_manager
+from .bot_setup import context_manager, parser_pool
 from .context_manager import get_current_date_str
 from .search_handler import search_web
 from .llm_specialized import generate_image_prompt_with_gemini
 from .image_handler import generate_image_from_hf
-from .utils import safe_get_response_text, get_gemini_model
+from .gemini_pool import GeminiBusyError
+from .utils import (
+    safe_get_response_text, get_gemini_model, is_max_tokens_stop,
+    RESPONSE_GENERATION_CONFIG, TRUNCATED_RESPONSE_NOTE
+)
+from .prompt_builder import build_history_window, estimate_tokens, history_to_text, length_instruction
+from .intent_classifier import IntentClassifier, INTENT_LABELS, record_llm_label
+from .parsers import aggregate_table
+from .parser_pool import ParserError
 
 
 logging.basicConfig(
@@ -18,34 +27,14 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(module)s - %(message)s'
 )
 
-async def _summarize_text_async(text_to_summarize: str) -> str:
-    model = await get_gemini_model()
-    if not model:
-        return text_to_summarize
-    
-    try:
-        logging.info(f"Meringkas teks dengan panjang {len(text_to_summarize)} karakter.")
-        summarization_prompt = (
-            f"Ringkas teks berikut menjadi jawaban yang padat dan naratif, "
-            f"pertahankan semua poin kunci:\n\n---\n{text_to_summarize}\n---"
-        )
-        response = await model.generate_content_async(
-            summarization_prompt, 
-            safety_settings=config.SAFETY_SETTINGS
-        )
-        summarized_text = await safe_get_response_text(response)
-        
-        if "ERROR_" not in summarized_text and summarized_text.strip():
-            logging.info(f"Peringkasan berhasil. Panjang baru: {len(summarized_text)}")
-            return summarized_text
-        else:
-            logging.warning("Peringkasan gagal, kembali ke teks asli.")
-            return text_to_summarize
-        
-    except Exception as e:
-        logging.error(f"Error saat peringkasan: {e}")
-        return text_to_summarize
-    
+intent_classifier = IntentClassifier(config.INTENT_TRAINING_FILE)
+
+QUERY_TOKEN_REGEX = re.compile(r"\w+")
+QUERY_PLAN_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=list[str]
+)
+
 async def _run_image_generation_task(user_prompt: str):
     yield {'event': 'EXTRACTING_DESCRIPTION'}
     model = await get_gemini_model()
@@ -84,124 +73,175 @@ async def _run_image_generation_task(user_prompt: str):
         logging.error(f"Error tak terduga di _run_image_generation_task: {e}", exc_info=True)
         yield {'type': 'text', 'data': "⚠️ Terjadi gangguan teknis."}
 
+def _query_tokens(query: str) -> frozenset:
+    return frozenset(QUERY_TOKEN_REGEX.findall(query.lower()))
+
+def _dedupe_queries(queries: List[str]) -> List[str]:
+    # Kueri yang kata-katanya hampir sama (Jaccard) cenderung memberi hasil pencarian yang sama.
+    kept = []
+    kept_tokens = []
+    for query in queries:
+        query = query.strip()
+        tokens = _query_tokens(query)
+        if not tokens:
+            continue
+        if any(
+            len(tokens & other) / len(tokens | other) >= config.RESEARCH_QUERY_SIMILARITY_THRESHOLD
+            for other in kept_tokens
+        ):
+            continue
+        kept.append(query)
+        kept_tokens.append(tokens)
+    return kept
+
+async def _search_with_limit(semaphore: asyncio.Semaphore, query: str):
+    async with semaphore:
+        try:
+            results = await asyncio.wait_for(search_web(query), timeout=config.RESEARCH_QUERY_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning(f"Pencarian untuk '{query}' melebihi batas waktu {config.RESEARCH_QUERY_TIMEOUT} detik.")
+            results = []
+    return query, results
+
 async def _run_research(model: genai.GenerativeModel, user_prompt: str, history: List[dict]):
-    history_text = "\n".join([
-        f"{item['role']}: {item['parts'][0]}" 
-        for item in history 
-        if 'parts' in item and item['parts']
-    ])
+    history_text = history_to_text(
+        history, 
+        config.RESEARCH_TOKEN_BUDGET, 
+        config.PROMPT_RECENT_TURNS, 
+        config.HISTORY_DIGEST_TOKEN_BUDGET
+    )
     
     multi_query_prompt = (
         f'Anda adalah ahli strategi riset. Berdasarkan percakapan ini:\n---\n{history_text}\n---\n'
-        f'Dan permintaan terakhir: "{user_prompt}", buatlah daftar JSON berisi 5-6 kueri pencarian '
-        f'Google yang beragam dan spesifik untuk mendapatkan jawaban komprehensif. '
-        f'Contoh: ["kueri 1", "kueri 2"]'
+        f'Dan permintaan terakhir: "{user_prompt}", buatlah 5-6 kueri pencarian Google yang beragam '
+        f'dan spesifik untuk mendapatkan jawaban komprehensif. Hindari kueri yang saling tumpang tindih.'
     )
     
     search_queries = []
     try:
-        response = await model.generate_content_async(multi_query_prompt)
-        response_text = await safe_get_response_text(response)
-        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-        
-        if json_match:
-            search_queries = json.loads(json_match.group(0))
+        response = await model.generate_content_async(
+            multi_query_prompt,
+            generation_config=QUERY_PLAN_GENERATION_CONFIG
+        )
+        search_queries = json.loads(await safe_get_response_text(response))
 
         if not isinstance(search_queries, list) or not all(isinstance(q, str) for q in search_queries):
             raise ValueError("Format JSON tidak valid")
         
-        logging.info(f"Kueri riset awal yang dibuat: {search_queries}")
+        logging.info(f"Kueri riset yang dibuat: {search_queries}")
 
     except (json.JSONDecodeError, ValueError, AttributeError) as e:
         logging.warning(f"Gagal membuat multi-kueri, kembali ke kueri tunggal. Error: {e}")
-        search_queries = [user_prompt]
-
-    if len(search_queries) > 1:
-        deduplication_prompt = (
-            f'Dari daftar kueri pencarian JSON berikut, hapus atau gabungkan item yang sangat mirip '
-            f'dan kemungkinan akan menghasilkan hasil yang sama. Jaga agar tetap 5-6 kueri terbaik. '
-            f'Kembalikan HANYA daftar JSON yang telah disempurnakan.\n\n'
-            f'Daftar Awal: {json.dumps(search_queries)}'
-        )
-        
-        try:
-            response = await model.generate_content_async(deduplication_prompt)
-            response_text = await safe_get_response_text(response)
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            
-            if json_match:
-                refined_queries = json.loads(json_match.group(0))
-                if isinstance(refined_queries, list) and refined_queries:
-                    search_queries = refined_queries
-                    logging.info(f"Kueri yang disempurnakan: {search_queries}")
-
-        except (json.JSONDecodeError, ValueError, AttributeError) as e:
-            logging.warning(f"Gagal menyempurnakan kueri, menggunakan daftar awal. Error: {e}")
+
+    search_queries = _dedupe_queries(search_queries)[:config.RESEARCH_MAX_QUERIES] or [user_prompt]
 
     combined_results = []
     processed_urls = set()
     queries_str = ", ".join(search_queries)
     
-    for query in search_queries:
-        yield {'event': 'RESEARCH_QUERY', 'data': query}
-        results_list = await search_web(query)
-        
-        for result in results_list:
-            url = result.get('url')
-            if url and url not in processed_urls:
-                combined_results.append(result)
-                processed_urls.add(url)
+    semaphore = asyncio.Semaphore(max(config.RESEARCH_CONCURRENCY, 1))
+    tasks = [
+        asyncio.create_task(_search_with_limit(semaphore, query))
+        for query in dict.fromkeys(search_queries)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            query, results_list = await next_done
+            yield {'event': 'RESEARCH_QUERY', 'data': query}
+
+            for result in results_list:
+                url = result.get('url')
+                if url and url not in processed_urls:
+                    combined_results.append(result)
+                    processed_urls.add(url)
+    finally:
+        for task in tasks:
+            task.cancel()
 
     if not combined_results:
         yield {'type': 'text', 'data': "Tidak ditemukan hasil pencarian yang relevan di web."}
         return
     yield {'type': 'add_to_context', 'query': queries_str, 'results': combined_results}
 
+async def _aggregate_session_tables(user_context, user_prompt: str) -> str:
+    table_context = ""
+    for name, meta in user_context.file_meta.items():
+        table_path = meta.get('table_path')
+        if not table_path or name not in user_context.session_files:
+            continue
+        try:
+            aggregates = await parser_pool.run(aggregate_table, table_path, user_prompt)
+        except (ParserError, OSError, ValueError, KeyError) as e:
+            logging.warning(f"Gagal menghitung agregasi tabel '{name}': {e}")
+            continue
+        if aggregates:
+            table_context += (
+                f"--- HASIL AGREGASI TABEL `{name}` (dihitung dari seluruh {meta.get('rows')} baris) ---\n"
+                f"{aggregates}\n--- AKHIR AGREGASI ---\n\n"
+            )
+    return table_context
+
+async def _choose_strategy_with_llm(model: genai.GenerativeModel, user_prompt: str, history: List[dict], session_files: Dict) -> str:
+    file_context_summary = ""
+    if session_files:
+        file_names = ", ".join([f"`{name}`" for name in session_files.keys()])
+        file_context_summary = f"\nKonteks Sesi Saat Ini: Pengguna telah menambahkan file berikut: {file_names}."
+
+    history_text = history_to_text(
+        history, 
+        config.STRATEGY_TOKEN_BUDGET, 
+        config.PROMPT_RECENT_TURNS, 
+        config.HISTORY_DIGEST_TOKEN_BUDGET
+    )
+    history_text += file_context_summary
+
+    strategy_prompt = f"""
+    Analisis permintaan terakhir pengguna berdasarkan riwayat percakapan dan konteks sesi untuk menentukan tindakan terbaik.
+
+    Permintaan Terakhir Pengguna: "{user_prompt}"
+
+    Riwayat & Konteks Sesi:
+    ---
+    {history_text}
+    ---
+
+    Berdasarkan ini, pilih HANYA SATU dari label berikut:
+    - "CONTEXT_SPECIFIC_QUESTION": Jika pengguna mengajukan pertanyaan yang secara langsung merujuk pada konten file atau tautan yang ada dalam sesi.
+    - "CODE_GENERATION": Jika pengguna secara eksplisit meminta untuk menulis, membuat, atau memberikan kode.
+    - "NEEDS_RESEARCH": Jika pengguna meminta informasi baru yang jelas tidak ada dalam riwayat atau konteks file.
+    - "IMAGE_GENERATION": Jika pengguna secara eksplisit meminta untuk membuat atau menghasilkan gambar.
+    - "ANSWER_IN_HISTORY": Jika riwayat percakapan kemungkinan besar sudah berisi jawaban.
+    - "CASUAL_CONVERSATION": Untuk sapaan atau pertanyaan yang tidak memerlukan memori atau konteks.
+    """
+    
+    started_at = time.perf_counter()
+    strategy_response = await model.generate_content_async(strategy_prompt)
+    strategy = (await safe_get_response_text(strategy_response)).strip().upper()
+    latency_ms = (time.perf_counter() - started_at) * 1000
+    logging.info(f"Strategi yang dipilih: {strategy} ({latency_ms:.0f} ms)")
+
+    label = next((label for label in INTENT_LABELS if label in strategy), None)
+    if label:
+        await record_llm_label(config.INTENT_LABEL_LOG_FILE, user_prompt, bool(session_files), label, latency_ms)
+    return strategy
+
 async def generate_response_stream(user_id: int, user_prompt: str):
     model = await get_gemini_model()
     if not model:
         yield {'type': 'text', 'data': "🕒 Sistem sedang sibuk karena semua kunci API gagal. Coba lagi beberapa saat lagi."}
         return
     
+    user_context = None
     try:
-        context_data = await context_manager.get_context(user_id)
-        history = context_data['history']
-        
-        session_files = context_data.get('session_files', {})
-        file_context_summary = ""
-        if session_files:
-            file_names = ", ".join([f"`{name}`" for name in session_files.keys()])
-            file_context_summary = f"\nKonteks Sesi Saat Ini: Pengguna telah menambahkan file berikut: {file_names}."
-
-        history_text = "\n".join([
-            f"{item['role']}: {item['parts'][0]}" 
-            for item in history 
-            if 'parts' in item and item['parts']
-        ])
-        history_text += file_context_summary
-
-        strategy_prompt = f"""
-        Analisis permintaan terakhir pengguna berdasarkan riwayat percakapan dan konteks sesi untuk menentukan tindakan terbaik.
-
-        Permintaan Terakhir Pengguna: "{user_prompt}"
-
-        Riwayat & Konteks Sesi:
-        ---
-        {history_text}
-        ---
-
-        Berdasarkan ini, pilih HANYA SATU dari label berikut:
-        - "CONTEXT_SPECIFIC_QUESTION": Jika pengguna mengajukan pertanyaan yang secara langsung merujuk pada konten file atau tautan yang ada dalam sesi.
-        - "CODE_GENERATION": Jika pengguna secara eksplisit meminta untuk menulis, membuat, atau memberikan kode.
-        - "NEEDS_RESEARCH": Jika pengguna meminta informasi baru yang jelas tidak ada dalam riwayat atau konteks file.
-        - "IMAGE_GENERATION": Jika pengguna secara eksplisit meminta untuk membuat atau menghasilkan gambar.
-        - "ANSWER_IN_HISTORY": Jika riwayat percakapan kemungkinan besar sudah berisi jawaban.
-        - "CASUAL_CONVERSATION": Untuk sapaan atau pertanyaan yang tidak memerlukan memori atau konteks.
-        """
+        user_context = await context_manager.load(user_id)
+        history = user_context.history
         
-        strategy_response = await model.generate_content_async(strategy_prompt)
-        strategy = (await safe_get_response_text(strategy_response)).strip().upper()
-        logging.info(f"Strategi yang dipilih: {strategy}")
+        session_files = user_context.session_files
+        strategy = intent_classifier.classify(user_prompt, session_files.keys())
+        if strategy:
+            logging.info(f"Strategi dipilih secara lokal: {strategy}")
+        else:
+            strategy = await _choose_strategy_with_llm(model, user_prompt, history, session_files)
         
         if "NEEDS_RESEARCH" in strategy or ("CODE_GENERATION" in strategy and not session_files):
             yield {'event': 'RESEARCH_START'}
@@ -209,8 +249,7 @@ async def generate_response_stream(user_id: int, user_prompt: str):
 
             async for research_event in research_generator:
                 if research_event.get('type') == 'add_to_context':
-                    await context_manager.add_web_search_to_session(
-                        user_id, 
+                    user_context.add_web_search(
                         research_event['query'], 
                         research_event['results']
                     )
@@ -226,7 +265,10 @@ async def generate_response_stream(user_id: int, user_prompt: str):
             return
         yield {'event': 'GENERATION_START'}
         
-        final_context = await context_manager.get_session_files_context(user_id)
+        final_context = await user_context.get_session_files_context(user_prompt, config.SESSION_CONTEXT_TOKEN_BUDGET)
+        table_context = await _aggregate_session_tables(user_context, user_prompt)
+        if table_context:
+            final_context = (final_context or "") + table_context
         final_prompt_text = ""
 
         if final_context:
@@ -250,16 +292,29 @@ async def generate_response_stream(user_id: int, user_prompt: str):
             )
              logging.info("Menggunakan instruksi anti-pengulangan untuk percakapan.")
 
-        history_for_api = history + [{'role': 'user', 'parts': [final_prompt_text]}]
+        final_prompt_text += length_instruction(config.RESPONSE_TARGET_CHARS, allow_long_code="CODE_GENERATION" in strategy)
+
+        history_window = build_history_window(
+            history, 
+            config.GENERATION_TOKEN_BUDGET - estimate_tokens(final_prompt_text), 
+            config.PROMPT_RECENT_TURNS, 
+            config.HISTORY_DIGEST_TOKEN_BUDGET
+        )
+        if len(history_window) < len(history):
+            logging.info(f"Riwayat dipadatkan: {len(history)} -> {len(history_window)} pesan untuk prompt akhir.")
+        history_for_api = history_window + [{'role': 'user', 'parts': [final_prompt_text]}]
 
         response_stream = await model.generate_content_async(
             history_for_api, 
             stream=True, 
-            safety_settings=config.SAFETY_SETTINGS
+            safety_settings=config.SAFETY_SETTINGS,
+            generation_config=RESPONSE_GENERATION_CONFIG
         )
 
         full_response_text = ""
+        last_chunk = None
         async for chunk in response_stream:
+            last_chunk = chunk
             text = await safe_get_response_text(chunk)
             if "ERROR_" not in text:
                 full_response_text += text
@@ -267,20 +322,27 @@ async def generate_response_stream(user_id: int, user_prompt: str):
             else:
                 logging.warning(f"Potongan stream diblokir: {text}")
 
+        if full_response_text and is_max_tokens_stop(last_chunk):
+            logging.warning(f"Jawaban terpotong di batas {config.RESPONSE_MAX_OUTPUT_TOKENS} token output.")
+            full_response_text += TRUNCATED_RESPONSE_NOTE
+            yield {'type': 'text', 'data': TRUNCATED_RESPONSE_NOTE}
+
         if not full_response_text:
              yield {'type': 'text', 'data': "Saya tidak dapat memberikan respons karena pembatasan sistem."}
              return
         
-        history.append({'role': 'user', 'parts': [user_prompt]})
-        history.append({'role': 'model', 'parts': [full_response_text]})
-        await context_manager.save_context(
-            user_id, 
-            history, 
-            context_data.get('active_session_name'), 
-            context_data.get('session_files', {})
-        )
+        user_context.append_turn(user_prompt, full_response_text)
+        await context_manager.commit(user_context)
         yield {'type': 'stream_end', 'full_text': full_response_text}
 
+    except GeminiBusyError as e:
+        logging.warning(f"generate_response_stream ditolak: {e}")
+        yield {'type': 'text', 'data': "🕒 Sistem sedang sibuk karena semua kunci API dibatasi. Coba lagi beberapa saat lagi."}
+
     except Exception as e:
         logging.error(f"Error tak terduga di generate_response_stream: {e}", exc_info=True)
         yield {'type': 'text', 'data': "⚠️ Terjadi gangguan teknis. Coba lagi nanti."}
+
+    finally:
+        if user_context is not None:
+            await context_manager.commit(user_context)
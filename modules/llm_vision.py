@@ -4,12 +4,17 @@ import io
 from PIL import Image
 from . import config
 from .bot_setup import context_manager
-from .utils import safe_get_response_text, get_gemini_model
+from .gemini_pool import GeminiBusyError
+from .utils import (
+    safe_get_response_text, get_gemini_model, is_max_tokens_stop,
+    RESPONSE_GENERATION_CONFIG, TRUNCATED_RESPONSE_NOTE
+)
+from .prompt_builder import length_instruction
 
 
 async def generate_response_from_image_stream(user_id: int, user_prompt: str, image_bytes: bytes):
-    context_data = await context_manager.get_context(user_id)
-    history = context_data['history']
+    user_context = await context_manager.load(user_id)
+    history = user_context.history
     
     model = await get_gemini_model()
     if not model:
@@ -25,36 +30,43 @@ async def generate_response_from_image_stream(user_id: int, user_prompt: str, im
             return
         
         prompt_text = user_prompt if user_prompt else "Jelaskan gambar ini."
-        history_for_request = history + [{'role': 'user', 'parts': [prompt_text, img]}]
+        request_text = prompt_text + length_instruction(config.RESPONSE_TARGET_CHARS)
+        history_for_request = history + [{'role': 'user', 'parts': [request_text, img]}]
         
         response_stream = await model.generate_content_async(
             history_for_request,
             stream=True,
-            safety_settings=config.SAFETY_SETTINGS
+            safety_settings=config.SAFETY_SETTINGS,
+            generation_config=RESPONSE_GENERATION_CONFIG
         )
         
         full_response_text = ""
+        last_chunk = None
         async for chunk in response_stream:
+            last_chunk = chunk
             text = await safe_get_response_text(chunk)
             if "ERROR_" not in text:
                 full_response_text += text
                 yield {'type': 'text', 'data': text}
 
+        if full_response_text and is_max_tokens_stop(last_chunk):
+            logging.warning(f"Analisis gambar terpotong di batas {config.RESPONSE_MAX_OUTPUT_TOKENS} token output.")
+            full_response_text += TRUNCATED_RESPONSE_NOTE
+            yield {'type': 'text', 'data': TRUNCATED_RESPONSE_NOTE}
+
         if not full_response_text:
              yield {'type': 'text', 'data': "Saya tidak dapat memberikan respons terkait gambar ini karena pembatasan sistem."}
              return
         
-        history.append({'role': 'user', 'parts': [f"(Menganalisis gambar) {prompt_text}"]})
-        history.append({'role': 'model', 'parts': [full_response_text]})
-        await context_manager.save_context(
-            user_id, 
-            history, 
-            context_data.get('active_session_name'), 
-            context_data.get('session_files', {})
-        )
+        user_context.append_turn(f"(Menganalisis gambar) {prompt_text}", full_response_text)
+        await context_manager.commit(user_context)
         yield {'type': 'stream_end', 'full_text': full_response_text}
         return
     
+    except GeminiBusyError as e:
+        logging.warning(f"generate_response_from_image_stream ditolak: {e}")
+        yield {'type': 'text', 'data': "🕒 Sistem sedang sibuk. Coba lagi beberapa saat lagi."}
+
     except Exception as e:
         logging.error(f"Unexpected error in generate_response_from_image_stream: {e}")
         yield {'type': 'text', 'data': "⚠️ Terjadi gangguan teknis saat menganalisis gambar."}
\ No newline at end of file
@@ -0,0 +1,294 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+BULLET_REGEX = re.compile(r'^\s*[\*\-]\s+')
+CODE_FENCE = "```"
+CODE_CLOSE = "</code></pre>"
+CODE_LANGUAGE_MAX_CHARS = 32
+# Tumpukan tag terbuka terpanjang adalah satu blok kode (tag inline selalu ditutup dalam
+# barisnya), jadi cadangan halaman cukup untuk pembuka + penutup blok kode dan kursor ketik.
+CURSOR_RESERVE = 1
+LONGEST_CODE_OPEN = len('<pre><code class="language-">') + CODE_LANGUAGE_MAX_CHARS
+PAGE_RESERVE = LONGEST_CODE_OPEN + len(CODE_CLOSE) + CURSOR_RESERVE
+MARKER_REGEX = re.compile(r'[`*_]')
+
+def escape_html(text: str) -> str:
+    if not isinstance(text, str):
+        return ""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def _closer_positions(line: str, marker_positions: List[int]) -> Dict[str, List[int]]:
+    # Posisi penutup yang sah untuk setiap penanda, dihitung sekali per baris.
+    length = len(line)
+    closers = {'```': [], '`': [], '**': [], '__': [], '*': [], '_': []}
+    for position in marker_positions:
+        char = line[position]
+        if char == '`':
+            closers['`'].append(position)
+            if line.startswith(CODE_FENCE, position):
+                closers['```'].append(position)
+        elif char == '*':
+            if line.startswith('**', position) and position and not line[position - 1].isspace():
+                closers['**'].append(position)
+            if position and not line[position - 1].isspace():
+                closers['*'].append(position)
+        elif char == '_':
+            after = position + 1
+            if line.startswith('__', position) and (after + 1 >= length or not line[after + 1].isalnum()):
+                closers['__'].append(position)
+            if position and not line[position - 1].isspace() and (after >= length or not line[after].isalnum()):
+                closers['_'].append(position)
+    return closers
+
+def render_inline(line: str) -> str:
+    # Satu kali pindai kiri ke kanan. Pencarian penutup hanya bergerak maju (pointer per
+    # penanda), jadi penanda yang tidak tertutup tidak membuat pemindaian berulang.
+    marker_positions = [match.start() for match in MARKER_REGEX.finditer(line)]
+    if not marker_positions:
+        return escape_html(line)
+
+    closers = _closer_positions(line, marker_positions)
+    pointers = dict.fromkeys(closers, 0)
+
+    def next_closer(marker: str, start: int) -> int:
+        positions = closers[marker]
+        index = pointers[marker]
+        while index < len(positions) and positions[index] < start:
+            index += 1
+        pointers[marker] = index
+        return positions[index] if index < len(positions) else -1
+
+    parts = []
+    length = len(line)
+    text_start = 0
+    position = 0
+    for marker_position in marker_positions:
+        if marker_position < position:
+            continue
+        position = marker_position
+        char = line[position]
+        previous = line[position - 1] if position else ' '
+        following = line[position + 1] if position + 1 < length else ' '
+        marker = tag = None
+        end = -1
+        if line.startswith(CODE_FENCE, position):
+            marker, tag = CODE_FENCE, 'code'
+            end = next_closer(marker, position + 4)
+        elif char == '`':
+            marker, tag = '`', 'code'
+            end = next_closer(marker, position + 2)
+        elif line.startswith('**', position):
+            marker, tag = '**', 'b'
+            if line[position + 2:position + 3].isspace():
+                position += 2
+                continue
+            end = next_closer(marker, position + 3)
+        elif line.startswith('__', position) and not previous.isalnum():
+            marker, tag = '__', 'b'
+            end = next_closer(marker, position + 3)
+        elif char == '*' and not following.isspace():
+            marker, tag = '*', 'i'
+            end = next_closer(marker, position + 2)
+        elif char == '_' and not previous.isalnum() and not following.isspace():
+            marker, tag = '_', 'i'
+            end = next_closer(marker, position + 2)
+
+        if end < 0:
+            position += len(marker) if marker else 1
+            continue
+
+        parts.append(escape_html(line[text_start:position]))
+        parts.append(f"<{tag}>{escape_html(line[position + len(marker):end])}</{tag}>")
+        position = end + len(marker)
+        text_start = position
+
+    parts.append(escape_html(line[text_start:]))
+    return "".join(parts)
+
+class StreamingMarkdownRenderer:
+    # Mengubah Markdown dari LLM menjadi HTML Telegram potongan demi potongan. Baris yang sudah
+    # lengkap dirender sekali dan disimpan; hanya baris terakhir yang belum selesai dirender
+    # ulang pada setiap render(), sehingga total kerja linear terhadap panjang teks.
+    # Dengan page_limit, HTML dibagi menjadi halaman yang masing-masing muat satu pesan.
+    def __init__(self, page_limit: Optional[int] = None):
+        self.page_limit = page_limit
+        # Escape HTML bisa memperpanjang teks hingga 5x (& -> &amp;), jadi baris yang lebih
+        # panjang dari ini dipotong di spasi agar tetap muat dalam satu halaman.
+        self._max_line_chars = (page_limit - PAGE_RESERVE) // 5 if page_limit else None
+        self._pages: List[str] = []
+        self._page_parts: List[str] = []
+        self._page_length = 0
+        self._page_has_body = False
+        self._page_cache = ""
+        self._page_cached_parts = 0
+        self._pending = ""
+        self._code_tag: Optional[str] = None
+        self._code_has_lines = False
+        self._has_content = False
+        self._blank_lines = 0
+        self._continuation = False
+
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        text = self._pending + chunk.replace('\r\n', '\n')
+        lines = text.split('\n')
+        self._pending = lines.pop()
+        for line in lines:
+            self._commit_line(self._commit_segments(line))
+        self._pending = self._commit_segments(self._pending)
+
+    def _commit_segments(self, line: str) -> str:
+        # Baris yang terlalu panjang untuk satu halaman dikirim per segmen; sisanya dikembalikan.
+        limit = self._max_line_chars
+        while limit and len(line) > limit and not line.lstrip().startswith(CODE_FENCE):
+            cut = line.rfind(' ', 0, limit) + 1 or limit
+            segment, line = line[:cut], line[cut:]
+            self._commit_line(segment, segment=True)
+        return line
+
+    def render(self) -> str:
+        # HTML selalu seimbang untuk prefiks halaman saat ini: penanda yang belum tertutup
+        # ditampilkan apa adanya, dan blok kode yang masih terbuka ditutup sementara.
+        separator, tail = self._tail_html()
+        if self._page_has_body and self._exceeds(len(separator) + len(tail)):
+            self._close_page()
+            separator = ""
+        if not self._page_parts:
+            separator = ""
+        if not self._page_has_body and not tail:
+            return ""
+        if self._page_cached_parts != len(self._page_parts):
+            self._page_cache += "".join(self._page_parts[self._page_cached_parts:])
+            self._page_cached_parts = len(self._page_parts)
+        html = (self._page_cache + separator + tail).rstrip()
+        if self._code_tag is not None:
+            html += CODE_CLOSE
+        return html
+
+    def take_pages(self) -> List[str]:
+        # Halaman yang sudah penuh dan tidak akan berubah lagi.
+        pages, self._pages = self._pages, []
+        return pages
+
+    def finish(self) -> List[str]:
+        if self._pending:
+            self._commit_line(self._pending)
+            self._pending = ""
+        if self._code_tag is not None:
+            self._commit_fence(CODE_FENCE)
+        if self._page_has_body:
+            self._close_page()
+        return self.take_pages()
+
+    def _exceeds(self, extra: int) -> bool:
+        # Tag pembuka blok kode sudah terhitung di _page_length; yang perlu dicadangkan hanya
+        # penutup dari tumpukan tag yang masih terbuka.
+        reserve = CURSOR_RESERVE + (len(CODE_CLOSE) if self._code_tag is not None else 0)
+        return bool(self.page_limit) and self._page_length + extra + reserve > self.page_limit
+
+    def _separator(self, continuation: bool) -> str:
+        if continuation or not self._has_content:
+            return ""
+        return "\n" * (1 + self._blank_lines)
+
+    def _inline_html(self, line: str, continuation: bool) -> str:
+        return render_inline(line if continuation else BULLET_REGEX.sub('', line))
+
+    def _emit(self, separator: str, html: str, closer: str = ""):
+        # closer: penutup tambahan yang akan ikut terbuka setelah html ini (pembuka blok kode).
+        if self._page_has_body and self._exceeds(len(separator) + len(html) + len(closer)):
+            self._close_page()
+            separator = ""
+        if not self._page_parts:
+            separator = ""
+        self._page_parts.append(separator + html)
+        self._page_length += len(separator) + len(html)
+        self._page_has_body = True
+
+    def _close_page(self):
+        html = "".join(self._page_parts).strip()
+        if self._code_tag is not None:
+            html += CODE_CLOSE
+        self._pages.append(html)
+        # Blok kode yang terpotong halaman dibuka lagi di halaman berikutnya.
+        self._page_parts = [self._code_tag] if self._code_tag is not None else []
+        self._page_length = len(self._code_tag) if self._code_tag is not None else 0
+        self._page_has_body = False
+        self._page_cache = ""
+        self._page_cached_parts = 0
+        self._code_has_lines = False
+
+    def _commit_line(self, line: str, segment: bool = False):
+        continuation = self._continuation
+        self._continuation = segment
+        stripped = line.strip()
+        if stripped.startswith(CODE_FENCE) and not continuation:
+            self._commit_fence(stripped)
+            return
+
+        if self._code_tag is not None:
+            separator = "\n" if self._code_has_lines and not continuation else ""
+            self._emit(separator, escape_html(line))
+            self._code_has_lines = True
+            return
+
+        if not stripped and not continuation:
+            if self._has_content:
+                self._blank_lines += 1
+            return
+
+        self._emit(self._separator(continuation), self._inline_html(line, continuation))
+        self._has_content = True
+        self._blank_lines = 0
+
+    def _tail_html(self) -> Tuple[str, str]:
+        line = self._pending
+        continuation = self._continuation
+        stripped = line.strip()
+        if not line or (stripped.startswith(CODE_FENCE) and not continuation):
+            # Pagar kode yang belum lengkap disembunyikan sampai barisnya selesai.
+            return "", ""
+        if self._code_tag is not None:
+            return ("\n" if self._code_has_lines and not continuation else ""), escape_html(line)
+        if not stripped and not continuation:
+            return "", ""
+        return self._separator(continuation), self._inline_html(line, continuation)
+
+    def _commit_fence(self, stripped: str):
+        if self._code_tag is not None:
+            if self._page_has_body:
+                self._page_parts.append(CODE_CLOSE)
+                self._page_length += len(CODE_CLOSE)
+            else:
+                # Halaman baru hanya berisi tag pembuka blok kode; tidak perlu blok kosong.
+                self._page_parts = []
+                self._page_length = 0
+                self._page_cache = ""
+                self._page_cached_parts = 0
+            self._code_tag = None
+            return
+
+        separator = self._separator(False)
+        rest = stripped[len(CODE_FENCE):]
+        closing = rest.find(CODE_FENCE)
+        if closing >= 0:
+            # Blok kode satu baris: ```kode```
+            self._emit(separator, f"<pre><code>{escape_html(rest[:closing].strip())}</code></pre>")
+        else:
+            language = rest.strip()
+            if language and len(language) <= CODE_LANGUAGE_MAX_CHARS and language.replace('-', '').replace('+', '').isalnum():
+                code_tag = f'<pre><code class="language-{escape_html(language)}">'
+            else:
+                code_tag = "<pre><code>"
+            self._emit(separator, code_tag, CODE_CLOSE)
+            self._code_tag = code_tag
+            self._code_has_lines = False
+        self._has_content = True
+        self._blank_lines = 0
+
+def render_markdown(text: str) -> str:
+    renderer = StreamingMarkdownRenderer()
+    renderer.feed(text)
+    return "".join(renderer.finish())
@@ -0,0 +1,270 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from telebot.asyncio_helper import ApiTelegramException
+
+
+# Batas Telegram: sekitar 30 pesan/detik secara global, 1 pesan/detik per chat pribadi,
+# dan 20 pesan/menit per grup.
+OUTBOUND_GLOBAL_RATE = 30.0
+OUTBOUND_CHAT_RATE = 1.0
+OUTBOUND_GROUP_RATE = 20 / 60
+OUTBOUND_CHAT_BURST = 3
+OUTBOUND_MAX_IN_FLIGHT = 16
+OUTBOUND_MAX_RETRIES = 5
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+class _Operation:
+    __slots__ = ('func', 'args', 'kwargs', 'future', 'edit_key', 'enqueued_at', 'attempts')
+
+    def __init__(self, func: Callable, args: tuple, kwargs: dict, edit_key: Optional[Tuple[int, int]] = None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = asyncio.get_running_loop().create_future()
+        self.edit_key = edit_key
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+class _ChatQueue:
+    __slots__ = ('operations', 'bucket', 'blocked_until', 'busy')
+
+    def __init__(self, bucket: TokenBucket):
+        self.operations: Deque[_Operation] = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.busy = False
+
+class OutboundScheduler:
+    def __init__(
+        self,
+        bot,
+        global_rate: float = OUTBOUND_GLOBAL_RATE,
+        chat_rate: float = OUTBOUND_CHAT_RATE,
+        group_rate: float = OUTBOUND_GROUP_RATE,
+        chat_burst: int = OUTBOUND_CHAT_BURST,
+        max_in_flight: int = OUTBOUND_MAX_IN_FLIGHT,
+        max_retries: int = OUTBOUND_MAX_RETRIES
+    ):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.sent = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.max_wait_ms = 0.0
+        # Urutan OrderedDict dipakai untuk round-robin antar chat.
+        self._chats: "OrderedDict[int, _ChatQueue]" = OrderedDict()
+        self._pending_edits: Dict[Tuple[int, int], _Operation] = {}
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+    def start(self):
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for chat in self._chats.values():
+            while chat.operations:
+                operation = chat.operations.popleft()
+                if not operation.future.done():
+                    operation.future.cancel()
+        self._chats.clear()
+        self._pending_edits.clear()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(chat.operations) for chat in self._chats.values())
+
+    def call(self, chat_id: int, func: Callable, *args, **kwargs) -> asyncio.Future:
+        # Semua pemanggilan API yang mengirim sesuatu ke chat (send, reply, delete, foto) lewat sini.
+        return self._enqueue(chat_id, _Operation(func, args, kwargs))
+
+    def edit(self, chat_id: int, message_id: int, text: str, **kwargs) -> asyncio.Future:
+        key = (chat_id, message_id)
+        pending = self._pending_edits.get(key)
+        if pending is not None:
+            # Edit yang belum terkirim cukup diganti isinya: hanya teks terakhir yang dikirim,
+            # dan semua pemanggil menerima hasil yang sama.
+            pending.args = (text, chat_id, message_id)
+            pending.kwargs = kwargs
+            self.coalesced += 1
+            return pending.future
+        operation = _Operation(self.bot.edit_message_text, (text, chat_id, message_id), kwargs, edit_key=key)
+        self._pending_edits[key] = operation
+        return self._enqueue(chat_id, operation)
+
+    def _enqueue(self, chat_id: int, operation: _Operation) -> asyncio.Future:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            # ID chat negatif adalah grup/kanal dengan batas per menit yang lebih ketat.
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            chat = _ChatQueue(TokenBucket(rate, self.chat_burst))
+            self._chats[chat_id] = chat
+        chat.operations.append(operation)
+        self.max_depth = max(self.max_depth, self.queue_depth)
+        self._wakeup.set()
+        return operation.future
+
+    def _next_chat(self, now: float) -> Tuple[Optional[int], float]:
+        for chat_id in [chat_id for chat_id, chat in self._chats.items() if self._is_idle(chat, now)]:
+            del self._chats[chat_id]
+
+        wait = None
+        for chat_id, chat in self._chats.items():
+            if chat.busy or not chat.operations:
+                continue
+            delay = max(chat.blocked_until - now, chat.bucket.delay(now))
+            if delay <= 0:
+                self._chats.move_to_end(chat_id)
+                return chat_id, 0.0
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            global_delay = self.global_bucket.delay(now)
+            if global_delay > 0:
+                await asyncio.sleep(global_delay)
+                continue
+
+            chat_id, wait = self._next_chat(now)
+            if chat_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            chat = self._chats[chat_id]
+            operation = chat.operations.popleft()
+            if operation.edit_key is not None:
+                self._pending_edits.pop(operation.edit_key, None)
+            if operation.future.done():
+                continue
+
+            await self._in_flight.acquire()
+            now = time.monotonic()
+            chat.bucket.take(now)
+            self.global_bucket.take(now)
+            chat.busy = True
+            task = asyncio.create_task(self._execute(chat_id, chat, operation))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, chat_id: int, chat: _ChatQueue, operation: _Operation):
+        try:
+            operation.attempts += 1
+            wait_ms = (time.monotonic() - operation.enqueued_at) * 1000
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            result = await operation.func(*operation.args, **operation.kwargs)
+            self.sent += 1
+            if not operation.future.done():
+                operation.future.set_result(result)
+
+        except ApiTelegramException as e:
+            if "message is not modified" in e.description:
+                if not operation.future.done():
+                    operation.future.set_result(None)
+                return
+            retry_after = (e.result_json.get('parameters') or {}).get('retry_after')
+            if e.error_code == 429 and retry_after is not None and operation.attempts <= self.max_retries:
+                # Operasi dikembalikan ke depan antrean chat dan chat ditahan selama retry_after.
+                self.rate_limited += 1
+                logging.warning(f"Telegram membatasi chat {chat_id}, menunggu {retry_after} detik.")
+                chat.blocked_until = time.monotonic() + retry_after
+                self._requeue(chat, operation)
+            else:
+                self._fail(operation, e)
+
+        except Exception as e:
+            self._fail(operation, e)
+
+        finally:
+            chat.busy = False
+            self._in_flight.release()
+            self._wakeup.set()
+
+    def _is_idle(self, chat: _ChatQueue, now: float) -> bool:
+        # Chat hanya dilepas setelah bucket-nya penuh kembali; jika tidak, chat yang sama akan
+        # mendapat jatah burst baru yang belum benar-benar pulih.
+        return not chat.operations and not chat.busy and chat.blocked_until <= now and chat.bucket.is_full(now)
+
+    def _requeue(self, chat: _ChatQueue, operation: _Operation):
+        if operation.edit_key is not None:
+            newer = self._pending_edits.get(operation.edit_key)
+            if newer is not None:
+                # Sudah ada teks yang lebih baru untuk pesan ini; edit lama tidak perlu diulang.
+                newer.future.add_done_callback(lambda future: self._copy_result(future, operation.future))
+                return
+            self._pending_edits[operation.edit_key] = operation
+        chat.operations.appendleft(operation)
+
+    @staticmethod
+    def _copy_result(source: asyncio.Future, target: asyncio.Future):
+        if target.done():
+            return
+        if source.cancelled():
+            target.cancel()
+        elif source.exception() is not None:
+            target.set_exception(source.exception())
+        else:
+            target.set_result(source.result())
+
+    def _fail(self, operation: _Operation, error: Exception):
+        self.failed += 1
+        if not operation.future.done():
+            operation.future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_depth,
+            'chats_waiting': sum(1 for chat in self._chats.values() if chat.operations),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'rate_limited': self.rate_limited,
+            'failed': self.failed,
+            'max_wait_ms': round(self.max_wait_ms, 1),
+        }
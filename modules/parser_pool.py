@@ -0,0 +1,133 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+from . import parsers
+
+
+PARSER_POOL_WORKERS = min(4, os.cpu_count() or 1)
+PARSER_JOB_TIMEOUT = 60
+PARSER_MEMORY_LIMIT_BYTES = 2048 * 1024 * 1024
+
+class ParserError(Exception):
+    pass
+
+def _mp_context():
+    # forkserver: worker di-fork dari proses server yang bersih (tanpa thread event loop
+    # atau aiosqlite) dan yang sudah mengimpor library parser, sehingga worker baru siap pakai.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['modules.parsers', *parsers.HEAVY_MODULES])
+        return context
+    return multiprocessing.get_context('spawn')
+
+class ParserPool:
+    def __init__(
+        self,
+        workers: int = PARSER_POOL_WORKERS,
+        job_timeout: float = PARSER_JOB_TIMEOUT,
+        memory_limit_bytes: Optional[int] = PARSER_MEMORY_LIMIT_BYTES,
+        initializer: Callable = parsers.init_worker,
+        initargs: Optional[tuple] = None,
+        name: str = "parser"
+    ):
+        self.workers = max(1, workers)
+        self.job_timeout = job_timeout
+        self.memory_limit_bytes = memory_limit_bytes
+        self.initializer = initializer
+        self.initargs = initargs if initargs is not None else (memory_limit_bytes,)
+        self.name = name
+        self.restarts = 0
+        self.timeouts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._generation = 0
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._start_lock:
+            if self._executor is not None:
+                return
+            started_at = time.perf_counter()
+            # Pembuatan proses menunggu forkserver selesai mengimpor library parser (dan
+            # initializer selesai), jadi dijalankan di thread agar event loop tidak tertahan.
+            self._executor = await asyncio.to_thread(self._create_warm_executor)
+            elapsed = time.perf_counter() - started_at
+            logging.info(f"Pool {self.name} siap dengan {self.workers} proses worker ({elapsed:.2f} detik).")
+
+    async def close(self):
+        if self._executor is not None:
+            self._shutdown_executor(self._executor)
+            self._executor = None
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None) -> Any:
+        if self._executor is None:
+            await self.start()
+        timeout = timeout or self.job_timeout
+
+        # Satu percobaan ulang: worker yang crash membuat seluruh pool rusak, jadi tugas lain
+        # yang kebetulan berjalan bersamaan diulang di pool baru. Input penyebab crash akan
+        # merusak pool lagi dan gagal pada percobaan kedua.
+        for attempt in range(2):
+            executor = self._executor
+            generation = self._generation
+            future = asyncio.get_running_loop().run_in_executor(executor, func, *args)
+            try:
+                return await asyncio.wait_for(future, timeout=timeout)
+
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                logging.error(f"Tugas {self.name} {func.__name__} melebihi batas waktu {timeout} detik, pool dimulai ulang.")
+                self._restart(generation)
+                raise ParserError(f"Pemrosesan melebihi batas waktu {timeout} detik.")
+
+            except BrokenProcessPool:
+                logging.error(f"Worker {self.name} berhenti tidak normal saat menjalankan {func.__name__}.")
+                self._restart(generation)
+                if attempt:
+                    raise ParserError("Worker parser berhenti tidak normal.")
+
+            except MemoryError:
+                raise ParserError("Pemrosesan melebihi batas memori worker.")
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=_mp_context(),
+            initializer=self.initializer,
+            initargs=self.initargs
+        )
+
+    def _create_warm_executor(self) -> ProcessPoolExecutor:
+        executor = self._create_executor()
+        # Satu tugas per worker agar semua proses dibuat sekarang, bukan saat file pertama datang.
+        try:
+            for future in [executor.submit(parsers.ping) for _ in range(self.workers)]:
+                future.result()
+        except BaseException:
+            self._shutdown_executor(executor)
+            raise
+        return executor
+
+    def _restart(self, generation: int):
+        # Tugas lain yang gagal karena pool yang sama tidak memulai ulang pool dua kali.
+        if generation != self._generation:
+            return
+        self._generation += 1
+        self.restarts += 1
+        old_executor = self._executor
+        self._executor = self._create_executor()
+        if old_executor is not None:
+            self._shutdown_executor(old_executor)
+
+    @staticmethod
+    def _shutdown_executor(executor: ProcessPoolExecutor):
+        # Worker yang macet tidak bisa dibatalkan lewat future, jadi prosesnya dihentikan langsung.
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
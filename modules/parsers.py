@@ -0,0 +1,436 @@
+import io
+import os
+import re
+import time
+import signal
+import hashlib
+import logging
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Modul ini dijalankan di dalam proses worker parser, jadi tidak boleh mengimpor
+# bot_setup, config, atau modul lain yang membuat koneksi saat diimpor. Library parser
+# yang berat diimpor saat pertama dipakai agar proses utama tetap cepat saat startup.
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(module)s - %(message)s'
+)
+
+MIN_ARTICLE_LENGTH = 150
+DOCUMENT_CHAR_BUDGET = 100_000
+TABLE_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+DOCUMENT_MAX_ROWS = 5000
+CSV_CHUNK_ROWS = 50_000
+TABLE_SAMPLE_ROWS = 5
+TABLE_TOP_VALUES = 5
+TABLE_MAX_GROUPS = 10
+DATE_DETECTION_SAMPLE = 50
+DATE_DETECTION_RATIO = 0.9
+BOOL_VALUES = {True: True, False: False, 'True': True, 'False': False, 'true': True, 'false': False}
+HEAVY_MODULES = ('fitz', 'docx', 'pptx', 'pandas', 'pyarrow.feather', 'newspaper', 'bs4')
+
+def init_worker(memory_limit_bytes: Optional[int] = None):
+    # Ctrl+C ditangani oleh proses utama; worker dihentikan lewat shutdown pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if resource is not None and memory_limit_bytes:
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+        except (ValueError, OSError) as e:
+            logging.warning(f"Gagal menerapkan batas memori worker parser: {e}")
+
+def ping() -> bool:
+    return True
+
+def _feather():
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        return None
+    return feather
+
+class _TextBudget:
+    # Mengumpulkan teks per halaman/slide sampai anggaran karakter habis, sehingga sisa
+    # dokumen tidak perlu diekstrak sama sekali.
+    def __init__(self, char_budget: int):
+        self.parts: List[str] = []
+        self.remaining = char_budget
+        self.truncated = False
+
+    def add(self, text: str) -> bool:
+        if not text:
+            return True
+        if len(text) > self.remaining:
+            if self.remaining:
+                self.parts.append(text[:self.remaining])
+            self.remaining = 0
+            self.truncated = True
+            return False
+        self.parts.append(text)
+        self.remaining -= len(text)
+        return True
+
+def parse_document(
+    file_name: str, 
+    data: bytes, 
+    char_budget: int = DOCUMENT_CHAR_BUDGET, 
+    table_store_dir: Optional[str] = None
+) -> Tuple[str, Dict]:
+    if is_table_file(file_name):
+        return profile_table(file_name, data, table_store_dir)
+
+    file_name_lower = file_name.lower()
+    budget = _TextBudget(char_budget)
+    meta: Dict = {'pages': None}
+
+    if file_name_lower.endswith('.pdf'):
+        import fitz
+        with fitz.open(stream=io.BytesIO(data), filetype="pdf") as doc:
+            meta['pages'] = doc.page_count
+            for page in doc:
+                meta['pages_read'] = page.number + 1
+                if not budget.add(page.get_text()):
+                    break
+
+    elif file_name_lower.endswith('.docx'):
+        import docx
+        doc = docx.Document(io.BytesIO(data))
+        for para in doc.paragraphs:
+            if not budget.add(para.text + "\n"):
+                break
+
+    elif file_name_lower.endswith('.pptx'):
+        import pptx
+        prs = pptx.Presentation(io.BytesIO(data))
+        meta['pages'] = len(prs.slides)
+        for slide_number, slide in enumerate(prs.slides, start=1):
+            meta['pages_read'] = slide_number
+            slide_text = "\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text"))
+            if not budget.add(slide_text + "\n"):
+                break
+
+    else:
+        budget.add(data.decode('utf-8', errors='ignore'))
+
+    text = "".join(budget.parts)
+    meta['truncated'] = budget.truncated
+    meta['chars'] = len(text)
+    return text, meta
+
+def is_table_file(file_name: str) -> bool:
+    return file_name.lower().endswith(TABLE_EXTENSIONS)
+
+def _to_datetime(series: "pd.Series") -> "pd.Series":
+    import pandas as pd
+    return pd.to_datetime(series, errors='coerce', format='mixed', utc=True).dt.tz_localize(None)
+
+def _column_kinds(df: "pd.DataFrame") -> Dict[str, str]:
+    # Tipe tiap kolom ditentukan dari blok pertama lalu dipaksakan ke blok berikutnya, agar
+    # semua blok memiliki skema yang sama di salinan kolumnar.
+    import pandas as pd
+    kinds = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            kinds[column] = 'bool'
+        elif pd.api.types.is_numeric_dtype(series):
+            kinds[column] = 'number'
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            kinds[column] = 'datetime'
+        else:
+            sample = series.dropna().head(DATE_DETECTION_SAMPLE)
+            is_date = not sample.empty and _to_datetime(sample.astype(str)).notna().mean() >= DATE_DETECTION_RATIO
+            kinds[column] = 'datetime' if is_date else 'text'
+    return kinds
+
+def _normalize_chunk(df: "pd.DataFrame", kinds: Dict[str, str]) -> "pd.DataFrame":
+    import pandas as pd
+    columns = {}
+    for column, kind in kinds.items():
+        series = df[column]
+        if kind == 'number':
+            series = pd.to_numeric(series, errors='coerce').astype('float64')
+        elif kind == 'datetime':
+            series = _to_datetime(series)
+        elif kind == 'bool':
+            series = series.map(BOOL_VALUES).astype('boolean')
+        else:
+            series = series.astype('string')
+        columns[column] = series
+    return pd.DataFrame(columns).reset_index(drop=True)
+
+def _iter_table_chunks(file_name_lower: str, data: bytes, max_rows: Optional[int] = None):
+    import pandas as pd
+    if file_name_lower.endswith('.csv'):
+        reader = pd.read_csv(io.BytesIO(data), chunksize=CSV_CHUNK_ROWS, nrows=max_rows)
+    else:
+        # openpyxl/xlrd tidak mendukung pembacaan per blok; ukuran file sudah dibatasi saat unggah.
+        reader = [pd.read_excel(io.BytesIO(data), nrows=max_rows)]
+    kinds = None
+    for chunk in reader:
+        chunk.columns = [str(column) for column in chunk.columns]
+        if kinds is None:
+            kinds = _column_kinds(chunk)
+        yield _normalize_chunk(chunk, kinds)
+
+def _load_table(file_name_lower: str, data: bytes, max_rows: int) -> Tuple["pd.DataFrame", bool]:
+    # Dipakai jika salinan kolumnar tidak tersedia: seluruh tabel harus muat di memori, jadi
+    # pembacaan berhenti di batas baris (satu baris ekstra hanya untuk mendeteksi pemotongan).
+    import pandas as pd
+    df = pd.concat(_iter_table_chunks(file_name_lower, data, max_rows + 1), ignore_index=True)
+    truncated = len(df) > max_rows
+    if truncated:
+        df = df.head(max_rows)
+    return df, truncated
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}" if abs(value) >= 1000 else f"{value:.4g}"
+    return str(value)
+
+def _column_profile(series: "pd.Series") -> str:
+    import pandas as pd
+    non_null = series.dropna()
+    parts = [f"{series.dtype}", f"kosong={series.isna().sum()}", f"unik={non_null.nunique()}"]
+    if non_null.empty:
+        return ", ".join(parts)
+
+    if pd.api.types.is_bool_dtype(series):
+        pass
+    elif pd.api.types.is_numeric_dtype(series):
+        values = non_null.astype('float64')
+        parts += [
+            f"min={_format_value(values.min())}",
+            f"maks={_format_value(values.max())}",
+            f"rata-rata={_format_value(values.mean())}",
+            f"median={_format_value(values.median())}",
+            f"jumlah={_format_value(values.sum())}",
+        ]
+        return ", ".join(parts)
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        parts += [f"dari={non_null.min()}", f"sampai={non_null.max()}"]
+        return ", ".join(parts)
+
+    top_values = non_null.astype(str).value_counts().head(TABLE_TOP_VALUES)
+    parts.append("teratas: " + "; ".join(f"{value} ({count})" for value, count in top_values.items()))
+    return ", ".join(parts)
+
+def _store_table(file_name_lower: str, data: bytes, store_dir: str) -> str:
+    # Tabel ditulis blok demi blok ke file Arrow IPC (format Feather v2), sehingga salinan
+    # mencakup semua baris tanpa pernah menggabungkan seluruh tabel di memori.
+    import pyarrow as pa
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, f"{hashlib.sha256(data).hexdigest()}.feather")
+    try:
+        # File yang dipakai ulang diperbarui mtime-nya agar tidak dihapus prune_table_store.
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    writer = None
+    try:
+        for chunk in _iter_table_chunks(file_name_lower, data):
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                writer = pa.ipc.new_file(tmp_path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    writer.close()
+    os.replace(tmp_path, path)
+    return path
+
+def _profile_text(
+    file_name: str,
+    rows: int,
+    columns: List[str],
+    column_series,
+    head: "pd.DataFrame",
+    tail: "pd.DataFrame",
+    limit_note: str = ""
+) -> str:
+    import pandas as pd
+    lines = [
+        f"PROFIL TABEL `{file_name}`: {rows} baris x {len(columns)} kolom{limit_note}.",
+        "",
+        "Kolom:",
+    ]
+    lines += [f"- {column}: {_column_profile(column_series(column))}" for column in columns]
+    if rows:
+        with pd.option_context('display.max_columns', 30, 'display.width', 200, 'display.max_colwidth', 40):
+            lines += ["", f"{TABLE_SAMPLE_ROWS} baris pertama:", head.to_string()]
+            if rows > TABLE_SAMPLE_ROWS:
+                lines += ["", f"{TABLE_SAMPLE_ROWS} baris terakhir:", tail.to_string()]
+    return "\n".join(lines)
+
+def profile_table(
+    file_name: str,
+    data: bytes,
+    store_dir: Optional[str] = None,
+    max_rows: int = DOCUMENT_MAX_ROWS
+) -> Tuple[str, Dict]:
+    # Profil ringkas (skema, statistik per kolom, contoh baris) menggantikan df.to_string().
+    # Dengan salinan kolumnar, profil dan agregasi mencakup seluruh baris dan kolom dibaca
+    # satu per satu dari file yang di-memory-map; tanpa pyarrow, tabel dibatasi max_rows baris.
+    feather = _feather()
+    if store_dir and feather is not None:
+        table_path = _store_table(file_name.lower(), data, store_dir)
+        table = feather.read_table(table_path, memory_map=True)
+        rows = table.num_rows
+        head = table.slice(0, TABLE_SAMPLE_ROWS).to_pandas()
+        tail = table.slice(max(rows - TABLE_SAMPLE_ROWS, 0)).to_pandas()
+        tail.index = range(rows - len(tail), rows)
+        text = _profile_text(
+            file_name, rows, table.column_names,
+            lambda column: table.select([column]).to_pandas()[column],
+            head, tail
+        )
+        truncated = False
+        columns = len(table.column_names)
+    else:
+        table_path = None
+        df, truncated = _load_table(file_name.lower(), data, max_rows)
+        limit_note = f" (hanya {max_rows} baris pertama yang dibaca)" if truncated else ""
+        text = _profile_text(
+            file_name, len(df), list(df.columns), lambda column: df[column],
+            df.head(TABLE_SAMPLE_ROWS), df.tail(TABLE_SAMPLE_ROWS), limit_note
+        )
+        rows = len(df)
+        columns = len(df.columns)
+
+    meta = {
+        'pages': None,
+        'rows': rows,
+        'columns': columns,
+        'truncated': truncated,
+        'chars': len(text),
+        'table_path': table_path,
+    }
+    return text, meta
+
+def _mentioned_columns(columns: List[str], question: str) -> List[str]:
+    question_terms = set(re.findall(r"\w+", question.lower()))
+    mentioned = []
+    for column in columns:
+        column_terms = re.findall(r"\w+", column.lower())
+        if column.lower() in question.lower() or (column_terms and set(column_terms) <= question_terms):
+            mentioned.append(column)
+    return mentioned
+
+def aggregate_table(table_path: str, question: str, max_groups: int = TABLE_MAX_GROUPS) -> str:
+    # Agregasi untuk kolom yang disebut dalam pertanyaan, dihitung dari file kolumnar
+    # sehingga file asli tidak perlu di-parse ulang.
+    feather = _feather()
+    if feather is None or not table_path or not os.path.exists(table_path):
+        return ""
+    import pandas as pd
+    columns = feather.read_table(table_path, memory_map=True).column_names
+    mentioned = _mentioned_columns(columns, question)
+    if not mentioned:
+        return ""
+
+    df = pd.read_feather(table_path, columns=mentioned)
+    numeric = [column for column in mentioned if pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column])]
+    categorical = [column for column in mentioned if column not in numeric and not pd.api.types.is_datetime64_any_dtype(df[column])]
+
+    lines = []
+    for column in numeric:
+        values = df[column].dropna().astype('float64')
+        lines.append(
+            f"{column}: jumlah={_format_value(values.sum())}, rata-rata={_format_value(values.mean())}, "
+            f"min={_format_value(values.min())}, maks={_format_value(values.max())}, n={len(values)}"
+        )
+    for group_column in categorical:
+        if numeric:
+            grouped = df.groupby(group_column, dropna=True)[numeric].agg(['sum', 'mean'])
+            grouped = grouped.sort_values((numeric[0], 'sum'), ascending=False).head(max_groups)
+            with pd.option_context('display.width', 200, 'display.float_format', '{:,.4g}'.format):
+                lines.append(f"Per {group_column} (maks {max_groups} grup teratas):\n{grouped.to_string()}")
+        else:
+            counts = df[group_column].value_counts().head(max_groups)
+            lines.append(f"Frekuensi {group_column}:\n{counts.to_string()}")
+    return "\n".join(lines)
+
+def prune_table_store(store_dir: Optional[str], max_age_seconds: float) -> int:
+    if not store_dir or not os.path.isdir(store_dir):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    for entry in os.scandir(store_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+def _extract_with_newspaper(url: str, html: str) -> Tuple[Optional[str], Optional[str]]:
+
+    try:
+        from newspaper import Article
+        article = Article(url)
+        article.download(input_html=html)
+        article.parse()
+        title = article.title if article.title else "Tanpa Judul"
+        content = article.text
+        return content, title
+
+    except Exception as e:
+        logging.error(f"[Newspaper3k] Gagal memproses URL {url}: {e}")
+        return None, None
+
+def _extract_with_bs(url: str, html: str) -> Tuple[Optional[str], Optional[str]]:
+    logging.info(f"[BeautifulSoup] Mencoba mengekstrak konten dari URL: {url}")
+
+    try:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'lxml')
+
+        for script_or_style in soup(['script', 'style', 'nav', 'footer', 'header']):
+            script_or_style.decompose()
+
+        title = soup.title.string if soup.title and soup.title.string else "Tanpa Judul"
+        text = (soup.body or soup).get_text(separator=' ', strip=True)
+        return text, title
+
+    except Exception as e:
+        logging.error(f"[BeautifulSoup] Gagal mem-parsing konten dari {url}: {e}")
+        return None, None
+
+def decode_html(raw: bytes, charsets: List[str]) -> str:
+    # Deteksi encoding bisa memakan ratusan milidetik untuk halaman besar tanpa charset,
+    # jadi dijalankan di proses worker, bukan di event loop.
+    from bs4 import UnicodeDammit
+    return UnicodeDammit(raw, charsets, is_html=True).unicode_markup
+
+def extract_html(url: str, raw: bytes, charsets: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    html = decode_html(raw, charsets)
+    if not html:
+        logging.warning(f"Halaman {url} kosong setelah decoding.")
+        return None, None
+    content_np, title_np = _extract_with_newspaper(url, html)
+    if content_np and len(content_np) > MIN_ARTICLE_LENGTH:
+        logging.info(f"Ekstraksi dengan Newspaper3k berhasil untuk {url}")
+        return content_np, title_np
+    logging.warning(f"Newspaper3k tidak mendapatkan konten yang cukup dari {url}. Menjalankan fallback.")
+
+    content_bs, title_bs = _extract_with_bs(url, html)
+    if content_bs:
+        logging.info(f"Ekstraksi dengan BeautifulSoup (fallback) berhasil untuk {url}")
+    else:
+        logging.warning(f"Semua metode ekstraksi gagal untuk {url}")
+    return content_bs, title_bs
@@ -0,0 +1,147 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+
+TOKEN_REGEX = re.compile(r"\w+|[^\w\s]")
+CHARS_PER_SUBWORD = 4
+DIGEST_TOKENS_PER_MESSAGE = 40
+CACHED_TEXT_MAX_CHARS = 8000
+CHARS_PER_WORD = 6
+
+def _count_tokens(text: str) -> int:
+    # Perkiraan lokal tanpa tokenizer model: setiap kata dipecah menjadi sub-kata
+    # sepanjang ~4 karakter, setiap tanda baca dihitung satu token.
+    return sum(
+        1 + (len(match.group()) - 1) // CHARS_PER_SUBWORD
+        for match in TOKEN_REGEX.finditer(text)
+    )
+
+_count_tokens_cached = lru_cache(maxsize=4096)(_count_tokens)
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    # Pesan riwayat dihitung ulang setiap giliran, jadi hasilnya di-cache; teks besar
+    # (mis. konteks file) tidak di-cache agar tidak tertahan di memori.
+    if len(text) <= CACHED_TEXT_MAX_CHARS:
+        return _count_tokens_cached(text)
+    return _count_tokens(text)
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    if budget <= 0:
+        return ""
+    if estimate_tokens(text) <= budget:
+        return text
+
+    used = 0
+    cut = 0
+    for match in TOKEN_REGEX.finditer(text):
+        used += 1 + (len(match.group()) - 1) // CHARS_PER_SUBWORD
+        if used > budget:
+            break
+        cut = match.end()
+    return text[:cut].rstrip() + "…"
+
+def _message_text(item: Dict) -> str:
+    parts = item.get('parts') or []
+    return parts[0] if parts and isinstance(parts[0], str) else ""
+
+def _message_tokens(item: Dict) -> int:
+    return estimate_tokens(_message_text(item))
+
+def split_recent_turns(messages: List[Dict], budget: int, max_turns: int) -> Tuple[List[Dict], List[Dict]]:
+    # Mengambil pasangan giliran terbaru (user + model) secara utuh selama masih muat
+    # dalam anggaran; sisanya dikembalikan sebagai pesan lama untuk diringkas.
+    recent_start = len(messages)
+    used = 0
+    turns = 0
+    index = len(messages)
+
+    while index > 0 and turns < max_turns:
+        start = index - 1
+        while start > 0 and messages[start].get('role') != 'user':
+            start -= 1
+        cost = sum(_message_tokens(item) for item in messages[start:index])
+        if used + cost > budget:
+            break
+        used += cost
+        turns += 1
+        recent_start = index = start
+
+    return messages[:recent_start], messages[recent_start:]
+
+def build_history_digest(messages: List[Dict], budget: int) -> str:
+    if not messages or budget <= 0:
+        return ""
+
+    lines = []
+    used = 0
+    for item in reversed(messages):
+        text = " ".join(_message_text(item).split())
+        if not text:
+            continue
+        line = f"{item.get('role', 'user')}: {truncate_to_tokens(text, DIGEST_TOKENS_PER_MESSAGE)}"
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+
+    omitted = len(messages) - len(lines)
+    if omitted > 0:
+        lines.append(f"(... {omitted} pesan lebih awal dihilangkan)")
+    return "\n".join(reversed(lines))
+
+def history_to_text(history: List[Dict], budget: int, recent_turns: int, digest_budget: int) -> str:
+    # Teks riwayat untuk prompt strategi/riset: prompt sistem tidak disertakan.
+    messages = history[1:]
+    older, recent = split_recent_turns(messages, max(budget - digest_budget, 0), recent_turns)
+    recent_lines = [f"{item['role']}: {_message_text(item)}" for item in recent if _message_text(item)]
+
+    digest = build_history_digest(older, min(digest_budget, budget))
+    if digest:
+        return f"Ringkasan percakapan sebelumnya:\n{digest}\n\n" + "\n".join(recent_lines)
+    return "\n".join(recent_lines)
+
+def build_history_window(
+    history: List[Dict],
+    budget: int,
+    recent_turns: int,
+    digest_budget: int
+) -> List[Dict]:
+    # Riwayat untuk panggilan generate: prompt sistem utuh, pesan lama dilipat menjadi
+    # ringkasan di bawah prompt sistem, lalu giliran terbaru apa adanya.
+    if not history:
+        return []
+
+    system_part = history[0]
+    greeting = history[1] if len(history) > 1 and history[1].get('role') == 'model' else None
+    messages = history[2:] if greeting else history[1:]
+
+    remaining = budget - _message_tokens(system_part) - (_message_tokens(greeting) if greeting else 0)
+    older, recent = split_recent_turns(messages, max(remaining - digest_budget, 0), recent_turns)
+    if not older:
+        return list(history)
+
+    digest = build_history_digest(older, min(digest_budget, max(remaining, 0)))
+    system_text = _message_text(system_part)
+    if digest:
+        system_text += f"\n\n**Ringkasan percakapan sebelumnya (dipadatkan):**\n{digest}"
+
+    window = [{'role': system_part.get('role', 'user'), 'parts': [system_text]}]
+    window.append(greeting or {'role': 'model', 'parts': ["Baik, saya mengerti."]})
+    window.extend(recent)
+    return window
+
+def length_instruction(target_chars: int, allow_long_code: bool = False) -> str:
+    # Target panjang diberikan sejak awal, jadi jawaban panjang tidak perlu diringkas ulang
+    # dengan panggilan kedua setelah streaming selesai.
+    instruction = (
+        f"\n\n[Batas panjang: usahakan jawaban tidak lebih dari sekitar {target_chars} karakter "
+        f"(±{target_chars // CHARS_PER_WORD} kata). Jika topiknya lebih luas, dahulukan poin terpenting "
+        f"dan tawarkan untuk melanjutkan. Jangan menyebut batas ini dalam jawaban."
+    )
+    if allow_long_code:
+        instruction += " Kode lengkap yang diminta boleh melebihi batas ini."
+    return instruction + "]"
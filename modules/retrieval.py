@@ -0,0 +1,137 @@
+import re
+import json
+import math
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+from .prompt_builder import estimate_tokens
+
+
+CHUNK_TARGET_CHARS = 1200
+CHUNK_MIN_CHARS = 400
+RETRIEVAL_TOP_K = 8
+BM25_K1 = 1.2
+BM25_B = 0.75
+TERM_REGEX = re.compile(r"\w+", re.UNICODE)
+PARAGRAPH_BREAK_REGEX = re.compile(r"\n\s*\n")
+CHUNK_BREAK_REGEX = re.compile(r"\n|(?<=[.!?])\s+|\s+")
+STOPWORDS = {
+    "yang", "dan", "di", "ke", "dari", "ini", "itu", "untuk", "dengan", "pada", "adalah", "atau", "juga",
+    "dalam", "tidak", "akan", "ada", "saya", "kamu", "anda", "apa", "bagaimana", "mengapa", "kenapa",
+    "tolong", "jelaskan", "sebutkan", "bisa", "dong", "nya", "sebagai", "oleh", "karena", "jadi", "tersebut",
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "is", "are", "was", "were", "be", "what",
+    "how", "why", "this", "that", "it", "with", "as", "by", "please", "explain",
+}
+
+def tokenize(text: str) -> List[str]:
+    return [
+        term for term in TERM_REGEX.findall(text.lower())
+        if term not in STOPWORDS and (len(term) > 1 or term.isdigit())
+    ]
+
+def chunk_spans(text: str, target_chars: int = CHUNK_TARGET_CHARS) -> List[Tuple[int, int]]:
+    # Memotong di batas paragraf/kalimat terdekat sebelum target agar setiap potongan utuh.
+    spans = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + target_chars, length)
+        if end < length:
+            window_start = start + CHUNK_MIN_CHARS
+            window = text[window_start:end]
+            for regex in (PARAGRAPH_BREAK_REGEX, CHUNK_BREAK_REGEX):
+                breaks = [match.end() for match in regex.finditer(window)]
+                if breaks:
+                    end = window_start + breaks[-1]
+                    break
+        if text[start:end].strip():
+            spans.append((start, end))
+        start = end
+    return spans
+
+class ChunkIndex:
+    __slots__ = ('spans', 'term_freqs', 'lengths', 'doc_freqs')
+
+    def __init__(self, spans: List[Tuple[int, int]], term_freqs: List[Dict[str, int]]):
+        self.spans = spans
+        self.term_freqs = term_freqs
+        self.lengths = [sum(freqs.values()) for freqs in term_freqs]
+        doc_freqs = Counter()
+        for freqs in term_freqs:
+            doc_freqs.update(freqs.keys())
+        self.doc_freqs = doc_freqs
+
+    @classmethod
+    def build(cls, text: str) -> "ChunkIndex":
+        spans = chunk_spans(text)
+        return cls(spans, [dict(Counter(tokenize(text[start:end]))) for start, end in spans])
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(json.dumps({'spans': self.spans, 'tf': self.term_freqs}).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChunkIndex":
+        payload = json.loads(zlib.decompress(data).decode('utf-8'))
+        return cls([tuple(span) for span in payload['spans']], payload['tf'])
+
+def _bm25_scores(query_terms: Sequence[str], indexes: Sequence[ChunkIndex]) -> List[Tuple[float, int, int]]:
+    # Statistik korpus dihitung atas gabungan semua file sesi, jadi skor antar file sebanding.
+    total_chunks = sum(len(index.spans) for index in indexes)
+    if not total_chunks or not query_terms:
+        return []
+    average_length = sum(sum(index.lengths) for index in indexes) / total_chunks or 1.0
+    idf = {}
+    for term in set(query_terms):
+        df = sum(index.doc_freqs.get(term, 0) for index in indexes)
+        if df:
+            idf[term] = math.log(1 + (total_chunks - df + 0.5) / (df + 0.5))
+
+    scores = []
+    for file_position, index in enumerate(indexes):
+        for chunk_position, freqs in enumerate(index.term_freqs):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * index.lengths[chunk_position] / average_length)
+            for term, weight in idf.items():
+                tf = freqs.get(term)
+                if tf:
+                    score += weight * tf * (BM25_K1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((score, file_position, chunk_position))
+    scores.sort(key=lambda item: item[0], reverse=True)
+    return scores
+
+def select_chunks(
+    query: Optional[str],
+    documents: Sequence[Tuple[str, ChunkIndex]],
+    token_budget: int,
+    top_k: int = RETRIEVAL_TOP_K
+) -> List[Tuple[int, int, str]]:
+    # documents: (konten, indeks) per file sesi. Mengembalikan (posisi file, posisi potongan,
+    # teks) urut sesuai dokumen, dibatasi top_k dan anggaran token.
+    indexes = [index for _, index in documents]
+    ranked = [(file_pos, chunk_pos) for _, file_pos, chunk_pos in _bm25_scores(tokenize(query or ""), indexes)]
+    if not ranked:
+        # Tidak ada istilah yang cocok (mis. "ringkas dokumen ini"): awal setiap file, bergiliran.
+        longest = max((len(index.spans) for index in indexes), default=0)
+        ranked = [
+            (file_pos, chunk_pos)
+            for chunk_pos in range(longest)
+            for file_pos, index in enumerate(indexes)
+            if chunk_pos < len(index.spans)
+        ]
+
+    selected = []
+    used = 0
+    for file_pos, chunk_pos in ranked:
+        if len(selected) >= top_k:
+            break
+        content, index = documents[file_pos]
+        start, end = index.spans[chunk_pos]
+        chunk = content[start:end].strip()
+        cost = estimate_tokens(chunk)
+        if used + cost > token_budget:
+            continue
+        selected.append((file_pos, chunk_pos, chunk))
+        used += cost
+    selected.sort(key=lambda item: (item[0], item[1]))
+    return selected
@@ -1,40 +1,180 @@
+import json
+import time
 import logging
 import asyncio
+from collections import OrderedDict
 from ddgs import DDGS
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from . import config
+from .db_pool import ConnectionPool
 
 
 logging.basicConfig(
-    level=logging.INFO, 
+    level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(module)s - %(message)s'
 )
 
-def _perform_search_sync(query: str, max_results: int) -> list:
+DEFAULT_SEARCH_REGION = 'id-id'
+SEARCH_CACHE_SCHEMA_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS search_cache (
+        cache_key TEXT PRIMARY KEY,
+        results_json TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_search_cache_expires_at ON search_cache (expires_at)",
+)
+SEARCH_CACHE_SWEEP_EVERY_WRITES = 100
+SEARCH_CACHE_EXPIRE_SQL = "DELETE FROM search_cache WHERE expires_at <= ?"
+SEARCH_CACHE_EVICT_SQL = """
+    DELETE FROM search_cache WHERE cache_key IN (
+        SELECT cache_key FROM search_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+    )
+"""
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+class SearchCache:
+    def __init__(self, ttl: float, max_entries: int, max_rows: int):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.max_rows = max(1, max_rows)
+        self.pool: Optional[ConnectionPool] = None
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(query: str, region: str, max_results: int) -> str:
+        return f"{region}|{max_results}|{normalize_query(query)}"
+
+    async def attach(self, pool: ConnectionPool):
+        # Tier kedua di SQLite agar hasil pencarian tetap ada setelah bot dimulai ulang.
+        async with pool.transaction() as conn:
+            for statement in SEARCH_CACHE_SCHEMA_SQL:
+                await conn.execute(statement)
+            await conn.execute(SEARCH_CACHE_EXPIRE_SQL, (time.time(),))
+        self.pool = pool
+
+    async def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, results = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return results
+            del self._entries[key]
+
+        if self.pool is not None:
+            try:
+                async with self.pool.acquire() as conn:
+                    async with conn.execute(
+                        "SELECT results_json, expires_at FROM search_cache WHERE cache_key = ? AND expires_at > ?",
+                        (key, now)
+                    ) as cursor:
+                        row = await cursor.fetchone()
+            except Exception as e:
+                logging.warning(f"Gagal membaca cache pencarian dari database: {e}")
+                row = None
+            if row:
+                results = json.loads(row[0])
+                self._remember(key, row[1], results)
+                self.store_hits += 1
+                return results
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, results: List[Dict[str, Any]]):
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, results)
+        if self.pool is None:
+            return
+        try:
+            async with self.pool.transaction() as conn:
+                await conn.execute(
+                    "INSERT OR REPLACE INTO search_cache (cache_key, results_json, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(results), expires_at)
+                )
+                # Baris kedaluwarsa dibersihkan dan jumlah baris dibatasi setiap SEARCH_CACHE_SWEEP_EVERY_WRITES
+                # penulisan, agar tabel tidak tumbuh tanpa batas tanpa membebani setiap penulisan.
+                self._writes += 1
+                if self._writes % SEARCH_CACHE_SWEEP_EVERY_WRITES == 0:
+                    await conn.execute(SEARCH_CACHE_EXPIRE_SQL, (time.time(),))
+                    await conn.execute(SEARCH_CACHE_EVICT_SQL, (self.max_rows,))
+        except Exception as e:
+            logging.warning(f"Gagal menyimpan cache pencarian ke database: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'store_hits': self.store_hits,
+            'misses': self.misses,
+        }
+
+    def _remember(self, key: str, expires_at: float, results: List[Dict[str, Any]]):
+        self._entries[key] = (expires_at, results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+search_cache = SearchCache(config.SEARCH_CACHE_TTL, config.SEARCH_CACHE_MAX_ENTRIES, config.SEARCH_CACHE_MAX_ROWS)
+_inflight_searches: Dict[str, asyncio.Task] = {}
+
+def _perform_search_sync(query: str, region: str, max_results: int) -> list:
     with DDGS() as ddgs:
-        return list(ddgs.text(query, region='id-id', max_results=max_results))
-    
-async def search_web(query: str, max_results: int = 10) -> List[Dict[str, Any]]:
+        return list(ddgs.text(query, region=region, max_results=max_results))
+
+async def _fetch_search_results(query: str, region: str, max_results: int) -> List[Dict[str, Any]]:
     search_results: List[Dict[str, Any]] = []
     processed_urls = set()
-    
+
+    logging.info(f"Melakukan pencarian web untuk: '{query}'")
+    results_list = await asyncio.to_thread(_perform_search_sync, query, region, max_results)
+
+    for res in results_list:
+        url = res.get('href')
+        if url and url not in processed_urls:
+            search_results.append({
+                'title': res.get('title', 'Tanpa Judul'),
+                'body': res.get('body', 'Tidak ada ringkasan.'),
+                'url': url
+            })
+            processed_urls.add(url)
+    return search_results
+
+async def search_web(query: str, max_results: int = 10, region: str = DEFAULT_SEARCH_REGION) -> List[Dict[str, Any]]:
+    key = SearchCache.make_key(query, region, max_results)
+    cached = await search_cache.get(key)
+    if cached is not None:
+        logging.info(f"Hasil pencarian untuk '{query}' diambil dari cache.")
+        return list(cached)
+
+    # Kueri identik yang sedang berjalan (mis. topik yang sedang ramai) cukup dicari sekali.
+    # Pencarian berjalan di task sendiri dan setiap pemanggil menunggu lewat shield, jadi
+    # timeout satu pemanggil tidak membatalkan pencarian untuk pemanggil lain.
+    task = _inflight_searches.get(key)
+    if task is None:
+        task = asyncio.create_task(_search_and_cache(key, query, region, max_results))
+        _inflight_searches[key] = task
+        task.add_done_callback(lambda _: _inflight_searches.pop(key, None))
+    return list(await asyncio.shield(task))
+
+async def _search_and_cache(key: str, query: str, region: str, max_results: int) -> List[Dict[str, Any]]:
     try:
-        logging.info(f"Melakukan pencarian web untuk: '{query}'")
-        results_list = await asyncio.to_thread(_perform_search_sync, query, max_results)
-
-        for res in results_list:
-            url = res.get('href')
-            if url and url not in processed_urls:
-                search_results.append({
-                    'title': res.get('title', 'Tanpa Judul'),
-                    'body': res.get('body', 'Tidak ada ringkasan.'),
-                    'url': url
-                })
-                processed_urls.add(url)
-
-        if not search_results:
-            logging.warning(f"Tidak ada hasil pencarian yang ditemukan untuk kueri: '{query}'")
-        return search_results
-    
+        search_results = await _fetch_search_results(query, region, max_results)
     except Exception as e:
         logging.error(f"Error saat melakukan pencarian web dengan DDGS: {e}", exc_info=True)
-        return []
\ No newline at end of file
+        return []
+    if search_results:
+        await search_cache.put(key, search_results)
+    else:
+        logging.warning(f"Tidak ada hasil pencarian yang ditemukan untuk kueri: '{query}'")
+    return search_results
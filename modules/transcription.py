@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import subprocess
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional
+from .parsers import init_worker
+from .parser_pool import ParserPool
+
+
+TRANSCRIPTION_WORKERS = 1
+TRANSCRIPTION_QUEUE_SIZE = 20
+TRANSCRIPTION_JOB_TIMEOUT = 120
+WHISPER_MODEL_NAME = "tiny"
+WHISPER_SAMPLE_RATE = 16000
+
+# Model Whisper milik proses worker ini; dimuat sekali oleh initializer.
+_worker_model = None
+
+class TranscriptionBusyError(Exception):
+    pass
+
+class TranscriptionError(Exception):
+    pass
+
+def _init_transcription_worker(model_name: str):
+    global _worker_model
+    init_worker(None)
+    import whisper
+    _worker_model = whisper.load_model(model_name)
+    logging.info(f"Worker transkripsi memuat model Whisper '{model_name}'.")
+
+def _decode_audio(audio_bytes: bytes):
+    # Audio didekode langsung dari memori lewat pipe ffmpeg, tanpa file sementara.
+    import numpy as np
+    process = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+            "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(WHISPER_SAMPLE_RATE), "pipe:1"
+        ],
+        input=audio_bytes,
+        capture_output=True,
+        check=True
+    )
+    return np.frombuffer(process.stdout, np.int16).flatten().astype(np.float32) / 32768.0
+
+def transcribe_audio(audio_bytes: bytes, language: str = 'id') -> str:
+    audio = _decode_audio(audio_bytes)
+    result = _worker_model.transcribe(audio, language=language, fp16=False)
+    return result['text'].strip()
+
+class _Job:
+    __slots__ = ('audio_bytes', 'language', 'future', 'on_position')
+
+    def __init__(self, audio_bytes: bytes, language: str, on_position):
+        self.audio_bytes = audio_bytes
+        self.language = language
+        self.future = asyncio.get_running_loop().create_future()
+        self.on_position = on_position
+
+class TranscriptionService:
+    def __init__(
+        self,
+        model_name: str = WHISPER_MODEL_NAME,
+        workers: int = TRANSCRIPTION_WORKERS,
+        queue_size: int = TRANSCRIPTION_QUEUE_SIZE,
+        job_timeout: float = TRANSCRIPTION_JOB_TIMEOUT
+    ):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.job_timeout = job_timeout
+        self.available = False
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        # Setiap proses worker memegang modelnya sendiri, jadi transkripsi tidak memakai
+        # thread pool default yang juga dipakai DDGS dan parser.
+        self.pool = ParserPool(
+            workers=self.workers,
+            job_timeout=job_timeout,
+            memory_limit_bytes=None,
+            initializer=_init_transcription_worker,
+            initargs=(model_name,),
+            name="transkripsi"
+        )
+        self._pending: Deque[_Job] = deque()
+        self._wakeup = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._dispatchers = []
+        self._busy = 0
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        try:
+            # Pemanasan pool menjalankan initializer di setiap worker, jadi model dimuat sekarang.
+            await self.pool.start()
+            self.available = True
+        except Exception as e:
+            logging.error(f"Gagal memuat model Whisper. Fitur pesan suara tidak akan berfungsi. Error: {e}")
+            self.available = False
+            await self.pool.close()
+            return
+        finally:
+            self._ready.set()
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        logging.info(f"Layanan transkripsi siap: {self.workers} worker, antrean maks {self.queue_size}.")
+
+    async def close(self):
+        self._ready.set()
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        while self._pending:
+            job = self._pending.popleft()
+            if not job.future.done():
+                job.future.set_exception(TranscriptionError("Layanan transkripsi dihentikan."))
+        await self.pool.close()
+
+    async def transcribe(
+        self,
+        audio_bytes: bytes,
+        language: str = 'id',
+        on_position: Optional[Callable[[int], Awaitable]] = None
+    ) -> str:
+        if not self._ready.is_set():
+            # Model masih dimuat di latar belakang setelah bot mulai polling.
+            await self._ready.wait()
+        if not self.available:
+            raise TranscriptionError("Model Whisper tidak tersedia.")
+        if len(self._pending) >= self.queue_size:
+            self.rejected += 1
+            raise TranscriptionBusyError(f"Antrean transkripsi penuh ({self.queue_size}).")
+
+        job = _Job(audio_bytes, language, on_position)
+        self._pending.append(job)
+        self._wakeup.set()
+        if self._busy >= self.workers:
+            await self._notify_position(job, len(self._pending))
+        try:
+            return await job.future
+        finally:
+            if job in self._pending:
+                self._pending.remove(job)
+
+    async def _notify_position(self, job: _Job, position: int):
+        # Posisi hanya dilaporkan saat semua worker sibuk, yaitu ketika pesan benar-benar menunggu.
+        if job.on_position is None or position <= 0:
+            return
+        try:
+            await job.on_position(position)
+        except Exception as e:
+            logging.warning(f"Gagal mengirim posisi antrean transkripsi: {e}")
+
+    async def _dispatch(self):
+        while True:
+            while not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            job = self._pending.popleft()
+            for position, waiting in enumerate(self._pending, start=1):
+                asyncio.create_task(self._notify_position(waiting, position))
+            if job.future.done():
+                continue
+
+            self._busy += 1
+            try:
+                text = await self.pool.run(transcribe_audio, job.audio_bytes, job.language)
+                self.completed += 1
+                if not job.future.done():
+                    job.future.set_result(text)
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Transkripsi gagal: {e}")
+                if not job.future.done():
+                    job.future.set_exception(TranscriptionError(str(e)))
+            finally:
+                self._busy -= 1
+
+    def stats(self) -> dict:
+        return {
+            'queue': len(self._pending),
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'timeouts': self.pool.timeouts,
+        }
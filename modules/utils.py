@@ -2,7 +2,8 @@ import asyncio
 import logging
 import google.generativeai as genai
 from . import config
-from .bot_setup import bot
+from .bot_setup import bot, outbound
+from .gemini_pool import gemini_pool
 from telebot.asyncio_helper import ApiTelegramException
 from telebot.types import Message
 
@@ -11,45 +12,52 @@ async def send_or_edit_message(
     chat_id: int, 
     text: str, 
     placeholder_message: Message = None, 
+    wait: bool = True,
     **kwargs
 ) -> Message:
-    
+    # Semua pengiriman/edit lewat scheduler keluar. wait=False hanya menjadwalkan edit
+    # (dipakai saat streaming), sehingga edit yang menumpuk digabung menjadi teks terakhir.
+    if placeholder_message:
+        future = outbound.edit(chat_id, placeholder_message.message_id, text, **kwargs)
+    else:
+        future = outbound.call(chat_id, bot.send_message, chat_id, text, **kwargs)
+
+    if not wait:
+        future.add_done_callback(_log_outbound_error)
+        return placeholder_message
+
     try:
-        if placeholder_message:
-            return await bot.edit_message_text(
-                text, 
-                chat_id, 
-                placeholder_message.message_id, 
-                **kwargs
-            )
-        else:
-            return await bot.send_message(chat_id, text, **kwargs)
+        result = await asyncio.shield(future)
+        return result if isinstance(result, Message) else placeholder_message
         
     except ApiTelegramException as e:
-        if "message is not modified" not in str(e):
-            logging.warning(f"Gagal mengirim/mengedit pesan: {e}")
+        logging.warning(f"Gagal mengirim/mengedit pesan: {e}")
         return placeholder_message
+
+async def outbound_call(chat_id: int, func, *args, **kwargs):
+    return await asyncio.shield(outbound.call(chat_id, func, *args, **kwargs))
+
+def _log_outbound_error(future: asyncio.Future):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logging.warning(f"Gagal mengirim/mengedit pesan: {error}")
     
 async def get_gemini_model():
-    initial_key_index = config.current_api_key_index
-    
-    while True:
-        try:
-            api_key = config.get_gemini_api_key()
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel(config.GEMINI_MODEL)
-            return model
-        
-        except Exception as e:
-            if "API key" in str(e) or "Resource has been exhausted" in str(e) or "quota" in str(e).lower():
-                logging.warning(f"API Key error: {e}")
-                if config.rotate_gemini_api_key() == initial_key_index:
-                    logging.error("Semua kunci API Gemini telah gagal.")
-                    return None
-            else:
-                logging.error(f"Error tak terduga saat inisialisasi model Gemini: {e}", exc_info=True)
-                return None
-            
+    # Model proxy bersama: pemilihan kunci, pembatasan laju, dan failover terjadi per panggilan.
+    return gemini_pool.model
+
+# Dipakai bersama oleh jawaban teks dan analisis gambar.
+RESPONSE_GENERATION_CONFIG = genai.GenerationConfig(max_output_tokens=config.RESPONSE_MAX_OUTPUT_TOKENS)
+TRUNCATED_RESPONSE_NOTE = "\n\n_(Jawaban terpotong karena terlalu panjang. Minta saya melanjutkan jika perlu.)_"
+
+def is_max_tokens_stop(response) -> bool:
+    try:
+        return getattr(response.candidates[0].finish_reason, 'name', None) == "MAX_TOKENS"
+    except (AttributeError, IndexError, TypeError):
+        return False
+
 async def safe_get_response_text(response):
 
     try:
@@ -1,34 +1,26 @@
-import os
-import asyncio
-import aiofiles
 import logging
-from .bot_setup import bot, whisper_model
+from typing import Awaitable, Callable, Optional
+from .bot_setup import bot, transcription_service
+from .transcription import TranscriptionBusyError, TranscriptionError
 
 
-async def process_voice_message(message):
-    if whisper_model is None:
+async def process_voice_message(message, on_queued: Optional[Callable[[int], Awaitable]] = None):
+    if transcription_service is None:
         logging.error("Model Whisper tidak tersedia, transkripsi dibatalkan.")
-        return "Maaf, fitur pesan suara sedang tidak dapat digunakan saat ini."
-    voice_ogg_path = f"voice_{message.from_user.id}_{message.message_id}.ogg"
+        return None
     
     try:
         file_info = await bot.get_file(message.voice.file_id)
         downloaded_file = await bot.download_file(file_info.file_path)
-        
-        async with aiofiles.open(voice_ogg_path, 'wb') as new_file:
-            await new_file.write(downloaded_file)
-        
-        def transcribe_sync():
-            return whisper_model.transcribe(voice_ogg_path, language='id', fp16=False)
-        
-        result = await asyncio.to_thread(transcribe_sync)
-        transcribed_text = result['text']
-        return transcribed_text
+        return await transcription_service.transcribe(downloaded_file, language='id', on_position=on_queued)
     
+    except TranscriptionBusyError:
+        raise
+
+    except TranscriptionError as e:
+        logging.error(f"Error saat memproses pesan suara: {e}")
+        return None
+
     except Exception as e:
         logging.error(f"Error saat memproses pesan suara: {e}", exc_info=True)
         return None
-    
-    finally:
-        if os.path.exists(voice_ogg_path):
-            os.remove(voice_ogg_path)
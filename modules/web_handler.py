@@ -1,9 +1,15 @@
+import time
+import zlib
 import logging
 import asyncio
-from newspaper import Article, Config
 import aiohttp
-from bs4 import BeautifulSoup
-from typing import Tuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from typing import Dict, List, Tuple, Optional
+from . import config
+from .db_pool import ConnectionPool
+from .bot_setup import http_client, parser_pool
+from .parsers import extract_html
+from .parser_pool import ParserError
 
 
 logging.basicConfig(
@@ -11,71 +17,207 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(module)s - %(message)s'
 )
 
-def _extract_with_newspaper_sync(url: str) -> Tuple[Optional[str], Optional[str]]:
+URL_FETCH_TIMEOUT = 20
+URL_FETCH_CHUNK_SIZE = 64 * 1024
+TRACKING_QUERY_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'mc_cid', 'mc_eid', 'ref_src'}
+URL_CACHE_SCHEMA_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS url_cache (
+        url TEXT PRIMARY KEY,
+        title TEXT,
+        content BLOB NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        fetched_at REAL NOT NULL,
+        last_access REAL NOT NULL,
+        size INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_url_cache_last_access ON url_cache (last_access)",
+)
+URL_CACHE_EVICT_SQL = """
+    DELETE FROM url_cache WHERE url IN (
+        SELECT url FROM (
+            SELECT url, SUM(size) OVER (ORDER BY last_access DESC) AS running_size FROM url_cache
+        ) WHERE running_size > ?
+    )
+"""
+
+def canonicalize_url(url: str) -> str:
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        # Port atau host tidak valid (mis. "http://host:abc/"): URL mentah dipakai sebagai kunci cache.
+        return url.strip()
+    scheme = parts.scheme.lower() or 'http'
+    host = (parts.hostname or '').lower()
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_QUERY_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+class UrlCache:
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.pool: Optional[ConnectionPool] = None
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    async def attach(self, pool: ConnectionPool):
+        async with pool.transaction() as conn:
+            for statement in URL_CACHE_SCHEMA_SQL:
+                await conn.execute(statement)
+        self.pool = pool
+
+    async def get(self, url: str) -> Optional[Dict]:
+        if self.pool is None:
+            return None
+        async with self.pool.acquire() as conn:
+            async with conn.execute(
+                "SELECT title, content, etag, last_modified, fetched_at FROM url_cache WHERE url = ?", (url,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        if not row:
+            return None
+        return {
+            'title': row[0],
+            'content': zlib.decompress(row[1]).decode('utf-8'),
+            'etag': row[2],
+            'last_modified': row[3],
+            'fresh': time.time() - row[4] < self.ttl,
+        }
+
+    async def touch(self, url: str, revalidated: bool = False):
+        now = time.time()
+        async with self.pool.transaction() as conn:
+            if revalidated:
+                await conn.execute(
+                    "UPDATE url_cache SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url)
+                )
+            else:
+                await conn.execute("UPDATE url_cache SET last_access = ? WHERE url = ?", (now, url))
+
+    async def put(self, url: str, content: str, title: Optional[str], etag: Optional[str], last_modified: Optional[str]):
+        if self.pool is None:
+            return
+        now = time.time()
+        data = zlib.compress(content.encode('utf-8'))
+        async with self.pool.transaction() as conn:
+            await conn.execute(
+                "INSERT OR REPLACE INTO url_cache "
+                "(url, title, content, etag, last_modified, fetched_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, title, data, etag, last_modified, now, now, len(data))
+            )
+            await conn.execute(URL_CACHE_EVICT_SQL, (self.max_bytes,))
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses}
+
+url_cache = UrlCache(config.URL_CACHE_TTL, config.URL_CACHE_MAX_BYTES)
+
+def _validator_headers(response: aiohttp.ClientResponse) -> Tuple[Optional[str], Optional[str]]:
+    return response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+async def _fetch_page(url: str, cached: Optional[Dict] = None) -> Optional[Dict]:
+    # Satu-satunya unduhan per URL: HTML dibaca bertahap sampai batas ukuran, lalu
+    # byte yang sama dipakai oleh semua extractor.
+    headers = {}
+    if cached and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached and cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
 
     try:
-        config = Config()
-        config.browser_user_agent = (
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-            '(KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
-        )
-        config.request_timeout = 20
-        article = Article(url, config=config)
-        article.download()
-        article.parse()
-        title = article.title if article.title else "Tanpa Judul"
-        content = article.text
-        return content, title
-    
+        async with http_client.get(url, headers=headers, timeout=URL_FETCH_TIMEOUT) as response:
+            etag, last_modified = _validator_headers(response)
+            if response.status == 304:
+                return {'status': 304, 'raw': None, 'charsets': [], 'etag': etag, 'last_modified': last_modified}
+            response.raise_for_status()
+
+            chunks = []
+            size = 0
+            async for chunk in response.content.iter_chunked(URL_FETCH_CHUNK_SIZE):
+                remaining = config.URL_FETCH_MAX_BYTES - size
+                chunks.append(chunk[:remaining])
+                size += min(len(chunk), remaining)
+                if size >= config.URL_FETCH_MAX_BYTES:
+                    logging.warning(f"Halaman {url} melebihi {config.URL_FETCH_MAX_BYTES} byte, sisanya diabaikan.")
+                    break
+
+            # Byte mentah dan petunjuk charset diteruskan ke worker; decoding tidak dilakukan di sini.
+            charsets = [response.charset] if response.charset else []
+            return {
+                'status': response.status, 
+                'raw': b"".join(chunks), 
+                'charsets': charsets, 
+                'etag': etag, 
+                'last_modified': last_modified
+            }
+
     except Exception as e:
-        logging.error(f"[Newspaper3k] Gagal memproses URL {url}: {e}")
+        logging.error(f"Gagal mengunduh {url}: {e}")
+        return None
+
+async def _extract_from_html(url: str, raw: bytes, charsets: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        return await parser_pool.run(extract_html, url, raw, charsets)
+    except ParserError as e:
+        logging.error(f"Ekstraksi konten {url} gagal: {e}")
         return None, None
-    
-async def _extract_with_bs_async(url: str) -> Tuple[Optional[str], Optional[str]]:
-    logging.info(f"[BeautifulSoup] Mencoba mengambil konten dari URL: {url}")
-    
-    headers = {
-        'User-Agent': (
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-            '(KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
-        ),
-    }
-    
+
+async def _touch_cache(cache_key: str, revalidated: bool = False):
+    # Konten sudah di tangan; gagal mencatat akses (mis. database sibuk) tidak boleh menggagalkan permintaan.
     try:
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.get(url, timeout=20) as response:
-                response.raise_for_status()
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                for script_or_style in soup(['script', 'style', 'nav', 'footer', 'header']):
-                    script_or_style.decompose()
-                
-                title = soup.title.string if soup.title else "Tanpa Judul"
-                text = soup.body.get_text(separator=' ', strip=True)
-                return text, title
-            
+        await url_cache.touch(cache_key, revalidated)
     except Exception as e:
-        logging.error(f"[BeautifulSoup] Gagal mem-parsing konten dari {url}: {e}")
-        return None, None
-    
+        logging.warning(f"Gagal memperbarui cache URL: {e}")
+
 async def extract_content_from_url(url: str) -> Tuple[Optional[str], Optional[str]]:
     logging.info(f"Memulai proses ekstraksi kombinasi untuk URL: {url}")
-    
+    cache_key = canonicalize_url(url)
+
     try:
-        content_np, title_np = await asyncio.to_thread(_extract_with_newspaper_sync, url)
-        if content_np and len(content_np) > 150:
-            logging.info(f"Ekstraksi dengan Newspaper3k berhasil untuk {url}")
-            return content_np, title_np
-        logging.warning(f"Newspaper3k tidak mendapatkan konten yang cukup dari {url}. Menjalankan fallback.")
-    
+        cached = await url_cache.get(cache_key)
     except Exception as e:
-        logging.error(f"Error saat menjalankan thread Newspaper3k: {e}. Menjalankan fallback.")
-    
-    content_bs, title_bs = await _extract_with_bs_async(url)
+        logging.warning(f"Gagal membaca cache URL: {e}")
+        cached = None
 
-    if content_bs:
-        logging.info(f"Ekstraksi dengan BeautifulSoup (fallback) berhasil untuk {url}")
-    else:
+    if cached and cached['fresh']:
+        url_cache.hits += 1
+        await _touch_cache(cache_key)
+        logging.info(f"Konten {url} diambil dari cache.")
+        return cached['content'], cached['title']
+
+    # GET bersyarat: 304 berarti konten yang diekstrak sebelumnya masih berlaku.
+    page = await _fetch_page(url, cached)
+    if page is None:
+        if cached:
+            logging.warning(f"Memakai konten cache yang sudah kedaluwarsa untuk {url}.")
+            return cached['content'], cached['title']
+        return None, None
+
+    if page['status'] == 304 and cached:
+        url_cache.revalidated += 1
+        await _touch_cache(cache_key, revalidated=True)
+        logging.info(f"Konten {url} tidak berubah (304), memakai hasil ekstraksi dari cache.")
+        return cached['content'], cached['title']
+
+    url_cache.misses += 1
+    if not page['raw']:
         logging.warning(f"Semua metode ekstraksi gagal untuk {url}")
-    return content_bs, title_bs
\ No newline at end of file
+        return None, None
+    content, title = await _extract_from_html(url, page['raw'], page['charsets'])
+
+    if content:
+        try:
+            await url_cache.put(cache_key, content, title, page['etag'], page['last_modified'])
+        except Exception as e:
+            logging.warning(f"Gagal menyimpan cache URL: {e}")
+    return content, title
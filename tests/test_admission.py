@@ -0,0 +1,136 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Nilai dummy agar config dan bot_setup bisa diimpor tanpa file .env.
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:placeholder')
+os.environ.setdefault('GEMINI_API_KEYS', 'placeholder')
+
+from modules.handlers import AdmissionController, AdmissionRejected
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def _job(controller, user_id, name, order, release, positions=None):
+    async def on_queued(position):
+        if positions is not None:
+            positions[name] = position
+
+    async def run():
+        async with controller.slot(user_id, on_queued):
+            order.append(name)
+            await release.wait()
+    return asyncio.create_task(run())
+
+
+def test_requests_from_one_user_run_one_at_a_time_in_order():
+    async def main():
+        controller = AdmissionController(max_active=4, max_queued_per_user=5, max_queued=10)
+        order = []
+        releases = [asyncio.Event() for _ in range(3)]
+        tasks = [_job(controller, 1, f"pesan-{i}", order, releases[i]) for i in range(3)]
+        await _settle()
+        assert order == ["pesan-0"]
+        for i in range(3):
+            releases[i].set()
+            await _settle()
+            assert order == [f"pesan-{j}" for j in range(min(i + 2, 3))]
+        await asyncio.gather(*tasks)
+        assert controller.stats()['active'] == 0 and controller.waiting == 0
+
+    asyncio.run(main())
+
+
+def test_global_limit_and_round_robin_between_users():
+    async def main():
+        controller = AdmissionController(max_active=2, max_queued_per_user=5, max_queued=10)
+        order = []
+        release = asyncio.Event()
+        tasks = [
+            _job(controller, 1, "a1", order, release),
+            _job(controller, 2, "b1", order, release),
+            _job(controller, 1, "a2", order, release),
+            _job(controller, 1, "a3", order, release),
+            _job(controller, 3, "c1", order, release),
+        ]
+        await _settle()
+        assert order == ["a1", "b1"]
+        assert len(controller.active_users) == 2
+        release.set()
+        await asyncio.gather(*tasks)
+        # Pengguna 3 tidak menunggu semua pesan pengguna 1 selesai.
+        assert order.index("c1") < order.index("a3")
+
+    asyncio.run(main())
+
+
+def test_queue_position_is_per_ticket_not_global_count():
+    async def main():
+        controller = AdmissionController(max_active=1, max_queued_per_user=5, max_queued=10)
+        order, positions = [], {}
+        release = asyncio.Event()
+        tasks = [
+            _job(controller, 1, "a1", order, release, positions),
+            _job(controller, 2, "b1", order, release, positions),
+            _job(controller, 2, "b2", order, release, positions),
+            _job(controller, 3, "c1", order, release, positions),
+        ]
+        await _settle()
+        assert "a1" not in positions
+        assert positions == {"b1": 1, "b2": 2, "c1": 2}
+        release.set()
+        await asyncio.gather(*tasks)
+        assert order == ["a1", "b1", "c1", "b2"]
+
+    asyncio.run(main())
+
+
+def test_rejects_when_queues_are_full():
+    async def main():
+        controller = AdmissionController(max_active=1, max_queued_per_user=1, max_queued=2)
+        order = []
+        release = asyncio.Event()
+        tasks = [_job(controller, 1, "a1", order, release), _job(controller, 1, "a2", order, release)]
+        await _settle()
+        with pytest.raises(AdmissionRejected):
+            async with controller.slot(1):
+                pass
+        tasks.append(_job(controller, 2, "b1", order, release))
+        await _settle()
+        with pytest.raises(AdmissionRejected):
+            async with controller.slot(3):
+                pass
+        assert controller.stats()['shed'] == 2
+        release.set()
+        await asyncio.gather(*tasks)
+        assert sorted(order) == ["a1", "a2", "b1"]
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        controller = AdmissionController(max_active=1, max_queued_per_user=5, max_queued=10)
+        order = []
+        release = asyncio.Event()
+        first = _job(controller, 1, "a1", order, release)
+        cancelled = _job(controller, 2, "b1", order, release)
+        last = _job(controller, 3, "c1", order, release)
+        await _settle()
+        assert controller.waiting == 2
+        cancelled.cancel()
+        await _settle()
+        assert controller.waiting == 1
+        release.set()
+        await asyncio.gather(first, last)
+        assert cancelled.cancelled()
+        assert order == ["a1", "c1"]
+        assert controller.stats()['active'] == 0 and controller.waiting == 0
+
+    asyncio.run(main())
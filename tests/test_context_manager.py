@@ -0,0 +1,100 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Nilai dummy agar config bisa diimpor tanpa file .env.
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:placeholder')
+os.environ.setdefault('GEMINI_API_KEYS', 'placeholder')
+
+from modules.context_cache import ContextCache
+from modules.context_manager import ContextManager
+
+USER_ID = 42
+
+
+def _run(scenario):
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manager = ContextManager(
+                os.path.join(tmp_dir, "context.db"),
+                cache=ContextCache(64 * 1024 * 1024),
+                flush_interval=3600
+            )
+            await manager._init_db()
+            try:
+                return await scenario(manager)
+            finally:
+                await manager.close()
+    return asyncio.run(main())
+
+
+async def _cached_and_stored(manager):
+    cached = await manager.load(USER_ID)
+    await manager.flush()
+    stored = await manager._load_from_db(USER_ID)
+    return cached, stored
+
+
+def _messages(context):
+    return [(item['role'], item['parts']) for item in context.history[1:]]
+
+
+def test_overlapping_units_of_work_keep_both_changes():
+    async def scenario(manager):
+        await manager.add_file_to_session(USER_ID, "a.txt", "isi a")
+        await manager.flush()
+
+        # Giliran teks memuat konteks, lalu unggahan dokumen di-commit sebelum giliran selesai.
+        async with manager.unit_of_work(USER_ID) as turn:
+            await manager.add_file_to_session(USER_ID, "laporan.pdf", "isi laporan", {'pages': 3})
+            turn.append_turn("pertanyaan", "jawaban")
+
+        cached, stored = await _cached_and_stored(manager)
+        for context in (cached, stored):
+            assert sorted(context.session_files) == ["a.txt", "laporan.pdf"]
+            assert context.file_meta.get("laporan.pdf") == {'pages': 3}
+            assert _messages(context)[-2:] == [('user', ["pertanyaan"]), ('model', ["jawaban"])]
+        assert _messages(cached) == _messages(stored)
+        contents = await cached.blob_store.get_many(cached.session_files.values(), cached.staged_blobs)
+        assert sorted(contents.values()) == ["isi a", "isi laporan"]
+
+    _run(scenario)
+
+
+def test_end_session_during_turn_is_not_undone():
+    async def scenario(manager):
+        await manager.add_file_to_session(USER_ID, "a.txt", "isi a")
+
+        async with manager.unit_of_work(USER_ID) as turn:
+            assert await manager.end_session(USER_ID) == "Sesi Otomatis"
+            turn.append_turn("pertanyaan", "jawaban")
+
+        cached, stored = await _cached_and_stored(manager)
+        for context in (cached, stored):
+            assert context.session_files == {}
+            assert context.active_session_name is None
+        assert _messages(cached) == _messages(stored)
+
+    _run(scenario)
+
+
+def test_reset_during_turn_keeps_cache_and_database_in_sync():
+    async def scenario(manager):
+        async with manager.unit_of_work(USER_ID) as context:
+            context.append_turn("lama", "jawaban lama")
+        await manager.add_file_to_session(USER_ID, "a.txt", "isi a")
+
+        async with manager.unit_of_work(USER_ID) as turn:
+            assert await manager.reset_context(USER_ID)
+            turn.append_turn("baru", "jawaban baru")
+
+        cached, stored = await _cached_and_stored(manager)
+        for context in (cached, stored):
+            assert context.session_files == {}
+            assert ('user', ["lama"]) not in _messages(context)
+            assert _messages(context)[-2:] == [('user', ["baru"]), ('model', ["jawaban baru"])]
+        assert _messages(cached) == _messages(stored)
+
+    _run(scenario)
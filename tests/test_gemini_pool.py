@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Nilai dummy agar config bisa diimpor tanpa file .env.
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:placeholder')
+os.environ.setdefault('GEMINI_API_KEYS', 'placeholder')
+
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+from modules.gemini_pool import GeminiKeyPool, GeminiBusyError, CONTINUE_PROMPT, GEMINI_TRANSIENT_COOLDOWN
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    # Pengganti GenerativeModel per kunci: mencatat permintaan dan gagal sesuai skenario.
+    def __init__(self, error=None, chunks=("jawaban",), fail_after=None):
+        self.error = error
+        self.chunks = chunks
+        self.fail_after = fail_after
+        self.requests = []
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        self.requests.append((contents, kwargs))
+        if self.error is not None and self.fail_after is None:
+            raise self.error
+        if not stream:
+            return "".join(self.chunks)
+
+        async def chunks():
+            for index, text in enumerate(self.chunks):
+                if self.fail_after is not None and index == self.fail_after:
+                    raise self.error
+                yield Chunk(text)
+        return chunks()
+
+
+def _pool(*models, max_wait=0.2):
+    pool = GeminiKeyPool([f"kunci-{index}abcd" for index in range(len(models))], "model", rpm=10, cooldown=60, max_wait=max_wait)
+    for api_key, model in zip(pool.keys, models):
+        api_key.model = model
+    return pool
+
+
+def test_quota_error_fails_over_and_cools_down_the_key():
+    throttled = FakeModel(error=api_exceptions.ResourceExhausted("Resource has been exhausted, retry in 30s"))
+    healthy = FakeModel()
+    pool = _pool(throttled, healthy)
+
+    async def main():
+        assert await pool.generate("halo") == "jawaban"
+        assert await pool.generate("halo lagi") == "jawaban"
+
+    asyncio.run(main())
+    first, second = pool.keys
+    assert len(throttled.requests) == 1 and len(healthy.requests) == 2
+    assert first.throttled == 1 and first.failovers == 1
+    assert 25 < first.cooldown_until - time.monotonic() <= 30
+    assert first.in_flight == 0 and second.in_flight == 0
+
+
+def test_errors_unrelated_to_the_key_are_not_retried():
+    broken = FakeModel(error=ValueError("permintaan tidak valid"))
+    healthy = FakeModel()
+    pool = _pool(broken, healthy)
+    pool.keys[1].sent_at.extend([time.monotonic()] * 5)
+
+    with pytest.raises(ValueError):
+        asyncio.run(pool.generate("halo"))
+    assert healthy.requests == []
+    assert pool.keys[0].cooldown_until == 0.0
+
+
+def test_busy_error_when_every_key_is_cooling_down():
+    pool = _pool(FakeModel(), FakeModel(), max_wait=0.1)
+    for api_key in pool.keys:
+        api_key.cooldown_until = time.monotonic() + 60
+
+    with pytest.raises(GeminiBusyError):
+        asyncio.run(pool.generate("halo"))
+    assert pool.rejected == 1
+
+
+def test_stream_resumes_on_another_key_with_reduced_output_budget():
+    sent_before_failure = "a" * 4000
+    dropped = FakeModel(
+        error=api_exceptions.ServiceUnavailable("koneksi terputus"),
+        chunks=(sent_before_failure, "tidak pernah terkirim"),
+        fail_after=1
+    )
+    resumed = FakeModel(chunks=(" lanjutan",))
+    pool = _pool(dropped, resumed)
+    config = genai.GenerationConfig(max_output_tokens=8192)
+
+    async def main():
+        stream = await pool.model.generate_content_async("pertanyaan", stream=True, generation_config=config)
+        return [chunk.text async for chunk in stream]
+
+    assert asyncio.run(main()) == [sent_before_failure, " lanjutan"]
+    assert dropped.requests[0][1]['generation_config'].max_output_tokens == 8192
+    contents, kwargs = resumed.requests[0]
+    assert contents[-2:] == [
+        {'role': 'model', 'parts': [sent_before_failure]},
+        {'role': 'user', 'parts': [CONTINUE_PROMPT]},
+    ]
+    assert kwargs['generation_config'].max_output_tokens < 8192
+    assert config.max_output_tokens == 8192
+    assert pool.keys[0].stream_restarts == 1
+    assert pool.keys[0].cooldown_until - time.monotonic() <= GEMINI_TRANSIENT_COOLDOWN
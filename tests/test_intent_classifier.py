@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.intent_classifier import (
+    IntentClassifier, CASUAL_CONVERSATION, CODE_GENERATION, CONTEXT_SPECIFIC_QUESTION,
+    IMAGE_GENERATION, NEEDS_RESEARCH, ANSWER_IN_HISTORY
+)
+
+# File sesi yang otomatis ditambahkan setelah satu kali riset web.
+WEB_SESSION_FILES = ("Konteks Web: 'harga emas hari ini'...",)
+REPORT_SESSION_FILES = ("laporan_keuangan.pdf",)
+
+classifier = IntentClassifier()
+
+
+@pytest.mark.parametrize("text", [
+    "apa itu fotosintesis",
+    "jelaskan teori relativitas einstein",
+    "siapa penemu bola lampu",
+    "bagaimana cara kerja mesin diesel",
+])
+def test_general_questions_are_not_routed_to_session_files(text):
+    assert classifier.classify(text, WEB_SESSION_FILES) != CONTEXT_SPECIFIC_QUESTION
+    assert classifier.classify(text, REPORT_SESSION_FILES) != CONTEXT_SPECIFIC_QUESTION
+
+
+@pytest.mark.parametrize("text, session_files, expected", [
+    ("ringkas file tersebut", REPORT_SESSION_FILES, CONTEXT_SPECIFIC_QUESTION),
+    ("apa isi dokumen ini", REPORT_SESSION_FILES, CONTEXT_SPECIFIC_QUESTION),
+    ("apa kata laporan_keuangan tentang laba", REPORT_SESSION_FILES, CONTEXT_SPECIFIC_QUESTION),
+    ("jelaskan lagi yang tadi", WEB_SESSION_FILES, ANSWER_IN_HISTORY),
+    ("halo", WEB_SESSION_FILES, CASUAL_CONVERSATION),
+    ("buatkan kode python untuk membaca csv", WEB_SESSION_FILES, CODE_GENERATION),
+    ("buatkan gambar kucing", WEB_SESSION_FILES, IMAGE_GENERATION),
+    ("berita terbaru hari ini", WEB_SESSION_FILES, NEEDS_RESEARCH),
+])
+def test_classification_with_session_files(text, session_files, expected):
+    assert classifier.classify(text, session_files) == expected
+
+
+@pytest.mark.parametrize("text", ["apa isi dokumen ini", "rangkum isi file"])
+def test_context_questions_need_session_files(text):
+    assert classifier.classify(text, ()) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("buatkan saya program diet", None),
+    ("buatkan gambar kode QR", IMAGE_GENERATION),
+    ("ya", None),
+    ("oke siap", None),
+])
+def test_non_code_requests_and_acknowledgements(text, expected):
+    assert classifier.classify_by_rules(text, ()) == expected
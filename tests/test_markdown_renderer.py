@@ -0,0 +1,72 @@
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.markdown_renderer import StreamingMarkdownRenderer
+
+PAGE_LIMIT = 4096
+TAG_REGEX = re.compile(r'<(/?)(\w+)[^>]*>')
+CODE_LINE = "x = 1  # baris kode\n"
+
+
+def _is_balanced(html):
+    stack = []
+    for match in TAG_REGEX.finditer(html):
+        if match.group(1):
+            if not stack or stack.pop() != match.group(2):
+                return False
+        else:
+            stack.append(match.group(2))
+    return not stack
+
+
+def _renderer_with_break_inside_code(lines, padding):
+    # Halaman penuh di dalam blok kode, dipicu oleh pagar penutup yang baru datang sebagian.
+    renderer = StreamingMarkdownRenderer(page_limit=PAGE_LIMIT)
+    renderer.feed("```python\n")
+    for _ in range(lines - 1):
+        renderer.feed(CODE_LINE)
+    renderer.feed("#" * padding + CODE_LINE)
+    renderer.render()
+    if renderer.take_pages():
+        return None, None
+    renderer.feed("`")
+    renderer.render()
+    pages = renderer.take_pages()
+    renderer.feed("``\n")
+    return renderer, pages
+
+
+def test_page_break_inside_code_block_does_not_repeat_code():
+    checked = 0
+    for lines in range(190, 205):
+        for padding in range(20):
+            renderer, pages = _renderer_with_break_inside_code(lines, padding)
+            if pages:
+                break
+        else:
+            continue
+        renderer.feed("Kesimpulan")
+        live = renderer.render()
+        assert live == "Kesimpulan"
+        assert pages[0].count("x = 1") + live.count("x = 1") == lines
+        checked += 1
+    assert checked
+
+
+def test_pages_stay_balanced_and_within_limit():
+    text = ("```python\n" + CODE_LINE * 400 + "```\n" + "*tebal* dan `kode` & <teks>\n" * 300) * 2
+    renderer = StreamingMarkdownRenderer(page_limit=PAGE_LIMIT)
+    pages = []
+    for start in range(0, len(text), 7):
+        renderer.feed(text[start:start + 7])
+        live = renderer.render()
+        assert _is_balanced(live) and len(live) + 1 <= PAGE_LIMIT
+        pages.extend(renderer.take_pages())
+    pages.extend(renderer.finish())
+    assert len(pages) > 1
+    for page in pages:
+        assert _is_balanced(page) and len(page) <= PAGE_LIMIT
+    assert sum(page.count("x = 1") for page in pages) == 800
@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot.asyncio_helper import ApiTelegramException
+from modules.outbound import OutboundScheduler, TokenBucket
+
+CHAT_ID = 1001
+
+
+class FakeBot:
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = list(failures or [])
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append((time.monotonic(), 'send', text))
+        if self.failures:
+            raise self.failures.pop(0)
+        return text
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        self.calls.append((time.monotonic(), 'edit', text))
+        return text
+
+
+def _run_with_scheduler(bot, scenario, **kwargs):
+    async def main():
+        scheduler = OutboundScheduler(bot, **kwargs)
+        scheduler.start()
+        try:
+            return await scenario(scheduler)
+        finally:
+            await scheduler.close()
+    return asyncio.run(main())
+
+
+def test_token_bucket_allows_burst_then_paces():
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    now = bucket.updated_at
+    for _ in range(3):
+        assert bucket.delay(now) == 0.0
+        bucket.take(now)
+    assert bucket.delay(now) == 0.5
+    assert bucket.delay(now + 0.25) == 0.25
+    assert bucket.delay(now + 0.5) == 0.0
+    assert not bucket.is_full(now + 0.5)
+    assert bucket.is_full(now + 10)
+
+
+def test_messages_to_one_chat_are_paced_after_the_burst():
+    bot = FakeBot()
+
+    async def scenario(scheduler):
+        started_at = time.monotonic()
+        results = await asyncio.gather(*(scheduler.call(CHAT_ID, bot.send_message, CHAT_ID, str(i)) for i in range(6)))
+        assert results == [str(i) for i in range(6)]
+        return started_at
+
+    started_at = _run_with_scheduler(bot, scenario, chat_rate=20.0, chat_burst=2)
+    sent_at = [sent - started_at for sent, _, _ in bot.calls]
+    assert [text for _, _, text in bot.calls] == [str(i) for i in range(6)]
+    # Dua pesan pertama memakai burst; empat sisanya dibatasi 20 pesan/detik.
+    assert sent_at[1] < 0.04
+    assert sent_at[5] >= 4 / 20 - 0.02
+    for earlier, later in zip(sent_at[2:], sent_at[3:]):
+        assert later - earlier >= 1 / 20 - 0.02
+
+
+def test_pending_edits_are_coalesced_to_the_last_text():
+    bot = FakeBot()
+
+    async def scenario(scheduler):
+        first = scheduler.edit(CHAT_ID, 7, "1")
+        await first
+        # Bucket chat kosong: edit berikutnya menunggu dan saling menggantikan.
+        futures = [scheduler.edit(CHAT_ID, 7, text) for text in ("2", "3", "4")]
+        results = await asyncio.gather(*futures)
+        return results, scheduler.stats()
+
+    results, stats = _run_with_scheduler(bot, scenario, chat_rate=10.0, chat_burst=1)
+    assert [text for _, kind, text in bot.calls if kind == 'edit'] == ["1", "4"]
+    assert results == ["4", "4", "4"]
+    assert stats['coalesced'] == 2
+
+
+def test_retry_after_holds_the_chat_and_retries():
+    rate_limited = ApiTelegramException(
+        "sendMessage", None,
+        {'error_code': 429, 'description': "Too Many Requests", 'parameters': {'retry_after': 0.1}}
+    )
+    bot = FakeBot(failures=[rate_limited])
+
+    async def scenario(scheduler):
+        return await scheduler.call(CHAT_ID, bot.send_message, CHAT_ID, "halo"), scheduler.stats()
+
+    result, stats = _run_with_scheduler(bot, scenario, chat_rate=100.0, chat_burst=5)
+    assert result == "halo"
+    assert stats['rate_limited'] == 1 and stats['failed'] == 0
+    first_try, retry = bot.calls[0][0], bot.calls[1][0]
+    assert retry - first_try >= 0.09
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import parsers
+from modules.parsers import profile_table, aggregate_table
+
+
+def _sales_csv(rows):
+    lines = ["kota,nilai,tanggal"]
+    for i in range(rows):
+        # Blok pertama hanya berisi bilangan bulat; blok berikutnya berisi desimal dan teks.
+        nilai = "tidak ada" if i == rows - 1 else (str(i % 10) if i < rows // 2 else f"{i % 10}.5")
+        lines.append(f"K{i % 3},{nilai},2024-01-{i % 28 + 1:02d}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def test_columnar_copy_covers_every_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(parsers, 'CSV_CHUNK_ROWS', 1000)
+    rows = 12_000
+    text, meta = profile_table("penjualan.csv", _sales_csv(rows), str(tmp_path), max_rows=5000)
+
+    assert meta['rows'] == rows and not meta['truncated']
+    assert text.startswith(f"PROFIL TABEL `penjualan.csv`: {rows} baris x 3 kolom.")
+    aggregates = aggregate_table(meta['table_path'], "berapa total nilai per kota")
+    assert f"n={rows - 1}" in aggregates
+
+    # File yang sama dipakai ulang tanpa ditulis ulang.
+    os.utime(meta['table_path'], (0, 0))
+    _, again = profile_table("penjualan.csv", _sales_csv(rows), str(tmp_path), max_rows=5000)
+    assert again['table_path'] == meta['table_path']
+    assert os.stat(meta['table_path']).st_mtime > 0
+
+
+def test_without_columnar_store_rows_are_capped_and_flagged(monkeypatch):
+    monkeypatch.setattr(parsers, '_feather', lambda: None)
+    text, meta = profile_table("penjualan.csv", _sales_csv(8000), None, max_rows=5000)
+    assert meta['rows'] == 5000 and meta['truncated'] and meta['table_path'] is None
+    assert "hanya 5000 baris pertama" in text.splitlines()[0]
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Nilai dummy agar config bisa diimpor tanpa file .env.
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:placeholder')
+os.environ.setdefault('GEMINI_API_KEYS', 'placeholder')
+
+from modules import search_handler
+from modules.db_pool import ConnectionPool
+from modules.search_handler import SearchCache, search_web
+
+RESULTS = [{'title': "Judul", 'body': "Ringkasan", 'url': "https://contoh.id/"}]
+
+
+def test_timed_out_caller_does_not_cancel_shared_search(monkeypatch):
+    calls = []
+
+    async def slow_fetch(query, region, max_results):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return list(RESULTS)
+
+    monkeypatch.setattr(search_handler, '_fetch_search_results', slow_fetch)
+    monkeypatch.setattr(search_handler, 'search_cache', SearchCache(60, 10, 10))
+
+    async def main():
+        impatient = asyncio.create_task(asyncio.wait_for(search_web("kueri ramai"), timeout=0.01))
+        await asyncio.sleep(0)
+        patient = asyncio.create_task(search_web("kueri ramai"))
+        try:
+            await impatient
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("pemanggil pertama seharusnya timeout")
+        assert await patient == RESULTS
+        assert calls == ["kueri ramai"]
+        # Hasil pencarian yang tetap selesai masuk ke cache.
+        assert await search_web("kueri ramai") == RESULTS
+        assert calls == ["kueri ramai"]
+
+    asyncio.run(main())
+
+
+def test_persisted_rows_are_swept_every_n_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_handler, 'SEARCH_CACHE_SWEEP_EVERY_WRITES', 4)
+
+    async def count_rows(pool):
+        async with pool.acquire() as conn:
+            async with conn.execute("SELECT COUNT(*) FROM search_cache") as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def main():
+        pool = ConnectionPool(str(tmp_path / "cache.db"))
+        await pool.open()
+        try:
+            cache = SearchCache(60, 10, max_rows=2)
+            await cache.attach(pool)
+            async with pool.transaction() as conn:
+                await conn.execute("INSERT INTO search_cache VALUES ('lama', '[]', ?)", (time.time() - 1,))
+            for i in range(3):
+                await cache.put(f"k{i}", RESULTS)
+            assert await count_rows(pool) == 4
+            await cache.put("k3", RESULTS)
+            assert await count_rows(pool) == 2
+        finally:
+            await pool.close()
+
+    asyncio.run(main())
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Nilai dummy agar config dan bot_setup bisa diimpor tanpa file .env.
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:placeholder')
+os.environ.setdefault('GEMINI_API_KEYS', 'placeholder')
+
+from modules.web_handler import canonicalize_url
+
+
+def test_canonicalize_url_normalizes_equivalent_urls():
+    assert canonicalize_url("HTTPS://Example.com:443/a?b=2&utm_source=x&a=1#frag") == "https://example.com/a?a=1&b=2"
+    assert canonicalize_url("http://example.com") == "http://example.com/"
+    assert canonicalize_url("http://example.com:8080/x") == "http://example.com:8080/x"
+
+
+@pytest.mark.parametrize("url", ["http://host:abc/", "http://[::1/halaman", "https://host:99999/"])
+def test_canonicalize_url_falls_back_to_raw_url_when_malformed(url):
+    assert canonicalize_url(f"  {url} ") == url